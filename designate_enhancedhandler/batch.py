@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import eventlet
+from eventlet import event
+from eventlet import hubs
+from eventlet import semaphore
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class _Batch(object):
+    __slots__ = ('items', 'timer')
+
+    def __init__(self):
+        self.items = []
+        self.timer = None
+
+
+class ZoneBatcher(object):
+    """Collect the writes to each zone and submit them in a single burst per zone.
+
+    The writes submitted for a zone are kept until `interval` seconds after the first of them
+    arrived, or until `size` of them are pending. Then `write` receives the zone and the list of
+    items, in submission order, and returns a (result, exception) tuple for each item. The
+    bursts of a zone are serialized, while the bursts of different zones run in parallel.
+
+    Submitting an item blocks the calling green thread until its burst is written, and returns
+    its result or raises its exception.
+    """
+
+    def __init__(self, interval, size, write):
+        self._interval = interval
+        self._size = max(size, 1)
+        self._write = write
+        self._pending = {}
+        self._locks = {}
+
+    def __len__(self):
+        return sum(len(batch.items) for batch in self._pending.values())
+
+    def submit(self, zone_id, item):
+        batch = self._pending.get(zone_id)
+        if batch is None:
+            batch = self._pending[zone_id] = _Batch()
+            # A plain timer, since cancelling a green thread that did not start yields to it
+            batch.timer = hubs.get_hub().schedule_call_global(self._interval, eventlet.spawn_n,
+                                                              self._flush, zone_id, batch)
+        waiter = event.Event()
+        batch.items.append((item, waiter))
+        if len(batch.items) >= self._size:
+            del self._pending[zone_id]
+            batch.timer.cancel()
+            eventlet.spawn_n(self._flush, zone_id, batch)
+        return waiter.wait()
+
+    def _flush(self, zone_id, batch):
+        if self._pending.get(zone_id) is batch:
+            del self._pending[zone_id]
+        lock = self._locks.setdefault(zone_id, semaphore.Semaphore())
+        with lock:
+            items = [item for item, _ in batch.items]
+            LOG.debug('Writing %d items to zone: %s', len(items), zone_id)
+            try:
+                results = list(self._write(zone_id, items))
+            except Exception as e:
+                results = [(None, e)] * len(items)
+        if lock.balance > 0 and self._locks.get(zone_id) is lock:
+            # No other burst of the zone is waiting
+            del self._locks[zone_id]
+        if len(results) < len(items):
+            LOG.error('Got %d results writing %d items to zone: %s', len(results), len(items), zone_id)
+            error = RuntimeError('No result writing the item to zone: %s' % zone_id)
+            results.extend([(None, error)] * (len(items) - len(results)))
+        for (_, waiter), (result, error) in zip(batch.items, results):
+            if error is not None:
+                waiter.send_exception(error)
+            else:
+                waiter.send(result)
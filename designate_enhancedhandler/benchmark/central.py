@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import bisect
+import random
+import uuid
+
+from collections import Counter
+
+import eventlet
+
+from designate import exceptions
+
+RECORD_FIELDS = ('data', 'managed', 'managed_plugin_name', 'managed_plugin_type', 'managed_resource_type',
+                 'managed_resource_id', 'managed_extra')
+
+
+class Resource(dict):
+    """Dictionary whose items are also readable as attributes, like the designate objects"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _matches(item, criterion):
+    return all(item.get(key) == value for key, value in (criterion or {}).items())
+
+
+def _page(items, marker=None, limit=None):
+    """Items sorted by id after the one with id marker, up to limit of them"""
+    items = sorted(items, key=lambda item: item['id'])
+    start = 0
+    if marker is not None:
+        ids = [item['id'] for item in items]
+        start = bisect.bisect_right(ids, marker)
+        if not start or ids[start - 1] != marker:
+            raise exceptions.MarkerNotFound()
+    end = start + limit if limit else None
+    return items[start:end]
+
+
+class FakeCentralAPI(object):
+    """In-memory stand-in of the designate-central API used by the handlers.
+
+    Every call waits `latency` seconds, plus up to `jitter` more, without blocking other green
+    threads, and is counted in `calls` by method name.
+    """
+
+    def __init__(self, latency=0, jitter=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self.domains = {}
+        self.recordsets = {}
+        self.records = {}
+        self._recordset_names = {}
+        self._random = random.Random(seed)
+
+    def _call(self, method):
+        self.calls[method] += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            eventlet.sleep(delay)
+        else:
+            eventlet.sleep(0)
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    @staticmethod
+    def _visible(context, item):
+        if context is None or getattr(context, 'all_tenants', False):
+            return True
+        return item.get('tenant_id') == getattr(context, 'tenant', None)
+
+    # Storage setup, not counted as calls
+
+    def add_domain(self, name, tenant_id=None):
+        domain = Resource(id=str(uuid.uuid4()), name=name, tenant_id=tenant_id)
+        self.domains[domain['id']] = domain
+        return domain
+
+    # Domains
+
+    def find_domain(self, context, criterion=None):
+        self._call('find_domain')
+        domains = [domain for domain in self.domains.values() if _matches(domain, criterion)]
+        if not domains:
+            raise exceptions.DomainNotFound()
+        if len(domains) > 1:
+            raise exceptions.DuplicateDomain()
+        return Resource(domains[0])
+
+    def find_domains(self, context, criterion=None, marker=None, limit=None, sort_key=None, sort_dir=None):
+        self._call('find_domains')
+        domains = [Resource(domain) for domain in self.domains.values()
+                   if self._visible(context, domain) and _matches(domain, criterion)]
+        return _page(domains, marker, limit)
+
+    def _get_domain(self, domain_id):
+        try:
+            return self.domains[domain_id]
+        except KeyError:
+            raise exceptions.DomainNotFound()
+
+    # Recordsets
+
+    def _recordset(self, recordset):
+        return Resource(recordset, records=[Resource(self.records[record_id]) for record_id in recordset['records']])
+
+    def create_recordset(self, context, domain_id, recordset):
+        self._call('create_recordset')
+        domain = self._get_domain(domain_id)
+        key = (domain_id, recordset.name, recordset.type)
+        if key in self._recordset_names:
+            raise exceptions.DuplicateRecordSet()
+        stored = Resource(id=str(uuid.uuid4()), domain_id=domain_id, tenant_id=domain['tenant_id'],
+                          name=recordset.name, type=recordset.type, records=[])
+        self.recordsets[stored['id']] = stored
+        self._recordset_names[key] = stored['id']
+        records = getattr(recordset, 'records', None) or []
+        for record in records:
+            self._store_record(stored, record)
+        return self._recordset(stored)
+
+    def find_recordset(self, context, criterion=None):
+        self._call('find_recordset')
+        recordsets = [recordset for recordset in self.recordsets.values()
+                      if self._visible(context, recordset) and _matches(recordset, criterion)]
+        if not recordsets:
+            raise exceptions.RecordSetNotFound()
+        return self._recordset(recordsets[0])
+
+    def find_recordsets(self, context, criterion=None, marker=None, limit=None, sort_key=None, sort_dir=None):
+        self._call('find_recordsets')
+        recordsets = [self._recordset(recordset) for recordset in self.recordsets.values()
+                      if self._visible(context, recordset) and _matches(recordset, criterion)]
+        return _page(recordsets, marker, limit)
+
+    def delete_recordset(self, context, domain_id, recordset_id):
+        self._call('delete_recordset')
+        self._get_domain(domain_id)
+        recordset = self.recordsets.pop(recordset_id, None)
+        if recordset is None:
+            raise exceptions.RecordSetNotFound()
+        del self._recordset_names[(domain_id, recordset['name'], recordset['type'])]
+        for record_id in recordset['records']:
+            self.records.pop(record_id, None)
+        return self._recordset(dict(recordset, records=[]))
+
+    # Records
+
+    def _store_record(self, recordset, record):
+        values = dict((field, getattr(record, field, None)) for field in RECORD_FIELDS)
+        if any(self.records[record_id]['data'] == values['data'] for record_id in recordset['records']):
+            raise exceptions.DuplicateRecord()
+        stored = Resource(values, id=str(uuid.uuid4()), domain_id=recordset['domain_id'],
+                          recordset_id=recordset['id'], tenant_id=recordset['tenant_id'])
+        self.records[stored['id']] = stored
+        recordset['records'].append(stored['id'])
+        return stored
+
+    def create_record(self, context, domain_id, recordset_id, record):
+        self._call('create_record')
+        self._get_domain(domain_id)
+        try:
+            recordset = self.recordsets[recordset_id]
+        except KeyError:
+            raise exceptions.RecordSetNotFound()
+        return Resource(self._store_record(recordset, record))
+
+    def find_record(self, context, criterion=None):
+        self._call('find_record')
+        for record in self.records.values():
+            if self._visible(context, record) and _matches(record, criterion):
+                return Resource(record)
+        raise exceptions.RecordNotFound()
+
+    def find_records(self, context, criterion=None, marker=None, limit=None, sort_key=None, sort_dir=None):
+        self._call('find_records')
+        records = [Resource(record) for record in self.records.values()
+                   if self._visible(context, record) and _matches(record, criterion)]
+        return _page(records, marker, limit)
+
+    def delete_record(self, context, domain_id, recordset_id, record_id):
+        self._call('delete_record')
+        self._get_domain(domain_id)
+        record = self.records.get(record_id)
+        if record is None or record['recordset_id'] != recordset_id:
+            raise exceptions.RecordNotFound()
+        del self.records[record_id]
+        self.recordsets[recordset_id]['records'].remove(record_id)
+        return Resource(record)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Replay a capture of nova and neutron notifications through the enhanced handlers.
+
+The capture is a JSON lines file (optionally gzipped, or - for the standard input) with an
+`event_type`, a `payload` and optionally a `timestamp` per line. Notifications as stored by
+oslo.messaging, wrapped in an `oslo.message` string, are also accepted. The file is read
+line by line, so captures of any size can be replayed.
+
+Example:
+
+    designate-enhancedhandler-replay notifications.jsonl.gz --speed 10 --latency 2
+    designate-enhancedhandler-replay notifications.jsonl --mode record --output writes.jsonl
+"""
+
+from __future__ import print_function
+
+import argparse
+import calendar
+import gzip
+import json
+import logging
+import sys
+import time
+
+from collections import namedtuple
+from datetime import datetime
+
+import eventlet
+
+from designate_enhancedhandler.benchmark import runner
+from designate_enhancedhandler.benchmark.central import FakeCentralAPI
+
+LOG = logging.getLogger(__name__)
+
+CapturedEvent = namedtuple('CapturedEvent', ['event_type', 'payload', 'timestamp'])
+
+TIMESTAMP_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+
+DEFAULT_REVERSE_ZONES = ['10.in-addr.arpa.', '172.in-addr.arpa.', '192.in-addr.arpa.']
+
+ADMIN_TENANT = 'admin'
+
+
+def parse_timestamp(value):
+    """Seconds since the epoch of a numeric or an oslo.messaging (UTC) timestamp, or None"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            parsed = datetime.strptime(value, timestamp_format)
+        except ValueError:
+            continue
+        return calendar.timegm(parsed.utctimetuple()) + parsed.microsecond / 1e6
+    return None
+
+
+def _open(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path)
+
+
+def read_capture(lines):
+    """Parse the events of a capture lazily, skipping the lines that are not notifications"""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            message = json.loads(line)
+            if 'oslo.message' in message:
+                message = json.loads(message['oslo.message'])
+            yield CapturedEvent(message['event_type'], message['payload'], parse_timestamp(message.get('timestamp')))
+        except (ValueError, KeyError, TypeError) as e:
+            LOG.warning('Skipping line %d of the capture: %s', number, e)
+
+
+def pace(events, speed, clock=time.time, sleep=eventlet.sleep):
+    """Yield the events keeping the time between them in the capture, divided by speed.
+
+    A speed of 0 yields them as fast as they are processed. Events without timestamp are not
+    delayed.
+    """
+    origin = None
+    for event in events:
+        if speed > 0 and event.timestamp is not None:
+            if origin is None:
+                origin = (event.timestamp, clock())
+            else:
+                delay = origin[1] + (event.timestamp - origin[0]) / speed - clock()
+                if delay > 0:
+                    sleep(delay)
+        yield event
+
+
+def _get_tenant_id(payload):
+    tenant_id = payload.get('tenant_id')
+    if tenant_id is None and isinstance(payload.get('floatingip'), dict):
+        tenant_id = payload['floatingip'].get('tenant_id')
+    return tenant_id
+
+
+def prepare(events, handlers, central_api, tenants):
+    """Skip the events no handler processes and create the domain of each tenant on first sight"""
+    for event in events:
+        if event.event_type not in handlers:
+            continue
+        tenant_id = _get_tenant_id(event.payload)
+        if tenant_id and tenant_id not in tenants:
+            tenants.add(tenant_id)
+            central_api.add_domain('%s.replay.example.com.' % tenant_id, tenant_id)
+        yield event
+
+
+class RecordingCentralAPI(FakeCentralAPI):
+    """Stand-in of designate-central that also writes every change to `output` as JSON lines.
+
+    Changes are identified by domain and recordset names instead of ids, so the output of two
+    replays of the same capture can be compared line by line.
+    """
+
+    def __init__(self, output, *args, **kwargs):
+        super(RecordingCentralAPI, self).__init__(*args, **kwargs)
+        self.output = output
+
+    def _write(self, method, domain_id, recordset, data):
+        self.output.write(json.dumps({
+            'method': method,
+            'domain': self.domains[domain_id]['name'],
+            'name': recordset['name'],
+            'type': recordset['type'],
+            'data': data
+        }, sort_keys=True) + '\n')
+
+    def create_recordset(self, context, domain_id, recordset):
+        created = super(RecordingCentralAPI, self).create_recordset(context, domain_id, recordset)
+        self._write('create_recordset', domain_id, created, sorted(record['data'] for record in created['records']))
+        return created
+
+    def create_record(self, context, domain_id, recordset_id, record):
+        created = super(RecordingCentralAPI, self).create_record(context, domain_id, recordset_id, record)
+        self._write('create_record', domain_id, self.recordsets[recordset_id], [created['data']])
+        return created
+
+    def delete_recordset(self, context, domain_id, recordset_id):
+        recordset = self.recordsets.get(recordset_id)
+        data = sorted(self.records[record_id]['data'] for record_id in recordset['records']) if recordset else []
+        deleted = super(RecordingCentralAPI, self).delete_recordset(context, domain_id, recordset_id)
+        self._write('delete_recordset', domain_id, deleted, data)
+        return deleted
+
+    def delete_record(self, context, domain_id, recordset_id, record_id):
+        deleted = super(RecordingCentralAPI, self).delete_record(context, domain_id, recordset_id, record_id)
+        self._write('delete_record', domain_id, self.recordsets[recordset_id], [deleted['data']])
+        return deleted
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Replay a capture of notifications through the enhanced handlers')
+    parser.add_argument('capture', help='JSON lines file with a notification per line (.gz or - for stdin)')
+    parser.add_argument('--mode', choices=('dry-run', 'record'), default='dry-run',
+                        help='dry-run only reports; record also writes the changes to designate-central')
+    parser.add_argument('--output', default='-', help='File where the changes are written in record mode')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Speed multiplier of the capture timestamps (0 replays as fast as possible)')
+    parser.add_argument('--reverse-zone', dest='reverse_zones', action='append', default=None,
+                        help='Reverse zone of the stand-in designate-central (default: %s)' %
+                             ', '.join(DEFAULT_REVERSE_ZONES))
+    parser.add_argument('--latency', type=float, default=0.0, help='Milliseconds per designate-central call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Maximum extra milliseconds per call')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--set', dest='options', action='append', default=[], metavar='OPTION=VALUE',
+                        help='Override a handler option, eg. dispatch_workers=8')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Print the handler logs')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    runner.set_options(args.options)
+    output = None
+    if args.mode == 'record':
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        central_api = RecordingCentralAPI(output, args.latency / 1000.0, args.jitter / 1000.0, args.seed)
+    else:
+        central_api = FakeCentralAPI(args.latency / 1000.0, args.jitter / 1000.0, args.seed)
+    for zone in args.reverse_zones or DEFAULT_REVERSE_ZONES:
+        central_api.add_domain(zone, ADMIN_TENANT)
+    handlers = runner.build_handlers(central_api)
+    capture = _open(args.capture)
+    try:
+        events = prepare(pace(read_capture(capture), args.speed), handlers, central_api, set())
+        report = runner.run(args.capture, events, handlers, central_api)
+    finally:
+        if capture is not sys.stdin:
+            capture.close()
+        if output is not None and output is not sys.stdout:
+            output.close()
+    # Keep the report apart from the changes when both go to the standard output
+    report_output = sys.stderr if output is sys.stdout else sys.stdout
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2, sort_keys=True), file=report_output)
+    else:
+        print(report.format(), file=report_output)
+
+
+if __name__ == '__main__':
+    main()
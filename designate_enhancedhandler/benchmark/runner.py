@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+"""Measure the cost of the enhanced handlers against an in-memory designate-central.
+
+Example:
+
+    designate-enhancedhandler-benchmark boot-storm --instances 2000 --latency 2 --jitter 1 \
+        --set create_concurrency=4
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import time
+
+from collections import Counter
+from collections import defaultdict
+
+from oslo_config import cfg
+
+from designate.notification_handler import base as handler_base
+from designate_enhancedhandler.benchmark import workloads
+from designate_enhancedhandler.benchmark.central import FakeCentralAPI
+from designate_enhancedhandler.notification_handler.neutron import NeutronEnhancedHandler
+from designate_enhancedhandler.notification_handler.nova import NovaEnhancedHandler
+
+HANDLER_CLASSES = (NovaEnhancedHandler, NeutronEnhancedHandler)
+
+
+def build_handler(handler_class, central_api):
+    """Instantiate a handler that sends its designate-central calls to central_api"""
+    central_api_class = handler_base.central_rpcapi.CentralAPI
+    handler_base.central_rpcapi.CentralAPI = lambda *args, **kwargs: central_api
+    try:
+        return handler_class()
+    finally:
+        handler_base.central_rpcapi.CentralAPI = central_api_class
+
+
+def build_handlers(central_api):
+    """Map every event type to the handler processing it"""
+    handlers = {}
+    for handler_class in HANDLER_CLASSES:
+        handler = build_handler(handler_class, central_api)
+        for event_type in handler.get_event_types():
+            handlers[event_type] = handler
+    return handlers
+
+
+def set_options(options):
+    """Override handler options given as name=value in every handler group"""
+    for option in options:
+        name, value = option.split('=', 1)
+        name = name.replace('-', '_')
+        for handler_class in HANDLER_CLASSES:
+            group = 'handler:%s' % handler_class.__plugin_name__
+            if name in cfg.CONF[group]:
+                cfg.CONF.set_override(name, value, group)
+
+
+def drain(handlers):
+    """Wait until the notifications buffered or queued by the handlers are processed"""
+    for handler in set(handlers.values()):
+        if getattr(handler, '_coalescer', None) is not None:
+            handler._coalescer.flush_all()
+        if getattr(handler, '_dispatcher', None) is not None:
+            handler._dispatcher.join()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+class Report(object):
+    """Throughput, latency and designate-central calls of a run"""
+
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+        self.latencies = defaultdict(list)
+        self.calls = defaultdict(Counter)
+
+    def add(self, event_type, latency, calls):
+        self.latencies[event_type].append(latency)
+        self.calls[event_type].update(calls)
+
+    @property
+    def events(self):
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def as_dict(self):
+        latencies = [latency for values in self.latencies.values() for latency in values]
+        calls = sum(self.calls.values(), Counter())
+        events = self.events
+        return {
+            'workload': self.name,
+            'events': events,
+            'elapsed': self.elapsed,
+            'events_per_second': events / self.elapsed if self.elapsed else 0.0,
+            'latency_p50_ms': percentile(latencies, 0.5) * 1000,
+            'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+            'rpc_calls': dict(calls),
+            'rpc_calls_per_event': float(sum(calls.values())) / events if events else 0.0,
+            'event_types': dict((event_type, {
+                'events': len(values),
+                'latency_p50_ms': percentile(values, 0.5) * 1000,
+                'latency_p99_ms': percentile(values, 0.99) * 1000,
+                'rpc_calls_per_event': float(sum(self.calls[event_type].values())) / len(values)
+            }) for event_type, values in self.latencies.items())
+        }
+
+    def format(self):
+        report = self.as_dict()
+        lines = [
+            'Workload: %(workload)s' % report,
+            'Events: %(events)d in %(elapsed).2f s (%(events_per_second).1f events/s)' % report,
+            'Latency: p50 %(latency_p50_ms).2f ms, p99 %(latency_p99_ms).2f ms' % report,
+            'RPC calls per event: %(rpc_calls_per_event).2f' % report,
+        ]
+        for method, count in sorted(report['rpc_calls'].items()):
+            lines.append('  %-20s %8d  %6.2f/event' % (method, count, float(count) / report['events']))
+        lines.append('%-32s %8s %10s %10s %10s' % ('Event type', 'events', 'p50 ms', 'p99 ms', 'RPC/event'))
+        for event_type, values in sorted(report['event_types'].items()):
+            lines.append('%-32s %8d %10.2f %10.2f %10.2f' % (
+                event_type, values['events'], values['latency_p50_ms'], values['latency_p99_ms'],
+                values['rpc_calls_per_event']))
+        return '\n'.join(lines)
+
+
+def run(name, events, handlers, central_api):
+    """Process the events one after another, measuring each of them.
+
+    When the handlers queue or buffer notifications, latencies and calls are only attributed to
+    the event that triggered them when processed synchronously; the totals are always accurate.
+    """
+    report = Report(name)
+    start = time.time()
+    for event in events:
+        handler = handlers[event.event_type]
+        calls = Counter(central_api.calls)
+        event_start = time.time()
+        handler.process_notification(None, event.event_type, event.payload)
+        report.add(event.event_type, time.time() - event_start, central_api.calls - calls)
+    calls = Counter(central_api.calls)
+    drain(handlers)
+    report.calls['(queued)'].update(central_api.calls - calls)
+    report.elapsed = time.time() - start
+    return report
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the enhanced notification handlers')
+    parser.add_argument('workload', choices=sorted(workloads.WORKLOADS))
+    parser.add_argument('--tenants', type=int, default=100)
+    parser.add_argument('--instances', type=int, default=1000)
+    parser.add_argument('--interfaces', type=int, default=2)
+    parser.add_argument('--floatingips', type=int, default=500)
+    parser.add_argument('--cycles', type=int, default=2)
+    parser.add_argument('--reverse-zones', type=int, default=1000,
+                        help='Number of /24 reverse zones besides 10.in-addr.arpa. and 172.in-addr.arpa.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Milliseconds per designate-central call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Maximum extra milliseconds per call')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--set', dest='options', action='append', default=[], metavar='OPTION=VALUE',
+                        help='Override a handler option, eg. create_concurrency=4')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Print the handler logs')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    set_options(args.options)
+    central_api = FakeCentralAPI(args.latency / 1000.0, args.jitter / 1000.0, args.seed)
+    workloads.populate(central_api, args.tenants, args.reverse_zones)
+    handlers = build_handlers(central_api)
+    report = run(args.workload, workloads.WORKLOADS[args.workload](args), handlers, central_api)
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2, sort_keys=True))
+    else:
+        print(report.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+from collections import namedtuple
+
+Event = namedtuple('Event', ['event_type', 'payload'])
+
+ADMIN_TENANT = 'admin'
+
+
+def tenant_id(number):
+    return 'tenant-%05d' % number
+
+
+def instance_id(number):
+    return '00000000-0000-0000-0000-%012d' % number
+
+
+def floatingip_id(number):
+    return '00000000-0000-0000-ffff-%012d' % number
+
+
+def port_id(number):
+    return '00000000-0000-0000-eeee-%012d' % number
+
+
+def fixed_address(instance, interface):
+    return '10.%d.%d.%d' % (interface, (instance // 250) % 256, instance % 250 + 1)
+
+
+def floating_address(number):
+    return '172.%d.%d.%d' % (16 + (number // 62500) % 16, (number // 250) % 250, number % 250 + 1)
+
+
+def populate(central, tenants, reverse_zones):
+    """Create a domain per tenant and the reverse zones in the fake designate-central.
+
+    Besides 10.in-addr.arpa. and 172.in-addr.arpa., `reverse_zones` /24 zones are created for
+    10.0.0.0/16, 10.1.0.0/16 and so on, so most fixed addresses match a /24 zone.
+    """
+    for number in range(tenants):
+        central.add_domain('%s.example.com.' % tenant_id(number), tenant_id(number))
+    central.add_domain('10.in-addr.arpa.', ADMIN_TENANT)
+    central.add_domain('172.in-addr.arpa.', ADMIN_TENANT)
+    for number in range(reverse_zones):
+        central.add_domain('%d.%d.10.in-addr.arpa.' % (number % 256, number // 256), ADMIN_TENANT)
+
+
+def instance_payload(number, tenants, interfaces):
+    return {
+        'hostname': 'host-%05d' % number,
+        'tenant_id': tenant_id(number % tenants),
+        'instance_id': instance_id(number),
+        'fixed_ips': [{
+            'label': 'net_%d' % interface,
+            'version': 4,
+            'address': fixed_address(number, interface),
+            'type': 'fixed',
+            'floating_ips': [],
+            'meta': {}
+        } for interface in range(interfaces)]
+    }
+
+
+def boot_storm(tenants, instances, interfaces, delete=True):
+    """Boot `instances` instances spread among the tenants and then, optionally, delete them"""
+    for number in range(instances):
+        yield Event('compute.instance.create.end', instance_payload(number, tenants, interfaces))
+    if delete:
+        for number in range(instances):
+            yield Event('compute.instance.delete.start', {
+                'hostname': 'host-%05d' % number,
+                'tenant_id': tenant_id(number % tenants),
+                'instance_id': instance_id(number)
+            })
+
+
+def floatingip_payload(number, tenants, associated):
+    return {
+        'floatingip': {
+            'id': floatingip_id(number),
+            'tenant_id': tenant_id(number % tenants),
+            'floating_ip_address': floating_address(number),
+            'fixed_ip_address': fixed_address(number, 0) if associated else None,
+            'port_id': port_id(number) if associated else None,
+            'router_id': None,
+            'status': 'ACTIVE' if associated else 'DOWN',
+            'floating_network_id': '00000000-0000-0000-dddd-000000000000'
+        }
+    }
+
+
+def floatingip_churn(tenants, floatingips, cycles):
+    """Boot an instance per floating IP, associate and disassociate it `cycles` times and delete both"""
+    for number in range(floatingips):
+        yield Event('compute.instance.create.end', instance_payload(number, tenants, 1))
+    for _ in range(cycles):
+        for number in range(floatingips):
+            yield Event('floatingip.update.end', floatingip_payload(number, tenants, True))
+        for number in range(floatingips):
+            yield Event('floatingip.update.end', floatingip_payload(number, tenants, False))
+    for number in range(floatingips):
+        yield Event('floatingip.delete.end', {'floatingip_id': floatingip_id(number)})
+        yield Event('port.delete.end', {'port_id': port_id(number)})
+        yield Event('compute.instance.delete.start', {
+            'hostname': 'host-%05d' % number,
+            'tenant_id': tenant_id(number % tenants),
+            'instance_id': instance_id(number)
+        })
+
+
+WORKLOADS = {
+    'boot-storm': lambda args: boot_storm(args.tenants, args.instances, args.interfaces),
+    'floatingip-churn': lambda args: floatingip_churn(args.tenants, args.floatingips, args.cycles),
+}
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+
+from collections import OrderedDict
+
+# TTL of the entries that never expire, even in a cache with a ttl
+NO_EXPIRATION = float('inf')
+
+
+class LRUCache(object):
+    """Bounded cache evicting the least recently used entry, with an expiration time per entry.
+
+    Entries never expire when ttl is None. A cache with size 0 stores nothing, so every lookup
+    is a miss.
+    """
+
+    def __init__(self, size, ttl, clock=time.time):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None or (entry[0] is not None and entry[0] <= self._clock()):
+            self.misses += 1
+            return default
+        # Reinsert the entry to mark it as the most recently used
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        if self.size <= 0:
+            return
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.size:
+            self._entries.popitem(last=False)
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (None if ttl is None else self._clock() + ttl, value)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Reconcile the records managed by the enhanced handlers with a snapshot of the cloud.
+
+Example:
+
+    designate-enhancedhandler-reconcile --config-file /etc/designate/designate.conf \
+        --dry-run snapshot.jsonl
+"""
+
+from __future__ import print_function
+
+import sys
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from designate import notification_handler
+from designate import rpc
+from designate import utils
+from designate_enhancedhandler.reconcile import read_snapshot
+from designate_enhancedhandler.reconcile import Reconciler
+
+CONF = cfg.CONF
+
+CONF.register_cli_opts([
+    cfg.StrOpt('snapshot', positional=True,
+               help='JSON lines file with the instances and floating IPs of the cloud'),
+    cfg.ListOpt('plugins', default=['nova_enhanced', 'neutron_enhanced'],
+                help='Handlers whose records are reconciled'),
+    cfg.IntOpt('page-size', default=1000,
+               help='Records read from designate-central per call'),
+    cfg.IntOpt('concurrency', default=8,
+               help='Maximum number of records created at the same time'),
+    cfg.BoolOpt('dry-run', default=False,
+                help='Only log the records that would be deleted and created'),
+])
+
+
+def main():
+    utils.read_config('designate', sys.argv)
+    logging.setup(CONF, 'designate')
+    rpc.init(CONF)
+    handlers = dict((handler.get_plugin_name(), handler)
+                    for handler in notification_handler.get_notification_handlers(CONF.plugins))
+    reconciler = Reconciler(handlers, CONF.page_size, CONF.concurrency, CONF.dry_run)
+    with open(CONF.snapshot) as snapshot:
+        stats = reconciler.reconcile(read_snapshot(snapshot))
+    print('Desired: %(desired)d, found: %(found)d, deleted: %(deleted)d, created: %(created)d, '
+          'conflicts: %(conflicts)d, errors: %(errors)d' % stats)
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
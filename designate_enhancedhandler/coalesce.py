@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from collections import namedtuple
+
+import eventlet
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+Notification = namedtuple('Notification', ['context', 'event_type', 'payload'])
+
+
+class Coalescer(object):
+    """Buffer notifications per resource for a short window before processing them.
+
+    Buffered notifications of a resource are kept until `window` seconds after the first of
+    them arrived, or until a notification that is not buffered arrives for the same resource.
+    Then `merge` receives the list of pending notifications (in arrival order) and returns the
+    ones that are actually passed to `process`.
+    """
+
+    def __init__(self, window, process, merge):
+        self._window = window
+        self._process = process
+        self._merge = merge
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, key, notification, buffered):
+        pending = self._pending.pop(key, None)
+        if buffered:
+            if pending is None:
+                pending = (eventlet.spawn_after(self._window, self._flush, key), [])
+            pending[1].append(notification)
+            self._pending[key] = pending
+            return
+        notifications = [notification]
+        if pending is not None:
+            timer, buffered_notifications = pending
+            timer.cancel()
+            notifications = self._merge(buffered_notifications + notifications)
+        for notification in notifications:
+            self._process(notification)
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        for notification in self._merge(pending[1]):
+            try:
+                self._process(notification)
+            except Exception as e:
+                LOG.error('Error processing notification: %s for resource: %s. %s', notification.event_type, key, e)
+
+    def flush_all(self):
+        """Process every pending notification immediately"""
+        for key in list(self._pending):
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending[0].cancel()
+                self._flush(key)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import eventlet
+
+from designate_enhancedhandler import eventlog
+from designate_enhancedhandler import metrics
+
+
+def _capture(call, event_type, summary):
+    # The notification being processed is local to each green thread
+    metrics.set_current_event_type(event_type)
+    eventlog.set_current(summary)
+    try:
+        return call(), None
+    except Exception as e:
+        return None, e
+
+
+def run_all(calls, size):
+    """Run the callables in a pool of at most `size` green threads and wait for all of them.
+
+    Returns a (result, exception) tuple for each callable, in the same order as `calls`. The
+    callables are accounted to the notification processed by the calling green thread.
+    """
+    pool = eventlet.GreenPool(max(size, 1))
+    event_type = metrics.current_event_type()
+    summary = eventlog.current()
+    threads = [pool.spawn(_capture, call, event_type, summary) for call in calls]
+    return [thread.wait() for thread in threads]
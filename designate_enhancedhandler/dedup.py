@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import json
+import sqlite3
+import time
+
+from collections import OrderedDict
+
+# Number of additions between removals of expired digests from the database
+PURGE_INTERVAL = 1000
+
+
+def notification_digest(event_type, payload):
+    """Digest identifying a notification, equal for every redelivery of the same message"""
+    message = json.dumps([event_type, payload], sort_keys=True, default=str)
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()
+
+
+class DuplicateFilter(object):
+    """Digests of the notifications seen during the last `window` seconds, up to `size` of them.
+
+    When `path` is given, the digests are also stored in a SQLite database so that they are
+    remembered after a restart.
+    """
+
+    def __init__(self, window, size, path=None, clock=time.time):
+        self._window = window
+        self._size = size
+        self._clock = clock
+        self._seen = OrderedDict()
+        self._db = None
+        self._additions = 0
+        if path:
+            self._open(path)
+
+    def __len__(self):
+        return len(self._seen)
+
+    def _open(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS seen (digest TEXT PRIMARY KEY, seen_at REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS seen_at_idx ON seen (seen_at)')
+        self._purge()
+        rows = self._db.execute('SELECT digest, seen_at FROM seen ORDER BY seen_at DESC LIMIT ?', (self._size,))
+        for digest, seen_at in reversed(rows.fetchall()):
+            self._seen[digest] = seen_at
+
+    def _purge(self):
+        with self._db:
+            self._db.execute('DELETE FROM seen WHERE seen_at <= ?', (self._clock() - self._window,))
+
+    def _expire(self, now):
+        while self._seen:
+            digest, seen_at = next(iter(self._seen.items()))
+            if seen_at > now - self._window and len(self._seen) <= self._size:
+                break
+            del self._seen[digest]
+
+    def seen(self, digest):
+        """Check whether digest was already seen. Otherwise remember it and return False"""
+        now = self._clock()
+        self._expire(now)
+        if digest in self._seen:
+            return True
+        self._seen[digest] = now
+        self._expire(now)
+        if self._db is not None:
+            with self._db:
+                self._db.execute('INSERT OR REPLACE INTO seen (digest, seen_at) VALUES (?, ?)', (digest, now))
+            self._additions += 1
+            if self._additions % PURGE_INTERVAL == 0:
+                self._purge()
+        return False
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
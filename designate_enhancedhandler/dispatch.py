@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+import zlib
+
+from collections import deque
+from collections import OrderedDict
+
+import eventlet
+from eventlet import event
+from eventlet import semaphore
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Lane of the items submitted without lane
+DEFAULT_LANE = 'default'
+
+
+def shard(key, shards):
+    """Stable shard number of a key"""
+    return (zlib.crc32(key.encode('utf-8')) & 0xffffffff) % shards
+
+
+class LaneQueue(object):
+    """Queue whose items wait in weighted lanes.
+
+    While several lanes hold items, each one is served in proportion to its weight (stride
+    scheduling), so a busy lane does not starve the others. Items with the same key are put in
+    the lane of the first of them while any of them waits, so they are still dequeued in order.
+    Putting an item blocks while its lane holds `maxsize` items (0 does not limit them).
+    """
+
+    def __init__(self, weights, maxsize=0, clock=time.time):
+        self._weights = dict((lane, float(weight)) for lane, weight in weights.items())
+        if not self._weights or min(self._weights.values()) <= 0:
+            raise ValueError('The weights of the lanes must be positive: %s' % weights)
+        self._lanes = OrderedDict((lane, deque()) for lane in sorted(self._weights))
+        self._passes = dict((lane, 0.0) for lane in self._weights)
+        self._virtual_time = 0.0
+        self._space = None
+        if maxsize > 0:
+            self._space = dict((lane, semaphore.Semaphore(maxsize)) for lane in self._weights)
+        self._items = semaphore.Semaphore(0)
+        self._keys = {}
+        self._clock = clock
+        self._unfinished = 0
+        self._joiners = []
+
+    def qsize(self):
+        return sum(len(items) for items in self._lanes.values())
+
+    def depths(self):
+        """Number of items waiting in each lane"""
+        return dict((lane, len(items)) for lane, items in self._lanes.items())
+
+    def ages(self):
+        """Seconds the oldest item of each lane has been waiting"""
+        now = self._clock()
+        return dict((lane, now - items[0][2] if items else 0.0) for lane, items in self._lanes.items())
+
+    def put(self, lane, key, item):
+        pinned = self._keys.get(key) if key is not None else None
+        if pinned is not None:
+            lane = pinned[0]
+            pinned[1] += 1
+        elif key is not None:
+            self._keys[key] = [lane, 1]
+        if self._space is not None:
+            self._space[lane].acquire()
+        items = self._lanes[lane]
+        if not items:
+            # An idle lane gets no credit for the time it did not use
+            self._passes[lane] = max(self._passes[lane], self._virtual_time)
+        items.append((key, item, self._clock()))
+        self._unfinished += 1
+        self._items.release()
+
+    def get(self):
+        """Get the next item. Returns its lane, the item and the seconds it waited"""
+        self._items.acquire()
+        lane = min((self._passes[lane], lane) for lane, items in self._lanes.items() if items)[1]
+        self._virtual_time = self._passes[lane]
+        self._passes[lane] += 1.0 / self._weights[lane]
+        key, item, enqueued_at = self._lanes[lane].popleft()
+        if self._space is not None:
+            self._space[lane].release()
+        if key is not None:
+            pinned = self._keys[key]
+            pinned[1] -= 1
+            if not pinned[1]:
+                del self._keys[key]
+        return lane, item, self._clock() - enqueued_at
+
+    def task_done(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            joiners, self._joiners = self._joiners, []
+            for joiner in joiners:
+                joiner.send()
+
+    def join(self):
+        """Wait until every item put is done"""
+        if self._unfinished:
+            joiner = event.Event()
+            self._joiners.append(joiner)
+            joiner.wait()
+
+
+class ShardedDispatcher(object):
+    """Process items in a fixed set of green threads, each one consuming its own queue.
+
+    The items submitted with the same key are sent to the same queue, so they are processed in
+    order, while items with different keys may be processed in parallel. Submitting an item
+    blocks while its queue holds `queue_size` items.
+
+    With `lanes` (weights by lane name), each queue is a LaneQueue and items are submitted to
+    a lane. Items with the same `affinity_key` stay in order across lanes. `on_dequeue` is
+    called with the lane and the seconds waited of each item before processing it.
+    """
+
+    def __init__(self, workers, queue_size, process, lanes=None, on_dequeue=None):
+        self._process = process
+        self._on_dequeue = on_dequeue
+        self.lanes = sorted(lanes or {DEFAULT_LANE: 1})
+        self._queues = [LaneQueue(lanes or {DEFAULT_LANE: 1}, queue_size) for _ in range(workers)]
+        self._threads = [eventlet.spawn(self._run, q) for q in self._queues]
+
+    def submit(self, key, item, lane=None, affinity_key=None):
+        self._queues[shard(key or '', len(self._queues))].put(lane or DEFAULT_LANE, affinity_key, item)
+
+    def depths(self):
+        """Number of items waiting in each queue"""
+        return [q.qsize() for q in self._queues]
+
+    def lane_depths(self):
+        """Number of items waiting in each lane of every queue"""
+        depths = dict((lane, 0) for lane in self.lanes)
+        for q in self._queues:
+            for lane, depth in q.depths().items():
+                depths[lane] += depth
+        return depths
+
+    def lane_ages(self):
+        """Seconds the oldest item of each lane of every queue has been waiting"""
+        ages = dict((lane, 0.0) for lane in self.lanes)
+        for q in self._queues:
+            for lane, age in q.ages().items():
+                ages[lane] = max(ages[lane], age)
+        return ages
+
+    def _run(self, items):
+        while True:
+            lane, item, waited = items.get()
+            try:
+                if self._on_dequeue is not None:
+                    self._on_dequeue(lane, waited)
+                self._process(item)
+            except Exception as e:
+                LOG.error('Error processing %s. %s', item, e)
+            finally:
+                items.task_done()
+
+    def join(self):
+        """Wait until every item submitted is processed"""
+        for q in self._queues:
+            q.join()
+
+    def stop(self):
+        for thread in self._threads:
+            thread.kill()
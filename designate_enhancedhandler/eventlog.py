@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import logging
+import random
+import time
+
+from collections import Counter
+
+from eventlet import corolocal
+
+# Notification being processed by the current green thread
+_current = corolocal.local()
+
+
+class EventSummary(object):
+    """Outcome of the processing of a notification"""
+
+    def __init__(self, event_type, resource_id, started):
+        self.event_type = event_type
+        self.resource_id = resource_id
+        self.started = started
+        self.counts = Counter()
+
+
+def current():
+    return getattr(_current, 'summary', None)
+
+
+def set_current(summary):
+    _current.summary = summary
+
+
+def count(name, value=1):
+    """Add to a counter of the summary of the notification being processed, if any"""
+    summary = current()
+    if summary is not None:
+        summary.counts[name] += value
+
+
+class WarningLimiter(object):
+    """Allow `burst` warnings per key every `interval` seconds, counting the ones suppressed"""
+
+    def __init__(self, burst, interval, clock=time.time):
+        self._burst = burst
+        self._interval = interval
+        self._clock = clock
+        self._windows = {}
+
+    def allow(self, key):
+        """Check whether a warning is logged. Returns (allowed, warnings suppressed since the last one)"""
+        now = self._clock()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self._interval:
+            suppressed = window[2] if window is not None else 0
+            self._windows[key] = [now, 1, 0]
+            return True, suppressed
+        if window[1] < self._burst:
+            window[1] += 1
+            return True, 0
+        window[2] += 1
+        return False, 0
+
+
+class EventLog(object):
+    """Log of the notifications processed.
+
+    In summary mode, a single INFO line with the outcome, duration and counters of each
+    notification replaces the per-record lines and the payload dumps, which are logged at DEBUG
+    except for a `payload_sample_rate` fraction of the notifications. Repeated warnings are
+    limited to `warning_burst` per kind and event type every `warning_interval` seconds (0 does
+    not limit them).
+    """
+
+    def __init__(self, summary=False, payload_sample_rate=0.0, warning_burst=0, warning_interval=60,
+                 clock=time.time, sample=random.random):
+        self.summary = summary
+        self.payload_sample_rate = payload_sample_rate
+        # Level of the lines describing each step of the processing
+        self.detail_level = logging.DEBUG if summary else logging.INFO
+        self._clock = clock
+        self._sample = sample
+        self._limiter = WarningLimiter(warning_burst, warning_interval, clock) if warning_burst > 0 else None
+
+    def payload_level(self):
+        """Level of the payload dump of the notification being processed"""
+        if not self.summary or self._sample() < self.payload_sample_rate:
+            return logging.INFO
+        return logging.DEBUG
+
+    def begin(self, event_type, resource_id):
+        summary = EventSummary(event_type, resource_id, self._clock())
+        set_current(summary)
+        return summary
+
+    def end(self, logger, summary, error=None):
+        set_current(None)
+        if not self.summary:
+            return
+        values = dict(summary.counts)
+        values.update({
+            'event_type': summary.event_type,
+            'resource_id': summary.resource_id,
+            'outcome': 'ok' if error is None else 'error',
+            'duration_ms': round((self._clock() - summary.started) * 1000, 1)
+        })
+        if error is not None:
+            values['error'] = '%s: %s' % (error.__class__.__name__, error)
+        logger.info('Notification processed: %s', json.dumps(values, sort_keys=True, default=str))
+
+    def warn(self, logger, kind, message, *args):
+        """Log a warning of a kind that may be repeated for many notifications"""
+        count('warnings')
+        if self._limiter is None:
+            logger.warn(message, *args)
+            return
+        summary = current()
+        allowed, suppressed = self._limiter.allow((kind, summary.event_type if summary else None))
+        if not allowed:
+            return
+        if suppressed:
+            message += ' (%d similar warnings suppressed)'
+            args += (suppressed,)
+        logger.warn(message, *args)
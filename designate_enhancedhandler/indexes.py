@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from collections import namedtuple
+from collections import OrderedDict
+
+from designate_enhancedhandler.cache import LRUCache
+
+# Naming details of the direct record registered for a fixed address
+AddressEntry = namedtuple('AddressEntry', ['hostname', 'label', 'type', 'domain_id'])
+
+_fixed_address_index = None
+
+
+class FixedAddressIndex(object):
+    """Direct records of the fixed addresses, keyed by tenant and address.
+
+    Fixed addresses may overlap between tenants, so the tenant is part of the key. The addresses
+    are also tracked per resource (instance) to forget them when the resource is deleted, and
+    per port to find the addresses a port had before being updated.
+    """
+
+    def __init__(self, size):
+        self._addresses = LRUCache(size, None)
+        self._resources = LRUCache(size, None)
+        self._ports = LRUCache(size, None)
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def add(self, tenant_id, address, resource_id, entry):
+        self._addresses.set((tenant_id, address), entry)
+        keys = self._resources.get(resource_id) or set()
+        keys.add((tenant_id, address))
+        self._resources.set(resource_id, keys)
+
+    def get(self, tenant_id, address):
+        return self._addresses.get((tenant_id, address))
+
+    def hit_ratio(self):
+        return self._addresses.hit_ratio()
+
+    def get_resource(self, resource_id):
+        """Get the (tenant_id, address) keys registered for a resource"""
+        return set(self._resources.get(resource_id) or ())
+
+    def remove(self, tenant_id, address, resource_id):
+        self._addresses.delete((tenant_id, address))
+        keys = self._resources.get(resource_id)
+        if keys:
+            keys.discard((tenant_id, address))
+
+    def set_port(self, port_id, addresses):
+        self._ports.set(port_id, set(addresses))
+
+    def get_port(self, port_id):
+        """Get the fixed addresses of a port, or None if the port is unknown"""
+        addresses = self._ports.get(port_id)
+        return set(addresses) if addresses is not None else None
+
+    def remove_port(self, port_id):
+        self._ports.delete(port_id)
+
+    def remove_resource(self, resource_id):
+        for key in self._resources.get(resource_id) or ():
+            self._addresses.delete(key)
+        self._resources.delete(resource_id)
+
+
+class RecordIndex(object):
+    """Records managed for a set of keys (eg. floating IP and port ids), with bounded memory.
+
+    A record may be registered under several keys. Popping one of them forgets the record for
+    every key, since the records popped are going to be deleted.
+
+    Once loaded with every managed record, the index is complete: a key without records is known
+    to have no records at all. It is no longer complete after evicting any key.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._keys = OrderedDict()
+        self._record_keys = {}
+        self._loaded = False
+        self._evicted = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def complete(self):
+        return self._loaded and not self._evicted
+
+    def mark_loaded(self):
+        self._loaded = True
+        self._evicted = False
+
+    def add(self, keys, record):
+        for key in keys:
+            records = self._keys.pop(key, None) or OrderedDict()
+            records[record['id']] = record
+            self._keys[key] = records
+        self._record_keys.setdefault(record['id'], set()).update(keys)
+        while len(self._keys) > self.size:
+            _, records = self._keys.popitem(last=False)
+            self._evicted = True
+            for record_id in records:
+                self._record_keys.pop(record_id, None)
+
+    def get(self, key):
+        records = self._keys.get(key)
+        return list(records.values()) if records is not None else None
+
+    def pop(self, key):
+        """Forget the records of a key. Returns them, or None if the key is unknown"""
+        records = self._keys.pop(key, None)
+        if records is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        for record_id in records:
+            for other_key in self._record_keys.pop(record_id, ()):
+                other_records = self._keys.get(other_key)
+                if other_records is not None:
+                    other_records.pop(record_id, None)
+                    if not other_records:
+                        del self._keys[other_key]
+        return list(records.values())
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+def get_fixed_address_index(size):
+    """Get the fixed address index shared by the handlers of this process"""
+    global _fixed_address_index
+    if _fixed_address_index is None:
+        _fixed_address_index = FixedAddressIndex(size)
+    return _fixed_address_index
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import bisect
+import json
+import socket
+import time
+
+from collections import Counter
+
+import eventlet
+from eventlet import corolocal
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Event type of the notification being processed by the current green thread
+_current = corolocal.local()
+
+
+def current_event_type():
+    return getattr(_current, 'event_type', None)
+
+
+def set_current_event_type(event_type):
+    _current.event_type = event_type
+
+
+def metric_name(*parts):
+    return '.'.join(part.replace('.', '_') for part in parts)
+
+
+class Histogram(object):
+    """Latency histogram with fixed buckets, in milliseconds"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of the values"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        accumulated = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.buckets):
+            accumulated += count
+            if accumulated >= threshold:
+                return bound
+        return float('inf')
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+            'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['inf'], self.buckets))
+        }
+
+
+class Metrics(object):
+    """Counters, latency histograms and gauges, forwarded to a list of sinks.
+
+    Counters and histograms are aggregated in memory and sent to the sinks as they are recorded.
+    Gauges are callables evaluated when the sinks are flushed.
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.counters = Counter()
+        self.histograms = {}
+        self.gauges = {}
+
+    def increment(self, name, value=1):
+        self.counters[name] += value
+        for sink in self.sinks:
+            sink.counter(name, value)
+
+    def timing(self, name, seconds):
+        milliseconds = seconds * 1000
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(milliseconds)
+        for sink in self.sinks:
+            sink.timing(name, milliseconds)
+
+    def register_gauge(self, name, function):
+        self.gauges[name] = function
+
+    def read_gauges(self):
+        gauges = {}
+        for name, function in self.gauges.items():
+            try:
+                gauges[name] = function()
+            except Exception as e:
+                LOG.debug('Error reading gauge: %s. %s', name, e)
+        return gauges
+
+    def snapshot(self):
+        return {
+            'counters': dict(self.counters),
+            'histograms': dict((name, histogram.as_dict()) for name, histogram in self.histograms.items()),
+            'gauges': self.read_gauges()
+        }
+
+    def flush(self):
+        for sink in self.sinks:
+            try:
+                sink.flush(self)
+            except Exception as e:
+                LOG.warn('Error flushing metrics. %s', e)
+
+    def start(self, interval):
+        """Flush the sinks every `interval` seconds in a green thread"""
+        def loop():
+            while True:
+                eventlet.sleep(interval)
+                self.flush()
+        return eventlet.spawn(loop)
+
+    def record_call(self, method, started, error=None):
+        """Record a designate-central call, per method and per event type being processed"""
+        elapsed = time.time() - started
+        names = [metric_name('central', method)]
+        event_type = current_event_type()
+        if event_type:
+            names.append(metric_name('event', event_type, 'central', method))
+        for name in names:
+            self.timing(name, elapsed)
+            if error is not None:
+                self.increment(name + '.errors')
+
+
+class StatsdSink(object):
+    """Send the metrics to a statsd daemon over UDP"""
+
+    def __init__(self, host, port, prefix=''):
+        self._address = (host, port)
+        self._prefix = prefix + '.' if prefix else ''
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _send(self, line):
+        try:
+            self._socket.sendto((self._prefix + line).encode('utf-8'), self._address)
+        except socket.error as e:
+            LOG.debug('Error sending metric to statsd. %s', e)
+
+    def counter(self, name, value):
+        self._send('%s:%d|c' % (name, value))
+
+    def timing(self, name, milliseconds):
+        self._send('%s:%.3f|ms' % (name, milliseconds))
+
+    def flush(self, metrics):
+        for name, value in metrics.read_gauges().items():
+            self._send('%s:%s|g' % (name, value))
+
+
+class DumpSink(object):
+    """Dump a snapshot of the metrics as JSON, to the log or appended to a file, on every flush"""
+
+    def __init__(self, path=None):
+        self._path = path
+
+    def counter(self, name, value):
+        pass
+
+    def timing(self, name, milliseconds):
+        pass
+
+    def flush(self, metrics):
+        snapshot = dict(metrics.snapshot(), timestamp=time.time())
+        if self._path:
+            with open(self._path, 'a') as output:
+                output.write(json.dumps(snapshot, sort_keys=True) + '\n')
+        else:
+            LOG.info('Metrics: %s', json.dumps(snapshot, sort_keys=True))
+
+
+class InstrumentedCentralAPI(object):
+    """Proxy of the designate-central API recording every call in metrics"""
+
+    def __init__(self, central_api, metrics):
+        self._central_api = central_api
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attribute = getattr(self._central_api, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        def call(*args, **kwargs):
+            started = time.time()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as e:
+                self._metrics.record_call(name, started, e)
+                raise
+            self._metrics.record_call(name, started)
+            return result
+        return call
@@ -14,6 +14,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
+import socket
+import time
+
+from collections import OrderedDict
+
+import eventlet
+from eventlet import event
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -21,19 +29,430 @@ from designate.context import DesignateContext
 from designate import exceptions
 from designate.notification_handler.base import NotificationHandler
 from designate.objects import Record
+from designate.objects import RecordList
 from designate.objects import RecordSet
+from designate_enhancedhandler.batch import ZoneBatcher
+from designate_enhancedhandler.cache import LRUCache
+from designate_enhancedhandler.cache import NO_EXPIRATION
+from designate_enhancedhandler.coalesce import Coalescer
+from designate_enhancedhandler.coalesce import Notification
+from designate_enhancedhandler.concurrency import run_all
+from designate_enhancedhandler.dedup import DuplicateFilter
+from designate_enhancedhandler.dedup import notification_digest
+from designate_enhancedhandler.dispatch import DEFAULT_LANE
+from designate_enhancedhandler.dispatch import ShardedDispatcher
+from designate_enhancedhandler import eventlog
+from designate_enhancedhandler.indexes import AddressEntry
+from designate_enhancedhandler.indexes import get_fixed_address_index
+from designate_enhancedhandler.paging import iter_items
+from designate_enhancedhandler.partition import Partitioner
+from designate_enhancedhandler import metrics
+from designate_enhancedhandler.ratelimit import AdaptiveLimiter
+from designate_enhancedhandler.ratelimit import RateLimitedCentralAPI
+from designate_enhancedhandler.ratelimit import TokenBucket
+from designate_enhancedhandler.retry import RetryQueue
+from designate_enhancedhandler.store import get_record_store
+from designate_enhancedhandler.sweeper import SnapshotLiveness
+from designate_enhancedhandler.sweeper import Sweeper
+from designate_enhancedhandler.zone_index import ReverseZoneIndex
 
 LOG = logging.getLogger(__name__)
 
+# Options shared by the enhanced handlers. Each handler registers them in its own group.
+OPTS = [
+    cfg.IntOpt('reverse-domains-ttl', default=300,
+               help='Seconds after which the reverse zones index is reloaded'),
+    cfg.IntOpt('reverse-domains-miss-interval', default=30,
+               help='Minimum seconds between reloads of the reverse zones index caused by a lookup miss'),
+    cfg.IntOpt('domain-cache-size', default=1024,
+               help='Maximum number of tenants whose domain is cached (0 disables the cache)'),
+    cfg.IntOpt('domain-cache-ttl', default=300,
+               help='Seconds a tenant domain is cached'),
+    cfg.IntOpt('domain-cache-negative-ttl', default=30,
+               help='Seconds a tenant without domain is remembered'),
+    cfg.IntOpt('create-concurrency', default=1,
+               help='Maximum number of records of a notification created at the same time (1 creates them serially)'),
+    cfg.IntOpt('delete-concurrency', default=4,
+               help='Maximum number of recordsets of a notification whose records are deleted at the same time'),
+    cfg.FloatOpt('coalesce-window', default=0,
+                 help='Seconds notifications are buffered per resource so that superseded ones are discarded '
+                      '(0 processes them immediately)'),
+    cfg.IntOpt('fixed-address-index-size', default=100000,
+               help='Maximum number of fixed addresses whose direct record is kept in memory'),
+    cfg.BoolOpt('fixed-address-index-warmup', default=False,
+                help='Load the fixed addresses index from designate-central at startup'),
+    cfg.IntOpt('dedup-window', default=0,
+               help='Seconds a notification is remembered to discard its redeliveries (0 disables it)'),
+    cfg.IntOpt('dedup-size', default=100000,
+               help='Maximum number of notifications remembered to discard redeliveries'),
+    cfg.StrOpt('dedup-path', default='',
+               help='SQLite file where the notifications seen are stored to discard redeliveries after a restart'),
+    cfg.IntOpt('dispatch-workers', default=0,
+               help='Number of green threads processing notifications, partitioned by tenant or resource '
+                    '(0 processes them in the thread that receives them)'),
+    cfg.IntOpt('dispatch-queue-size', default=1000,
+               help='Maximum notifications waiting per dispatch worker before blocking the consumer'),
+    cfg.DictOpt('dispatch-lanes', default={},
+                help='Weights of the lanes in which the notifications wait for a dispatch worker, '
+                     'eg. urgent:4,default:1'),
+    cfg.DictOpt('dispatch-event-lanes', default={},
+                help='Lane of each event type, eg. floatingip.update.end:urgent. The rest go to the default lane'),
+    cfg.ListOpt('metrics-sinks', default=[],
+                help='Sinks of the designate-central calls and processing metrics: statsd, dump '
+                     '(empty disables the metrics)'),
+    cfg.IntOpt('metrics-interval', default=60,
+               help='Seconds between flushes of the gauges and dumps of the metrics'),
+    cfg.StrOpt('metrics-dump-path', default='',
+               help='File where the metrics are appended as JSON lines by the dump sink (empty logs them)'),
+    cfg.StrOpt('statsd-host', default='127.0.0.1',
+               help='Host of the statsd daemon'),
+    cfg.IntOpt('statsd-port', default=8125,
+               help='UDP port of the statsd daemon'),
+    cfg.StrOpt('statsd-prefix', default='designate.enhancedhandler',
+               help='Prefix of the metrics sent to statsd, followed by the handler name'),
+    cfg.IntOpt('sweep-interval', default=0,
+               help='Seconds between sweeps of the managed records whose resource is no longer alive '
+                    '(0 disables them)'),
+    cfg.StrOpt('sweep-liveness-path', default='',
+               help='Snapshot of the alive instances and floating IPs, as used by the reconciler'),
+    cfg.FloatOpt('sweep-rate', default=10,
+                 help='Maximum orphan records deleted per second (0 does not limit them)'),
+    cfg.IntOpt('sweep-page-size', default=1000,
+               help='Managed records read from designate-central per call while sweeping'),
+    cfg.StrOpt('sweep-checkpoint-path', default='',
+               help='File where the progress of a sweep is saved to resume it after a restart'),
+    cfg.FloatOpt('central-rate', default=0,
+                 help='Maximum calls per second to designate-central (0 does not limit them)'),
+    cfg.IntOpt('central-burst', default=10,
+               help='Calls to designate-central allowed at once over central-rate'),
+    cfg.FloatOpt('central-tenant-rate', default=0,
+                 help='Maximum calls per second to designate-central on behalf of a tenant (0 does not limit them)'),
+    cfg.IntOpt('central-tenant-burst', default=5,
+               help='Calls to designate-central on behalf of a tenant allowed at once over central-tenant-rate'),
+    cfg.IntOpt('central-max-concurrency', default=0,
+               help='Maximum calls in flight to designate-central, adjusted to its latency and errors '
+                    '(0 does not limit them)'),
+    cfg.IntOpt('central-min-concurrency', default=1,
+               help='Minimum calls in flight allowed to designate-central when it is slow or failing'),
+    cfg.FloatOpt('central-latency-target', default=1.0,
+                 help='Seconds of a call to designate-central over which the calls in flight are reduced'),
+    cfg.IntOpt('retry-max-attempts', default=0,
+               help='Times a notification whose processing failed is attempted before giving up '
+                    '(0 does not retry them)'),
+    cfg.FloatOpt('retry-base-delay', default=1.0,
+                 help='Seconds before the first retry of a notification, doubled on every attempt'),
+    cfg.FloatOpt('retry-max-delay', default=300.0,
+                 help='Maximum seconds between retries of a notification'),
+    cfg.StrOpt('retry-journal-path', default='',
+               help='SQLite file where the notifications pending to be retried are stored to resume them '
+                    'after a restart'),
+    cfg.StrOpt('retry-dead-letter-path', default='',
+               help='File where the notifications that failed every attempt are appended as JSON lines'),
+    cfg.IntOpt('recordset-cache-size', default=10000,
+               help='Maximum number of recordset ids cached by domain, name and type (0 disables the cache)'),
+    cfg.IntOpt('recordset-cache-ttl', default=300,
+               help='Seconds the id of a recordset is cached'),
+    cfg.IntOpt('domains-page-size', default=1000,
+               help='Domains read from designate-central per call when loading the reverse zones'),
+    cfg.IntOpt('load-page-size', default=1000,
+               help='Managed records and recordsets read from designate-central per call when loading the indexes '
+                    'at startup'),
+    cfg.BoolOpt('warmup', default=False,
+                help='Load the tenant domains and the reverse zones at startup, and refresh them in the '
+                     'background instead of when they expire'),
+    cfg.IntOpt('warmup-timeout', default=60,
+               help='Maximum seconds notifications wait for the warm-up to finish before being processed'),
+    cfg.StrOpt('record-store-path', default='',
+               help='SQLite file where the records created are stored, so deletions and floating IP '
+                    'associations do not query designate-central'),
+    cfg.FloatOpt('batch-interval', default=0,
+                 help='Seconds the records to create in a zone are collected to write them in a single burst '
+                      'per zone (0 writes them immediately)'),
+    cfg.IntOpt('batch-size', default=100,
+               help='Maximum records collected per zone before writing them'),
+    cfg.BoolOpt('log-summary', default=False,
+                help='Log a structured summary line per notification, and the payloads and the records '
+                     'processed at DEBUG'),
+    cfg.FloatOpt('log-payload-sample-rate', default=0.0,
+                 help='Fraction of the notifications whose payload is logged at INFO with log-summary'),
+    cfg.IntOpt('log-warning-burst', default=0,
+               help='Maximum repeated warnings of a kind (eg. tenants without domain) logged per event type '
+                    'every log-warning-interval seconds (0 does not limit them)'),
+    cfg.IntOpt('log-warning-interval', default=60,
+               help='Seconds of the window in which repeated warnings are limited'),
+    cfg.ListOpt('partition-members', default=[],
+                help='Nodes among which the notifications are partitioned by consistent hashing of the tenant '
+                     '(nova) or resource (neutron). Every node must receive every notification'),
+    cfg.StrOpt('partition-members-path', default='',
+               help='File with the nodes among which the notifications are partitioned, one per line. It is '
+                    'reloaded when modified'),
+    cfg.StrOpt('partition-node', default='',
+               help='Name of this node among the partition members (the host name by default)'),
+]
+
+# Cached for tenants without domain
+NO_DOMAIN = object()
+
 
 class BaseEnhancedHandler(NotificationHandler):
     """Base Enhanced Handler"""
 
+    # Event types buffered when notifications are coalesced
+    coalesced_event_types = ()
+    # Event types whose payload is unique per occurrence, so a repeated one is a redelivery
+    deduplicated_event_types = ()
+
+    def __init__(self, *args, **kwargs):
+        super(BaseEnhancedHandler, self).__init__(*args, **kwargs)
+        config = cfg.CONF[self.name]
+        self._event_log = eventlog.EventLog(config.log_summary, config.log_payload_sample_rate,
+                                            config.log_warning_burst, config.log_warning_interval)
+        # Warmed up zones are refreshed in the background, so they do not expire on lookups
+        self._reverse_index = ReverseZoneIndex(self._load_domains,
+                                               None if config.warmup else config.reverse_domains_ttl,
+                                               config.reverse_domains_miss_interval)
+        self._domain_cache = LRUCache(config.domain_cache_size, config.domain_cache_ttl)
+        self._warm_tenants = set()
+        self._ready = event.Event()
+        self._recordset_cache = LRUCache(config.recordset_cache_size, config.recordset_cache_ttl)
+        self._batcher = None
+        if config.batch_interval > 0:
+            self._batcher = ZoneBatcher(config.batch_interval, config.batch_size, self._write_batch)
+        self._fixed_address_index = get_fixed_address_index(config.fixed_address_index_size)
+        self._record_store = None
+        if config.record_store_path:
+            self._record_store = get_record_store(config.record_store_path)
+        self._duplicate_filter = None
+        if config.dedup_window > 0:
+            self._duplicate_filter = DuplicateFilter(config.dedup_window, config.dedup_size, config.dedup_path)
+        self._dispatcher = None
+        self._event_lanes = None
+        if config.dispatch_workers > 0:
+            lanes = None
+            if config.dispatch_lanes or config.dispatch_event_lanes:
+                self._event_lanes = dict(config.dispatch_event_lanes)
+                lanes = dict((lane, float(weight)) for lane, weight in config.dispatch_lanes.items())
+                for lane in list(self._event_lanes.values()) + [DEFAULT_LANE]:
+                    lanes.setdefault(lane, 1.0)
+            self._dispatcher = ShardedDispatcher(config.dispatch_workers, config.dispatch_queue_size, self._process,
+                                                 lanes, self._on_dequeue)
+        self._partitioner = None
+        if config.partition_members or config.partition_members_path:
+            self._partitioner = Partitioner(config.partition_node or socket.gethostname(), config.partition_members,
+                                            config.partition_members_path or None)
+        self._coalescer = None
+        if config.coalesce_window > 0:
+            self._coalescer = Coalescer(config.coalesce_window, self._dispatch, self._coalesce_notifications)
+        self._metrics = None
+        if config.metrics_sinks:
+            self._setup_metrics(config)
+        if config.central_rate > 0 or config.central_tenant_rate > 0 or config.central_max_concurrency > 0:
+            self._setup_rate_limit(config)
+        self._retry_queue = None
+        if config.retry_max_attempts > 1:
+            self._retry_queue = RetryQueue(self._run, config.retry_max_attempts, config.retry_base_delay,
+                                           config.retry_max_delay, config.retry_journal_path or None,
+                                           config.retry_dead_letter_path or None)
+        if config.warmup:
+            eventlet.spawn_n(self._warm_up, config.domain_cache_ttl)
+        else:
+            self._ready.send()
+        self._sweeper = None
+        if config.sweep_interval > 0 and config.sweep_liveness_path:
+            self._sweeper = Sweeper(self, SnapshotLiveness(config.sweep_liveness_path), config.sweep_page_size,
+                                    config.sweep_rate, config.sweep_checkpoint_path or None)
+            eventlet.spawn_n(self._sweeper.run, config.sweep_interval)
+
+    def _setup_metrics(self, config):
+        sinks = []
+        for name in config.metrics_sinks:
+            if name == 'statsd':
+                sinks.append(metrics.StatsdSink(config.statsd_host, config.statsd_port,
+                                                '%s.%s' % (config.statsd_prefix, self.get_plugin_name())))
+            elif name == 'dump':
+                sinks.append(metrics.DumpSink(config.metrics_dump_path))
+            else:
+                LOG.warn('Unknown metrics sink: %s', name)
+        self._metrics = metrics.Metrics(sinks)
+        self._metrics.register_gauge('cache.domain.hit_ratio', self._domain_cache.hit_ratio)
+        self._metrics.register_gauge('cache.recordset.hit_ratio', self._recordset_cache.hit_ratio)
+        self._metrics.register_gauge('cache.reverse_zone.hit_ratio', self._reverse_index.hit_ratio)
+        self._metrics.register_gauge('cache.fixed_address.hit_ratio', self._fixed_address_index.hit_ratio)
+        if self._dispatcher is not None:
+            self._metrics.register_gauge('dispatch.queued', lambda: sum(self._dispatcher.depths()))
+        if self._event_lanes is not None:
+            for lane in self._dispatcher.lanes:
+                self._metrics.register_gauge(metrics.metric_name('dispatch', lane, 'queued'),
+                                             lambda lane=lane: self._dispatcher.lane_depths()[lane])
+                self._metrics.register_gauge(metrics.metric_name('dispatch', lane, 'age'),
+                                             lambda lane=lane: self._dispatcher.lane_ages()[lane])
+        self.central_api = metrics.InstrumentedCentralAPI(self.central_api, self._metrics)
+        self._metrics.start(config.metrics_interval)
+
+    def _setup_rate_limit(self, config):
+        bucket = None
+        if config.central_rate > 0:
+            bucket = TokenBucket(config.central_rate, config.central_burst)
+        limiter = None
+        if config.central_max_concurrency > 0:
+            limiter = AdaptiveLimiter(config.central_min_concurrency, config.central_max_concurrency,
+                                      config.central_latency_target)
+            if self._metrics is not None:
+                self._metrics.register_gauge('central.concurrency_limit', lambda: int(limiter.limit))
+        # Wrap the instrumented API, if any, so the metrics measure the calls without the waits
+        self.central_api = RateLimitedCentralAPI(self.central_api, bucket, config.central_tenant_rate,
+                                                 config.central_tenant_burst, limiter)
+
     def get_exchange_topics(self):
         exchange = cfg.CONF[self.name].control_exchange
         topics = [topic for topic in cfg.CONF[self.name].notification_topics]
         return (exchange, topics)
 
+    def is_ready(self):
+        """Check whether the warm-up, if any, finished"""
+        return self._ready.ready()
+
+    def _wait_ready(self):
+        if self._ready.ready():
+            return
+        timeout = cfg.CONF[self.name].warmup_timeout
+        with eventlet.Timeout(timeout, False):
+            self._ready.wait()
+        if not self._ready.ready():
+            LOG.warn('The warm-up did not finish in %d seconds. Processing notifications without it', timeout)
+            self._ready.send()
+
+    def _warm_up(self, interval):
+        """Load the domains and refresh them every `interval` seconds"""
+        try:
+            self._refresh_domains()
+        except Exception as e:
+            LOG.error('Error warming up the domains. %s', e)
+        if not self._ready.ready():
+            self._ready.send()
+        while True:
+            eventlet.sleep(interval)
+            try:
+                self._refresh_domains()
+            except Exception as e:
+                LOG.error('Error refreshing the domains. The cached ones are kept. %s', e)
+
+    def _refresh_domains(self):
+        """Load every domain into the reverse zones index and the domain cache.
+
+        The domains of the tenants are cached without expiration, since they are refreshed here,
+        except for tenants with several domains, which are left to find_domain.
+        """
+        domains = self._load_domains()
+        self._reverse_index.load(domains)
+        tenant_domains = {}
+        for domain in domains:
+            if not domain.name.endswith('.arpa.'):
+                tenant_domains.setdefault(domain.tenant_id, []).append(domain)
+        tenants = set()
+        for tenant_id, candidates in tenant_domains.items():
+            if len(candidates) == 1:
+                self._domain_cache.set(tenant_id, {'id': candidates[0].id, 'name': candidates[0].name},
+                                       NO_EXPIRATION)
+                tenants.add(tenant_id)
+        for tenant_id in self._warm_tenants - tenants:
+            self._domain_cache.delete(tenant_id)
+        self._warm_tenants = tenants
+        LOG.info('Loaded %d domains of %d tenants', len(domains), len(tenants))
+
+    def process_notification(self, context, event_type, payload):
+        if (self._partitioner is not None and
+                not self._partitioner.owns(self._get_partition_key(event_type, payload))):
+            LOG.debug('Skipping notification: %s owned by another node', event_type)
+            if self._metrics is not None:
+                self._metrics.increment('notifications.skipped')
+            return
+        self._wait_ready()
+        if (self._duplicate_filter is not None and event_type in self.deduplicated_event_types and
+                self._duplicate_filter.seen(notification_digest(event_type, payload))):
+            LOG.info('Discarding duplicate notification: %s', event_type)
+            if self._metrics is not None:
+                self._metrics.increment('notifications.duplicates')
+            return
+        notification = Notification(context, event_type, payload)
+        if self._coalescer is None:
+            self._dispatch(notification)
+        else:
+            self._coalescer.submit(self._get_resource_id(event_type, payload), notification,
+                                   event_type in self.coalesced_event_types)
+
+    def _dispatch(self, notification):
+        if self._dispatcher is None:
+            self._process(notification)
+        elif self._event_lanes is None:
+            self._dispatcher.submit(self._get_partition_key(notification.event_type, notification.payload),
+                                    notification)
+        else:
+            # The notifications of a resource keep their order even if they go to different lanes
+            self._dispatcher.submit(self._get_partition_key(notification.event_type, notification.payload),
+                                    notification, self._event_lanes.get(notification.event_type),
+                                    self._get_ordering_key(notification.event_type, notification.payload))
+
+    def _on_dequeue(self, lane, waited):
+        if self._metrics is not None:
+            self._metrics.timing(metrics.metric_name('dispatch', lane, 'wait'), waited)
+
+    def _process(self, notification):
+        if self._retry_queue is None:
+            self._run(notification)
+            return
+        key = self._get_ordering_key(notification.event_type, notification.payload)
+        if self._retry_queue.pending(key):
+            # Keep the order of the notifications of the resource
+            self._retry_queue.submit(key, notification)
+            return
+        try:
+            self._run(notification)
+        except Exception as e:
+            LOG.warn('Error processing %s for %s. Retrying. %s', notification.event_type, key, e)
+            self._retry_queue.submit(key, notification, 1)
+
+    def _run(self, notification):
+        event_type = notification.event_type
+        summary = self._event_log.begin(event_type, self._get_resource_id(event_type, notification.payload))
+        name = None
+        if self._metrics is not None:
+            metrics.set_current_event_type(event_type)
+            name = metrics.metric_name('event', event_type)
+        started = time.time()
+        error = None
+        try:
+            self._process_notification(notification.context, event_type, notification.payload)
+        except Exception as e:
+            error = e
+            if name is not None:
+                self._metrics.increment(name + '.errors')
+            raise
+        finally:
+            if name is not None:
+                self._metrics.timing(name, time.time() - started)
+                metrics.set_current_event_type(None)
+            self._event_log.end(LOG, summary, error)
+
+    def _process_notification(self, context, event_type, payload):
+        raise NotImplementedError()
+
+    def _get_resource_id(self, event_type, payload):
+        """Identifier of the resource (instance, floating IP, port) a notification refers to"""
+        raise NotImplementedError()
+
+    def _get_ordering_key(self, event_type, payload):
+        """Key of the notifications that must be processed in order, even in different lanes"""
+        return self._get_resource_id(event_type, payload)
+
+    def _get_partition_key(self, event_type, payload):
+        """Key of the notifications processed by the same dispatch worker and node"""
+        return self._get_ordering_key(event_type, payload)
+
+    def _coalesce_notifications(self, notifications):
+        """Select which of the notifications buffered for a resource are processed"""
+        return notifications
+
     def _get_context(self, tenant_id=None):
         if tenant_id:
             return DesignateContext.get_admin_context(tenant=tenant_id, edit_managed_records=True)
@@ -41,106 +460,445 @@ class BaseEnhancedHandler(NotificationHandler):
             return DesignateContext.get_admin_context(all_tenants=True, edit_managed_records=True)
 
     def _get_domain(self, context):
-        return self.central_api.find_domain(context, {'tenant_id': context.tenant})
-
-    def _get_reverse_fqdn(self, address, version):
-        if version == 6:
-            # See https://en.wikipedia.org/wiki/IPv6_address#IPv6_addresses_in_the_Domain_Name_System
-            # Convert fdda:5cc1:23:4::1f into f100000000000000400032001cc5addf
-            revaddr = map(lambda x: x.ljust(4, '0'), address[::-1].split(':')).join('')
-            # Add a dot between each character and the suffix for IP v6
-            return list(revaddr).join('.') + '.ip6.arpa.'
-        else:
-            return '.'.join(address.split('.')[::-1]) + '.in-addr.arpa.'
+        domain = self._domain_cache.get(context.tenant)
+        if domain is None:
+            try:
+                domain = self.central_api.find_domain(context, {'tenant_id': context.tenant})
+            except exceptions.DomainNotFound:
+                self._domain_cache.set(context.tenant, NO_DOMAIN, cfg.CONF[self.name].domain_cache_negative_ttl)
+                raise
+            domain = {'id': domain['id'], 'name': domain['name']}
+            self._domain_cache.set(context.tenant, domain)
+        elif domain is NO_DOMAIN:
+            raise exceptions.DomainNotFound('No domain registered for tenant: %s' % context.tenant)
+        return domain
+
+    def _resolve_reverse(self, interfaces):
+        """Name of the PTR and reverse zone (or None) of every interface, resolved in a single pass.
 
-    def _get_reverse_domains(self, host_reverse_fqdn=None):
+        The name is the one in a RFC 2317 classless zone when the address belongs to one. The name
+        and zone of an invalid address are None, so only its PTR is skipped.
+        """
+        try:
+            return self._reverse_index.resolve_all([interface['address'] for interface in interfaces])
+        except ValueError:
+            pass
+        reverses = []
+        for interface in interfaces:
+            try:
+                reverses.append(self._reverse_index.resolve(interface['address']))
+            except ValueError as e:
+                self._event_log.warn(LOG, 'invalid_address', 'Skipping the reverse record of interface: %s. %s',
+                                     interface.get('label'), e)
+                reverses.append((None, None))
+        return reverses
+
+    def _load_domains(self):
         context = self._get_context()
-        # TODO: Test if we could get reverse_domains directly with:
-        # reverse_domains = self.central_api.find_domains(context, {'name': '*.arpa.'})
-        domains = self.central_api.find_domains(context)
-        reverse_domains = filter(lambda x: x.name.endswith('.arpa.'), domains)
-        if host_reverse_fqdn:
-            return filter(lambda x: host_reverse_fqdn.endswith(x.name), reverse_domains)
-        else:
-            return reverse_domains
+        return list(iter_items(self.central_api.find_domains, context, None, cfg.CONF[self.name].domains_page_size))
+
+    def _load_fixed_addresses(self):
+        """Fill the fixed addresses index with the direct records managed by the nova handler"""
+        context = self._get_context()
+        page_size = cfg.CONF[self.name].load_page_size
+        records = list(iter_items(self.central_api.find_records, context, {
+            'managed': True,
+            'managed_plugin_name': 'nova_enhanced',
+            'managed_resource_type': 'instance'
+        }, page_size))
+        domain_ids = set(record['domain_id'] for record in records)
+        domains = dict((domain.id, domain) for domain in self._load_domains()
+                       if domain.id in domain_ids and not domain.name.endswith('.arpa.'))
+        recordsets = {}
+        for domain_id in domains:
+            for recordset in iter_items(self.central_api.find_recordsets, context, {'domain_id': domain_id},
+                                        page_size):
+                recordsets[recordset['id']] = recordset
+        for record in records:
+            recordset = recordsets.get(record['recordset_id'])
+            if recordset is None or recordset['type'] not in ('A', 'AAAA'):
+                continue
+            hostname, label = recordset['name'].split('.', 2)[:2]
+            self._fixed_address_index.add(domains[record['domain_id']].tenant_id,
+                                          record['data'],
+                                          record['managed_resource_id'],
+                                          AddressEntry(hostname, label, recordset['type'], record['domain_id']))
+        LOG.info('Loaded %d fixed addresses', len(self._fixed_address_index))
 
-    def _get_host_fqdn(self, domain, hostname, interface):
-        return cfg.CONF[self.name].get('format') % {
+    def _get_host_fqdn(self, domain, hostname, interface, plugin_name=None):
+        """Name of the record of an interface, in the format of the handler managing it (this one by default)"""
+        group = 'handler:%s' % plugin_name if plugin_name else self.name
+        return cfg.CONF[group].get('format') % {
             'hostname': hostname,
             'interface': interface['label'],
             'domain': domain['name']
         }
 
     def _create_record(self, context, managed, domain, host_fqdn, interface):
-        LOG.info('Create record for host: %s and interface: %s', host_fqdn, interface['label'])
+        """Create the direct record of an interface. Returns the record created, if any"""
+        LOG.log(self._event_log.detail_level, 'Create record for host: %s and interface: %s', host_fqdn,
+                interface['label'])
         recordset_type = 'AAAA' if interface['version'] == 6 else 'A'
-        try:
-            recordset = self.central_api.create_recordset(context,
-                                                          domain['id'],
-                                                          RecordSet(name=host_fqdn, type=recordset_type))
-        except exceptions.DuplicateRecordSet:
-            LOG.warn('The record: %s was already registered', host_fqdn)
-        else:
-            record_values = dict(managed, data=interface['address'])
-            LOG.debug('Creating record in %s / %s with values %r', domain['id'], recordset['id'], record_values)
-            self.central_api.create_record(context,
-                                           domain['id'],
-                                           recordset['id'],
-                                           Record(**record_values))
-
-    def _create_reverse_record(self, context, managed, host_fqdn, interface):
-        LOG.info('Create reverse record for interface: %s and address: %s', interface['label'], interface['address'])
-        host_reverse_fqdn = self._get_reverse_fqdn(interface['address'], interface['version'])
-        LOG.info('Create reverse record: %s', host_reverse_fqdn)
-        reverse_domains = self._get_reverse_domains(host_reverse_fqdn)
+        record = self._upsert_record(context, managed, domain['id'], host_fqdn, recordset_type, interface['address'])
+        if record and self._record_store is not None:
+            self._record_store.add(managed, context.tenant, interface['address'], host_fqdn, recordset_type,
+                                   interface['address'], record)
+        return record
+
+    def _create_reverse_record(self, context, managed, host_fqdn, interface, reverse=None):
+        """Create the reverse records of an interface. Returns the records created.
+
+        `reverse` is the (name, zone) of the PTR, when already resolved by _resolve_reverse.
+        """
+        LOG.log(self._event_log.detail_level, 'Create reverse record for interface: %s and address: %s',
+                interface['label'], interface['address'])
+        host_reverse_fqdn, reverse_domain = reverse or self._resolve_reverse([interface])[0]
+        LOG.log(self._event_log.detail_level, 'Create reverse record: %s', host_reverse_fqdn)
+        reverse_domains = [reverse_domain] if reverse_domain else []
         admin_context = DesignateContext.get_admin_context(all_tenants=True)
+        records = []
         for reverse_domain in reverse_domains:
-            LOG.info('Create reverse record for domain: %s', reverse_domain.name)
+            LOG.log(self._event_log.detail_level, 'Create reverse record for domain: %s', reverse_domain.name)
+            record = self._upsert_record(admin_context, managed, reverse_domain.id, host_reverse_fqdn, 'PTR', host_fqdn)
+            if record:
+                records.append(record)
+                if self._record_store is not None:
+                    self._record_store.add(managed, context.tenant, interface['address'], host_reverse_fqdn, 'PTR',
+                                           host_fqdn, record)
+        return records
+
+    def _upsert_record(self, context, managed, domain_id, name, recordset_type, data):
+        """Add a managed record to the recordset with the given name and type, creating it if needed.
+
+        The ids of the recordsets are cached, so a record added to a known recordset only takes a
+        call to designate-central. Returns the record created, or None if the recordset already
+        has a record with the same data.
+        """
+        if self._batcher is not None:
+            return self._batcher.submit(domain_id, (context, managed, name, recordset_type, data))
+        return self._write_record(context, managed, domain_id, name, recordset_type, data)
+
+    def _write_record(self, context, managed, domain_id, name, recordset_type, data):
+        key = (domain_id, name, recordset_type)
+        recordset_id = self._recordset_cache.get(key)
+        if recordset_id is not None:
             try:
-                recordset = self.central_api.create_recordset(admin_context,
-                                                              reverse_domain.id,
-                                                              RecordSet(name=host_reverse_fqdn, type='PTR'))
-            except exceptions.DuplicateRecordSet:
-                LOG.warn('The reverse record: %s was already registered', host_reverse_fqdn)
-            else:
-                record_values = dict(managed, data=host_fqdn)
-                LOG.debug('Creating reverse record in %s / %s with values %r',
-                          reverse_domain.id, recordset['id'], record_values)
-                self.central_api.create_record(admin_context,
-                                               reverse_domain.id,
-                                               recordset['id'],
-                                               Record(**record_values))
+                return self._add_record(context, managed, domain_id, recordset_id, name, data)
+            except exceptions.RecordSetNotFound:
+                LOG.debug('The cached recordset: %s of %s no longer exists', recordset_id, name)
+                self._recordset_cache.delete(key)
+        try:
+            recordset = self.central_api.create_recordset(context, domain_id,
+                                                          RecordSet(name=name, type=recordset_type))
+        except exceptions.DuplicateRecordSet:
+            recordset = self.central_api.find_recordset(context, {
+                'domain_id': domain_id,
+                'name': name,
+                'type': recordset_type
+            })
+            self._recordset_cache.set(key, recordset['id'])
+            if any(record['data'] == data for record in recordset['records']):
+                self._event_log.warn(LOG, 'duplicate', 'The record: %s with data: %s was already registered',
+                                     name, data)
+                return None
+            LOG.log(self._event_log.detail_level, 'Adding the record: %s to the existing recordset: %s', name,
+                    recordset['id'])
+        else:
+            self._recordset_cache.set(key, recordset['id'])
+        return self._add_record(context, managed, domain_id, recordset['id'], name, data)
+
+    def _write_batch(self, domain_id, items):
+        """Write the records collected for a zone, as (context, managed, name, type, data) items.
+
+        The records of a new recordset are created together with it in a single call. Returns a
+        (record, exception) tuple for each item.
+        """
+        recordsets = OrderedDict()
+        for index, (_, _, name, recordset_type, _) in enumerate(items):
+            recordsets.setdefault((name, recordset_type), []).append(index)
+        results = [(None, None)] * len(items)
+        for (name, recordset_type), indexes in recordsets.items():
+            if self._recordset_cache.get((domain_id, name, recordset_type)) is None:
+                try:
+                    records = self._create_recordset_records(domain_id, name, recordset_type,
+                                                             [items[index] for index in indexes])
+                except exceptions.DuplicateRecordSet:
+                    LOG.debug('The recordset: %s already exists. Adding the records one by one', name)
+                except Exception as e:
+                    for index in indexes:
+                        results[index] = (None, e)
+                    continue
+                else:
+                    for index in indexes:
+                        results[index] = (records.pop(items[index][4], None), None)
+                    continue
+            for index in indexes:
+                context, managed, _, _, data = items[index]
+                try:
+                    results[index] = (self._write_record(context, managed, domain_id, name, recordset_type, data),
+                                      None)
+                except Exception as e:
+                    results[index] = (None, e)
+        return results
+
+    def _create_recordset_records(self, domain_id, name, recordset_type, items):
+        """Create a recordset with the records of the given items. Returns the records created by data"""
+        LOG.log(self._event_log.detail_level, 'Create recordset: %s with %d records', name, len(items))
+        records = OrderedDict()
+        for _, managed, _, _, data in items:
+            records.setdefault(data, Record(**dict(managed, data=data)))
+        recordset = self.central_api.create_recordset(items[0][0], domain_id, RecordSet(
+            name=name, type=recordset_type, records=RecordList(objects=list(records.values()))))
+        self._recordset_cache.set((domain_id, name, recordset_type), recordset['id'])
+        return dict((record['data'], {'id': record['id'], 'domain_id': domain_id, 'recordset_id': recordset['id']})
+                    for record in recordset['records'])
+
+    def _add_record(self, context, managed, domain_id, recordset_id, name, data):
+        record_values = dict(managed, data=data)
+        LOG.debug('Creating record in %s / %s with values %r', domain_id, recordset_id, record_values)
+        try:
+            record = self.central_api.create_record(context, domain_id, recordset_id, Record(**record_values))
+        except exceptions.DuplicateRecord:
+            self._event_log.warn(LOG, 'duplicate', 'The record: %s with data: %s was already registered', name, data)
+            return None
+        return {'id': record['id'], 'domain_id': domain_id, 'recordset_id': recordset_id}
 
     def _create_records(self, context, managed, payload):
         try:
             domain = self._get_domain(context)
         except exceptions.DomainNotFound:
-            LOG.warn('There is no domain registered for tenant: %s', context.tenant)
+            self._event_log.warn(LOG, 'domain_not_found', 'There is no domain registered for tenant: %s',
+                                 context.tenant)
         except Exception as e:
             LOG.error('Error getting the domain for tenant: %s. %s', context.tenant, e)
+            if self._retry_queue is not None:
+                raise
         else:
             hostname = payload['hostname']
-            LOG.info('Creating records for host: %s in tenant: %s using domain: %s',
-                     hostname, context.tenant, domain['name'])
-            for interface in payload['fixed_ips']:
-                LOG.info('Create records for interface: %s', interface['label'])
-                host_fqdn = self._get_host_fqdn(domain, hostname, interface)
-                self._create_record(context, managed, domain, host_fqdn, interface)
-                self._create_reverse_record(context, managed, host_fqdn, interface)
+            LOG.log(self._event_log.detail_level, 'Creating records for host: %s in tenant: %s using domain: %s',
+                    hostname, context.tenant, domain['name'])
+            interfaces = payload['fixed_ips']
+            reverses = self._resolve_reverse(interfaces)
+            concurrency = cfg.CONF[self.name].create_concurrency
+            if self._batcher is not None:
+                # Submit every record before waiting, so they are written in the same bursts
+                concurrency = max(concurrency, 2 * len(interfaces))
+            if concurrency > 1:
+                self._create_interfaces_records(context, managed, domain, hostname, interfaces, concurrency, reverses)
+            else:
+                for interface, reverse in zip(interfaces, reverses):
+                    LOG.log(self._event_log.detail_level, 'Create records for interface: %s', interface['label'])
+                    host_fqdn = self._get_host_fqdn(domain, hostname, interface, managed['managed_plugin_name'])
+                    records = [self._create_host_record(context, managed, domain, hostname, host_fqdn, interface)]
+                    records.extend(self._create_reverse_record(context, managed, host_fqdn, interface, reverse))
+                    records = [record for record in records if record]
+                    eventlog.count('records_created', len(records))
+                    self._register_records(context, managed, records)
 
-    def _delete_records(self, context, managed):
+    def _create_host_record(self, context, managed, domain, hostname, host_fqdn, interface):
+        record = self._create_record(context, managed, domain, host_fqdn, interface)
+        self._register_address(context, managed, domain, hostname, interface)
+        return record
+
+    def _register_address(self, context, managed, domain, hostname, interface):
+        """Hook called once the direct record of an interface is registered"""
+        pass
+
+    def _register_records(self, context, managed, records):
+        """Hook called with the records created by _create_records"""
+        pass
+
+    def _create_interfaces_records(self, context, managed, domain, hostname, interfaces, concurrency, reverses):
+        """Create the direct and reverse records of every interface at the same time.
+
+        Every interface is processed even if another one fails. The first error is raised
+        once all of them are done.
+        """
+        calls = []
+        for interface, reverse in zip(interfaces, reverses):
+            LOG.log(self._event_log.detail_level, 'Create records for interface: %s', interface['label'])
+            host_fqdn = self._get_host_fqdn(domain, hostname, interface, managed['managed_plugin_name'])
+            calls.append((interface, functools.partial(self._create_host_record,
+                                                       context, managed, domain, hostname, host_fqdn, interface)))
+            calls.append((interface, functools.partial(self._create_reverse_record,
+                                                       context, managed, host_fqdn, interface, reverse)))
+        results = run_all([call for _, call in calls], concurrency)
+        errors = []
+        records = []
+        for (interface, _), (result, error) in zip(calls, results):
+            if error is not None:
+                LOG.error('Error creating records for interface: %s. %s', interface['label'], error)
+                errors.append(error)
+            elif isinstance(result, list):
+                records.extend(result)
+            elif result:
+                records.append(result)
+        eventlog.count('records_created', len(records))
+        self._register_records(context, managed, records)
+        if errors:
+            raise errors[0]
+
+    def _update_records(self, context, managed, payload):
+        """Create and delete only the records of the addresses added to or removed from a resource.
+
+        `payload` has the hostname and the new fixed_ips of the resource.
+        """
+        resource_id = managed['managed_resource_id']
+        old_addresses = self._get_resource_addresses(context, managed)
+        interfaces = dict((interface['address'], interface) for interface in payload['fixed_ips'])
+        removed = [address for address in old_addresses if address not in interfaces]
+        added = [interface for address, interface in interfaces.items() if address not in old_addresses]
+        if not removed and not added:
+            LOG.info('No address changed for resource: %s', resource_id)
+            return
+        LOG.info('Addresses of resource: %s. Added: %s. Removed: %s', resource_id,
+                 [interface['address'] for interface in added], removed)
+        for address in removed:
+            self._delete_address_records(context, managed, address)
+        if added:
+            self._create_records(context, managed, dict(payload, fixed_ips=added))
+
+    def _get_resource_addresses(self, context, managed):
+        """Fixed addresses with direct records of a resource.
+
+        The fixed addresses index is not used, since it may only know some of the addresses.
+        """
+        if self._record_store is not None:
+            addresses = self._record_store.get_addresses(managed)
+            if addresses:
+                return addresses
         records = self.central_api.find_records(context, managed)
+        # The data of the PTRs is the name of the host, ending with a dot
+        return set(record['data'] for record in records if not record['data'].endswith('.'))
+
+    def _delete_address_records(self, context, managed, address):
+        """Delete the direct record and the PTRs of an address of a resource"""
+        admin_context = self._get_context()
+        records = self._find_stored_records(managed, address)
+        if not records:
+            records = self._find_address_records(admin_context, managed, address)
+        if records:
+            self._delete_record_list(admin_context, records)
+        else:
+            LOG.log(self._event_log.detail_level, 'No record found to be deleted for address: %s', address)
+        self._fixed_address_index.remove(context.tenant, address, managed['managed_resource_id'])
+
+    def _find_address_records(self, context, managed, address):
+        """Find the direct record and the PTRs of an address of a resource in designate-central"""
+        records = list(self.central_api.find_records(context, dict(managed, data=address)))
+        host_reverse_fqdn = self._reverse_index.resolve(address)[0]
+        try:
+            recordset = self.central_api.find_recordset(context, {'name': host_reverse_fqdn, 'type': 'PTR'})
+        except exceptions.RecordSetNotFound:
+            pass
+        else:
+            records.extend(record for record in recordset['records']
+                           if record['managed_resource_id'] == managed['managed_resource_id'] and
+                           record['managed_plugin_name'] == managed['managed_plugin_name'])
+        return records
+
+    def _find_stored_records(self, managed, address=None):
+        """Records of a resource (or of the port in its managed extra) kept in the record store, if any"""
+        if self._record_store is None:
+            return []
+        if 'managed_resource_id' in managed:
+            return self._record_store.find(managed, address)
+        extra = managed.get('managed_extra') or ''
+        if extra.startswith('portid:'):
+            return self._record_store.find_port(extra[len('portid:'):])
+        return []
+
+    def _delete_records(self, context, managed):
+        # The records include the PTRs in the reverse zones, which are not owned by the tenant
+        context = self._get_context()
+        records = self._find_stored_records(managed)
+        if not records:
+            records = self.central_api.find_records(context, managed)
         if len(records) == 0:
-            LOG.info('No record found to be deleted')
+            LOG.log(self._event_log.detail_level, 'No record found to be deleted')
+        else:
+            self._delete_record_list(context, records)
+
+    def _delete_record_list(self, context, records):
+        """Delete the records grouped by recordset, processing several recordsets at the same time.
+
+        Every recordset is processed even if another one fails. When the notifications are
+        retried, the first error is raised once all of them are done.
+        """
+        recordsets = OrderedDict()
+        for record in records:
+            recordsets.setdefault((record['domain_id'], record['recordset_id']), []).append(record)
+        calls = [functools.partial(self._delete_recordset_records, context, domain_id, recordset_id, records)
+                 for (domain_id, recordset_id), records in recordsets.items()]
+        concurrency = cfg.CONF[self.name].delete_concurrency
+        if concurrency > 1 and len(calls) > 1:
+            results = run_all(calls, concurrency)
+        else:
+            results = []
+            for call in calls:
+                try:
+                    results.append((call(), None))
+                except Exception as e:
+                    results.append((None, e))
+        eventlog.count('records_deleted', sum(len(records) for records, (_, error) in zip(recordsets.values(), results)
+                                              if error is None))
+        if self._record_store is not None:
+            # Keep the records of the recordsets that failed, so a retry finds them again
+            self._record_store.remove(record['id'] for records, (_, error) in zip(recordsets.values(), results)
+                                      if error is None for record in records)
+        errors = [error for _, error in results if error is not None]
+        for error in errors:
+            LOG.error('Error deleting records. %s', error)
+        if errors and self._retry_queue is not None:
+            raise errors[0]
+
+    def _delete_recordset_records(self, context, domain_id, recordset_id, records):
+        """Delete the whole recordset when it only contains the given records, or the records otherwise"""
+        try:
+            recordset = self.central_api.find_recordset(context, {'id': recordset_id})
+            recordset_record_ids = set(record['id'] for record in recordset['records'])
+        except exceptions.RecordSetNotFound:
+            self._event_log.warn(LOG, 'not_found', 'There is no recordset registered with id: %s', recordset_id)
+            return
+        except Exception as e:
+            LOG.warn('Error getting recordset: %s. %s', recordset_id, e)
+            recordset_record_ids = None
+        if recordset_record_ids and recordset_record_ids <= set(record['id'] for record in records):
+            LOG.log(self._event_log.detail_level, 'Deleting recordset %s', recordset_id)
+            try:
+                self.central_api.delete_recordset(context, domain_id, recordset_id)
+            except exceptions.DomainNotFound:
+                LOG.warn('There is no domain registered with id: %s', domain_id)
+            except exceptions.RecordSetNotFound:
+                self._event_log.warn(LOG, 'not_found', 'The recordset: %s was already deleted', recordset_id)
+            except Exception as e:
+                LOG.error('Error deleting recordset: %s. %s', recordset_id, e)
+                if self._retry_queue is not None:
+                    raise
+                return
+            self._recordset_cache.delete((domain_id, recordset['name'], recordset['type']))
         else:
+            errors = []
             for record in records:
-                LOG.info('Deleting record %s', record['id'])
                 try:
-                    self.central_api.delete_record(context,
-                                                   record['domain_id'],
-                                                   record['recordset_id'],
-                                                   record['id'])
-                except exceptions.DomainNotFound:
-                    LOG.warn('There is no domain registered with id: %s', record['domain_id'])
+                    self._delete_record(context, record)
                 except Exception as e:
-                    LOG.error('Error deleting record: %s. %s', record['id'], e)
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+
+    def _delete_record(self, context, record):
+        LOG.log(self._event_log.detail_level, 'Deleting record %s', record['id'])
+        try:
+            self.central_api.delete_record(context,
+                                           record['domain_id'],
+                                           record['recordset_id'],
+                                           record['id'])
+        except exceptions.DomainNotFound:
+            LOG.warn('There is no domain registered with id: %s', record['domain_id'])
+        except exceptions.RecordNotFound:
+            self._event_log.warn(LOG, 'not_found', 'The record: %s was already deleted', record['id'])
+        except Exception as e:
+            LOG.error('Error deleting record: %s. %s', record['id'], e)
+            if self._retry_queue is not None:
+                raise
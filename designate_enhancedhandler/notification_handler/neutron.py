@@ -14,11 +14,20 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 
 from designate import exceptions
+from designate_enhancedhandler.cache import LRUCache
+from designate_enhancedhandler.cache import NO_EXPIRATION
+from designate_enhancedhandler.indexes import AddressEntry
+from designate_enhancedhandler.indexes import RecordIndex
 from designate_enhancedhandler.notification_handler.base import BaseEnhancedHandler
+from designate_enhancedhandler.notification_handler.base import OPTS
+from designate_enhancedhandler.paging import iter_items
+# Register the options of the nova handler, since the records of its instances are updated on port changes
+from designate_enhancedhandler.notification_handler import nova  # noqa
 
 
 LOG = logging.getLogger(__name__)
@@ -34,31 +43,162 @@ cfg.CONF.register_opts([
     cfg.ListOpt('notification-topics', default=['notifications']),
     cfg.StrOpt('control-exchange', default='neutron'),
     cfg.StrOpt('format', default='%(hostname)s.floating_%(interface)s.%(domain)s'),
+    cfg.IntOpt('port-index-size', default=100000,
+               help='Maximum number of floating IPs and ports whose records are kept in memory'),
+    cfg.BoolOpt('port-index-warmup', default=False,
+                help='Load the records of every floating IP at startup, so that deletions of unknown '
+                     'ports and floating IPs do not query designate-central'),
+    cfg.BoolOpt('sole-consumer', default=False,
+                help='This process is the only one consuming the neutron notifications, so the records '
+                     'index loaded at startup holds every record of floating IPs'),
 ], group='handler:neutron_enhanced')
+cfg.CONF.register_opts(OPTS, group='handler:neutron_enhanced')
 
 
 class NeutronEnhancedHandler(BaseEnhancedHandler):
     """Neutron Enhanced Handler"""
     __plugin_name__ = 'neutron_enhanced'
 
+    coalesced_event_types = ('floatingip.update.end',)
+    # A floating IP may be associated to the same port again, with the same payload
+    deduplicated_event_types = ('floatingip.delete.end', 'port.delete.end')
+
+    def __init__(self, *args, **kwargs):
+        super(NeutronEnhancedHandler, self).__init__(*args, **kwargs)
+        config = cfg.CONF[self.name]
+        self._record_index = RecordIndex(config.port_index_size)
+        # Floating IP last associated to each port, to order the deletion of the port after it
+        self._port_floatingips = LRUCache(config.port_index_size, NO_EXPIRATION)
+        # Otherwise the index misses the records created by other consumers since it was loaded
+        self._index_authoritative = config.sole_consumer and self._partitioner is None
+        if config.fixed_address_index_warmup:
+            eventlet.spawn_n(self._warm_fixed_address_index)
+        if config.port_index_warmup:
+            eventlet.spawn_n(self._warm_record_index)
+
+    def _warm_fixed_address_index(self):
+        try:
+            self._load_fixed_addresses()
+        except Exception as e:
+            LOG.error('Error loading the fixed addresses index. %s', e)
+
+    def _warm_record_index(self):
+        try:
+            self._load_record_index()
+        except Exception as e:
+            LOG.error('Error loading the floating IP records index. %s', e)
+
+    def _load_record_index(self):
+        context = self._get_context()
+        criterion = {
+            'managed': True,
+            'managed_plugin_name': self.get_plugin_name(),
+            'managed_resource_type': 'floatingip'
+        }
+        count = 0
+        for record in iter_items(self.central_api.find_records, context, criterion,
+                                 cfg.CONF[self.name].load_page_size):
+            self._record_index.add(self._get_record_keys(record), {
+                'id': record['id'],
+                'domain_id': record['domain_id'],
+                'recordset_id': record['recordset_id']
+            })
+            count += 1
+        self._record_index.mark_loaded()
+        LOG.info('Loaded %d managed records of floating IPs', count)
+
+    @staticmethod
+    def _get_record_keys(managed):
+        """Keys of the record index for records with the given managed values"""
+        keys = ['floatingip:%s' % managed['managed_resource_id']]
+        extra = managed.get('managed_extra') or ''
+        if extra.startswith('portid:'):
+            keys.append('port:%s' % extra[len('portid:'):])
+        return keys
+
+    def _register_records(self, context, managed, records):
+        if managed['managed_resource_type'] != 'floatingip':
+            # Records of an instance whose port changed, deleted by the nova handler
+            return
+        keys = self._get_record_keys(managed)
+        for record in records:
+            self._record_index.add(keys, record)
+
+    def _delete_indexed_records(self, context, managed, key):
+        records = self._record_index.pop(key)
+        if records:
+            # Admin context, since the PTRs live in the reverse zones of another tenant
+            self._delete_record_list(self._get_context(), records)
+        elif records is not None or (self._record_index.complete and self._index_authoritative):
+            LOG.log(self._event_log.detail_level, 'No record found to be deleted')
+        else:
+            # Looked up in the record store, if any, and then in designate-central
+            self._delete_records(context, managed)
+
     def get_event_types(self):
         return [
             'floatingip.update.end',
             'floatingip.delete.end',
+            'port.update.end',  # Event triggered when the fixed addresses of a port change
             'port.delete.end'  # Event triggered when a instance is removed
         ]
 
-    def _get_recordset(self, context, address):
-        record = self.central_api.find_record(context, {
-            'managed': True,
-            'data': address
-        })
-        return self.central_api.find_recordset(context, {
-            'id': record['recordset_id']
-        })
+    def _get_fixed_address(self, context, address):
+        entry = self._fixed_address_index.get(context.tenant, address)
+        if entry is None and self._record_store is not None:
+            entry = self._record_store.get_address(context.tenant, address)
+        if entry is None:
+            record = self.central_api.find_record(context, {
+                'managed': True,
+                'data': address
+            })
+            recordset = self.central_api.find_recordset(context, {
+                'id': record['recordset_id']
+            })
+            recordset_parsed = recordset['name'].split('.', 2)
+            entry = AddressEntry(recordset_parsed[0], recordset_parsed[1], recordset['type'], record['domain_id'])
+            if record.get('managed_resource_id'):
+                self._fixed_address_index.add(context.tenant, address, record['managed_resource_id'], entry)
+        return entry
 
-    def process_notification(self, ctx, event_type, payload):
-        LOG.info('EnhancedNeutronHandler notification: %s. %s', event_type, payload)
+    def _get_resource_id(self, event_type, payload):
+        if event_type == 'floatingip.update.end':
+            return payload['floatingip']['id']
+        elif event_type == 'floatingip.delete.end':
+            return payload['floatingip_id']
+        elif event_type == 'port.delete.end':
+            return payload['port_id']
+        else:
+            return payload['port']['id']
+
+    def _get_ordering_key(self, event_type, payload):
+        """The floating IP of floating IP notifications, also used for the deletion of its port.
+
+        The deletion of a port follows the floating IP last associated to it, so it is processed
+        after the association (of the last one, if the port has several). A port whose
+        association was not seen, eg. before a restart, is ordered by its own id.
+        """
+        if event_type == 'floatingip.update.end' and payload['floatingip'].get('port_id'):
+            self._port_floatingips.set(payload['floatingip']['port_id'], payload['floatingip']['id'])
+        elif event_type == 'port.delete.end':
+            return self._port_floatingips.get(payload['port_id'], payload['port_id'])
+        return self._get_resource_id(event_type, payload)
+
+    def _coalesce_notifications(self, notifications):
+        updates = [n for n in notifications if n.event_type == 'floatingip.update.end']
+        if len(updates) < len(notifications):
+            # The floating IP was deleted, which removes the records of any previous association
+            return [n for n in notifications if n.event_type != 'floatingip.update.end']
+        last = updates[-1]
+        if last.payload['floatingip']['fixed_ip_address']:
+            # Keep the last disassociation so the records of a previous association are removed
+            disassociations = [n for n in updates[:-1] if not n.payload['floatingip']['fixed_ip_address']]
+            if disassociations:
+                return [disassociations[-1], last]
+        return [last]
+
+    def _process_notification(self, ctx, event_type, payload):
+        LOG.log(self._event_log.payload_level(), 'EnhancedNeutronHandler notification: %s. %s', event_type, payload)
 
         managed = {
             'managed': True,
@@ -76,25 +216,24 @@ class NeutronEnhancedHandler(BaseEnhancedHandler):
                 managed['managed_extra'] = 'portid:%s' % payload['floatingip']['port_id']
             # If no fixed IP address, it means that the floating address has been unassigned
             if not payload['floatingip']['fixed_ip_address']:
-                self._delete_records(context, managed)
+                self._delete_indexed_records(context, managed, 'floatingip:%s' % payload['floatingip']['id'])
             else:
                 fixed_address = payload['floatingip']['fixed_ip_address']
                 floating_address = payload['floatingip']['floating_ip_address']
-                LOG.info('Assigning floating IP address: %s to fixed address: %s', floating_address, fixed_address)
+                LOG.log(self._event_log.detail_level, 'Assigning floating IP address: %s to fixed address: %s',
+                        floating_address, fixed_address)
                 try:
-                    recordset = self._get_recordset(context, fixed_address)
+                    fixed = self._get_fixed_address(context, fixed_address)
                 except exceptions.RecordNotFound:
-                    LOG.warn('Error assigning floating IP address: %s because fixed address: %s is not managed',
-                             floating_address, fixed_address)
+                    self._event_log.warn(LOG, 'unmanaged_address',
+                                         'Error assigning floating IP address: %s because fixed address: %s is not '
+                                         'managed', floating_address, fixed_address)
                 else:
-                    recordset_parsed = recordset['name'].split('.', 2)
-                    hostname = recordset_parsed[0]
-                    interface = recordset_parsed[1]
                     floating_payload = {
-                        'hostname': hostname,
+                        'hostname': fixed.hostname,
                         'fixed_ips': [{
-                            'label': interface,
-                            'version': 6 if recordset['type'] == 'AAAA' else 4,
+                            'label': fixed.label,
+                            'version': 6 if fixed.type == 'AAAA' else 4,
                             'address': floating_address
                         }]
                     }
@@ -102,8 +241,77 @@ class NeutronEnhancedHandler(BaseEnhancedHandler):
         elif event_type == 'floatingip.delete.end':
             context = self._get_context()
             managed['managed_resource_id'] = payload['floatingip_id']
-            self._delete_records(context, managed)
+            self._delete_indexed_records(context, managed, 'floatingip:%s' % payload['floatingip_id'])
+        elif event_type == 'port.update.end':
+            self._update_port(payload['port'])
         elif event_type == 'port.delete.end':
             context = self._get_context()
             managed['managed_extra'] = 'portid:%s' % payload['port_id']
-            self._delete_records(context, managed)
+            self._delete_indexed_records(context, managed, 'port:%s' % payload['port_id'])
+            self._fixed_address_index.remove_port(payload['port_id'])
+
+    @staticmethod
+    def _get_port_addresses(port):
+        return set(fixed_ip['ip_address'] for fixed_ip in port.get('fixed_ips') or [])
+
+    def _update_port(self, port):
+        """Update the records of the instance of a port whose fixed addresses changed.
+
+        Only the ports of instances whose addresses were updated are remembered. The first update
+        seen of a port is compared with the records of its instance in the record store or
+        designate-central: the records of the new addresses are created, but the addresses removed
+        cannot be told from the ones of the other ports of the instance, so their records are kept.
+        """
+        if not (port.get('device_owner') or '').startswith('compute:') or not port.get('device_id'):
+            return
+        addresses = self._get_port_addresses(port)
+        old_addresses = self._fixed_address_index.get_port(port['id'])
+        self._fixed_address_index.set_port(port['id'], addresses)
+        if old_addresses == addresses:
+            # An update of other attributes (eg. the status)
+            return
+        context = self._get_context(port['tenant_id'])
+        # The records belong to the instance, as if they were created by the nova handler
+        managed = {
+            'managed': True,
+            'managed_plugin_name': 'nova_enhanced',
+            'managed_plugin_type': self.get_plugin_type(),
+            'managed_resource_type': 'instance',
+            'managed_resource_id': port['device_id']
+        }
+        if old_addresses is None:
+            old_addresses = self._get_resource_addresses(context, managed)
+            removed = set()
+        else:
+            removed = old_addresses - addresses
+        added = sorted(addresses - old_addresses)
+        if not added and not removed:
+            return
+        fixed = None
+        if added:
+            # Name the new addresses like the previous ones, before their records are deleted
+            for address in sorted(old_addresses):
+                try:
+                    fixed = self._get_fixed_address(context, address)
+                    break
+                except exceptions.RecordNotFound:
+                    continue
+        LOG.info('Fixed addresses of port: %s. Added: %s. Removed: %s', port['id'], added, sorted(removed))
+        for address in removed:
+            self._delete_address_records(context, managed, address)
+        if not added:
+            return
+        if fixed is None:
+            LOG.warn('Error registering the addresses: %s of port: %s because its previous addresses are not managed',
+                     added, port['id'])
+            return
+        interfaces = [{
+            'label': fixed.label,
+            'version': 6 if ':' in address else 4,
+            'address': address
+        } for address in added]
+        self._create_records(context, managed, {'hostname': fixed.hostname, 'fixed_ips': interfaces})
+        for interface in interfaces:
+            entry = AddressEntry(fixed.hostname, fixed.label, 'AAAA' if interface['version'] == 6 else 'A',
+                                 fixed.domain_id)
+            self._fixed_address_index.add(context.tenant, interface['address'], port['device_id'], entry)
@@ -17,7 +17,9 @@
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from designate_enhancedhandler.indexes import AddressEntry
 from designate_enhancedhandler.notification_handler.base import BaseEnhancedHandler
+from designate_enhancedhandler.notification_handler.base import OPTS
 
 
 LOG = logging.getLogger(__name__)
@@ -33,21 +35,47 @@ cfg.CONF.register_opts([
     cfg.ListOpt('notification-topics', default=['notifications']),
     cfg.StrOpt('control-exchange', default='nova'),
     cfg.StrOpt('format', default='%(hostname)s.%(interface)s.%(domain)s'),
+    cfg.ListOpt('update-event-types', default=[],
+                help='Event types with the hostname and the whole fixed_ips of an instance whose addresses '
+                     'changed, eg. compute.instance.interface_attach.end'),
 ], group='handler:nova_enhanced')
+cfg.CONF.register_opts(OPTS, group='handler:nova_enhanced')
 
 
 class NovaEnhancedHandler(BaseEnhancedHandler):
     """Nova Enhanced Handler"""
     __plugin_name__ = 'nova_enhanced'
 
+    coalesced_event_types = ('compute.instance.create.end',)
+    deduplicated_event_types = ('compute.instance.create.end', 'compute.instance.delete.start')
+
     def get_event_types(self):
         return [
             'compute.instance.create.end',
             'compute.instance.delete.start',
-        ]
+        ] + cfg.CONF[self.name].update_event_types
+
+    def _get_resource_id(self, event_type, payload):
+        return payload['instance_id']
+
+    def _get_partition_key(self, event_type, payload):
+        return payload['tenant_id']
+
+    def _coalesce_notifications(self, notifications):
+        if (notifications[0].event_type == 'compute.instance.create.end' and
+                notifications[-1].event_type == 'compute.instance.delete.start'):
+            # Nothing was registered for the instance yet, so there is nothing to delete either
+            LOG.info('Instance %s was deleted before registering its records',
+                     notifications[0].payload['instance_id'])
+            return []
+        return notifications
+
+    def _register_address(self, context, managed, domain, hostname, interface):
+        entry = AddressEntry(hostname, interface['label'], 'AAAA' if interface['version'] == 6 else 'A', domain['id'])
+        self._fixed_address_index.add(context.tenant, interface['address'], managed['managed_resource_id'], entry)
 
-    def process_notification(self, ctx, event_type, payload):
-        LOG.info('EnhancedNovaHandler notification: %s. %s', event_type, payload)
+    def _process_notification(self, ctx, event_type, payload):
+        LOG.log(self._event_log.payload_level(), 'EnhancedNovaHandler notification: %s. %s', event_type, payload)
         tenant_id = payload['tenant_id']
         context = self._get_context(tenant_id)
 
@@ -63,3 +91,9 @@ class NovaEnhancedHandler(BaseEnhancedHandler):
             self._create_records(context, managed, payload)
         elif event_type == 'compute.instance.delete.start':
             self._delete_records(context, managed)
+            self._fixed_address_index.remove_resource(payload['instance_id'])
+        elif event_type in cfg.CONF[self.name].update_event_types:
+            if 'fixed_ips' not in payload:
+                LOG.debug('No fixed addresses in %s for instance: %s', event_type, payload['instance_id'])
+                return
+            self._update_records(context, managed, payload)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+def iter_pages(find, context, criterion, limit, marker=None):
+    """Iterate over the pages of a designate-central find_* call using marker pagination.
+
+    Each page is a list of at most `limit` items, in the order of designate-central. The id of
+    the last item of a page is the marker of the next one, so a scan can be resumed from any
+    page boundary.
+
+    The next page is fetched before a page is yielded, so the caller may delete the items of a
+    page (including the one used as marker) while iterating.
+    """
+    page = find(context, criterion, marker=marker, limit=limit)
+    while page:
+        following = None
+        if len(page) >= limit:
+            following = find(context, criterion, marker=page[-1]['id'], limit=limit)
+        yield page
+        page = following
+
+
+def iter_items(find, context, criterion, limit, marker=None):
+    """Iterate over the items of a designate-central find_* call, a page at a time"""
+    for page in iter_pages(find, context, criterion, limit, marker):
+        for item in page:
+            yield item
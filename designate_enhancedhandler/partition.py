@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import bisect
+import hashlib
+import os
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Points of each member in the ring, so the keys are evenly spread among few members
+REPLICAS = 100
+
+# Minimum seconds between checks of the modification time of the members file
+RELOAD_INTERVAL = 10
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def read_members(path):
+    """Members listed in a file, one per line. Empty lines and lines starting with # are ignored"""
+    with open(path) as members_file:
+        return [line.strip() for line in members_file if line.strip() and not line.strip().startswith('#')]
+
+
+class HashRing(object):
+    """Consistent hash ring assigning each key to one of the members.
+
+    When a member is added or removed, only the keys of that member move to (or from) others.
+    """
+
+    def __init__(self, members, replicas=REPLICAS):
+        self.members = sorted(set(members))
+        points = sorted((_hash('%s-%d' % (member, replica)), member)
+                        for member in self.members for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key):
+        """Member owning a key, or None if the ring has no members"""
+        if not self._owners:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class Partitioner(object):
+    """Decide which notifications are processed by this node among several consuming the same events.
+
+    The members are `members`, or the ones listed in the file at `path`, which is reloaded when
+    modified. A node that is not a member owns every key, so no notification is lost while the
+    membership is being updated.
+    """
+
+    def __init__(self, node, members=None, path=None, clock=time.time):
+        self.node = node
+        self._path = path
+        self._clock = clock
+        self._mtime = None
+        self._checked_at = None
+        self._ring = HashRing(members or [])
+        if path:
+            self._reload()
+        else:
+            self._check_membership()
+
+    def _check_membership(self):
+        if self.node not in self._ring.members:
+            LOG.error('The node: %s is not a member of the partition: %s. Processing every notification',
+                      self.node, self._ring.members)
+
+    def _reload(self):
+        self._checked_at = self._clock()
+        try:
+            mtime = os.stat(self._path).st_mtime
+            if mtime == self._mtime:
+                return
+            members = read_members(self._path)
+        except (IOError, OSError) as e:
+            LOG.error('Error reading the members of the partition from %s. Keeping the current ones. %s',
+                      self._path, e)
+            return
+        self._mtime = mtime
+        if sorted(set(members)) != self._ring.members or not members:
+            LOG.info('Members of the partition: %s', members)
+            self._ring = HashRing(members)
+            self._check_membership()
+
+    def owns(self, key):
+        """Check whether this node processes the notifications of a key"""
+        if self._path and self._clock() - self._checked_at >= RELOAD_INTERVAL:
+            self._reload()
+        owner = self._ring.owner(key or '')
+        return owner is None or owner == self.node or self.node not in self._ring.members
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import collections
+import time
+
+import eventlet
+from eventlet import event
+from oslo_log import log as logging
+
+from designate import exceptions
+from designate_enhancedhandler.cache import LRUCache
+
+LOG = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """Token bucket allowing `rate` operations per second with bursts of up to `burst` operations"""
+
+    def __init__(self, rate, burst, clock=time.time):
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._clock = clock
+        self._updated_at = clock()
+
+    def reserve(self):
+        """Take a token. Returns the seconds to wait before the operation may be done.
+
+        Tokens are taken even when not available yet, so concurrent callers are served in the
+        order they reserve them.
+        """
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def acquire(self, sleep=eventlet.sleep):
+        delay = self.reserve()
+        if delay > 0:
+            sleep(delay)
+
+
+class AdaptiveLimiter(object):
+    """Concurrency limit adjusted with additive increase and multiplicative decrease (AIMD).
+
+    The limit grows by one every `limit` calls completed within `latency_target` seconds, and it
+    is halved when a call is slower or fails because of designate-central (not because of a
+    designate error such as a duplicate record), at most once per `latency_target` seconds.
+    """
+
+    def __init__(self, minimum, maximum, latency_target, clock=time.time):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.latency_target = latency_target
+        self.limit = float(self.minimum)
+        self.in_flight = 0
+        self._clock = clock
+        self._decreased_at = None
+        self._waiters = collections.deque()
+
+    def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = event.Event()
+            self._waiters.append(waiter)
+            waiter.wait()
+        self.in_flight += 1
+
+    def release(self, latency, error=None):
+        self.in_flight -= 1
+        overloaded = latency > self.latency_target or (
+            error is not None and not isinstance(error, exceptions.Base))
+        if overloaded:
+            now = self._clock()
+            if self._decreased_at is None or now - self._decreased_at >= self.latency_target:
+                self._decreased_at = now
+                self.limit = max(self.minimum, self.limit / 2)
+                LOG.info('Slow or failed call to designate-central. Concurrency limit lowered to %d',
+                         int(self.limit))
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _wake(self):
+        # Woken callers check the limit again, since another one may have taken the slot first
+        for _ in range(int(self.limit) - self.in_flight):
+            if not self._waiters:
+                break
+            self._waiters.popleft().send()
+
+
+class RateLimitedCentralAPI(object):
+    """Proxy of the designate-central API limiting the rate and concurrency of the calls.
+
+    Every call takes a token from the global bucket and, when the context belongs to a tenant,
+    from the bucket of that tenant. The limiter, if any, bounds the calls in flight.
+    """
+
+    def __init__(self, central_api, bucket=None, tenant_rate=0, tenant_burst=1, limiter=None,
+                 tenant_buckets_size=10000, sleep=eventlet.sleep):
+        self._central_api = central_api
+        self._bucket = bucket
+        self._tenant_rate = tenant_rate
+        self._tenant_burst = tenant_burst
+        self._tenant_buckets = LRUCache(tenant_buckets_size, None)
+        self._limiter = limiter
+        self._sleep = sleep
+
+    def _get_tenant_bucket(self, context):
+        tenant_id = getattr(context, 'tenant', None)
+        if not self._tenant_rate or not tenant_id or getattr(context, 'all_tenants', False):
+            return None
+        bucket = self._tenant_buckets.get(tenant_id)
+        if bucket is None:
+            bucket = TokenBucket(self._tenant_rate, self._tenant_burst)
+            self._tenant_buckets.set(tenant_id, bucket)
+        return bucket
+
+    def _throttle(self, context):
+        delays = [bucket.reserve() for bucket in (self._bucket, self._get_tenant_bucket(context))
+                  if bucket is not None]
+        delay = max(delays or [0])
+        if delay > 0:
+            self._sleep(delay)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._central_api, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        def call(context, *args, **kwargs):
+            self._throttle(context)
+            if self._limiter is None:
+                return attribute(context, *args, **kwargs)
+            self._limiter.acquire()
+            started = time.time()
+            try:
+                result = attribute(context, *args, **kwargs)
+            except Exception as e:
+                self._limiter.release(time.time() - started, e)
+                raise
+            self._limiter.release(time.time() - started)
+            return result
+        return call
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import functools
+import json
+
+from collections import Counter
+from collections import OrderedDict
+
+from oslo_log import log as logging
+
+from designate import exceptions
+from designate_enhancedhandler.concurrency import run_all
+from designate_enhancedhandler.paging import iter_pages
+from designate_enhancedhandler.reverse import IPV4_SUFFIX
+from designate_enhancedhandler.reverse import IPV6_SUFFIX
+
+LOG = logging.getLogger(__name__)
+
+
+def read_snapshot(lines):
+    """Parse a snapshot of instances and floating IPs, a JSON object per line.
+
+    Instances have the fields of the nova notifications (`instance_id`, `tenant_id`, `hostname`
+    and `fixed_ips`). Floating IPs have `"type": "floatingip"` and the fields of the floating IPs
+    of neutron (`id`, `tenant_id`, `floating_ip_address`, `fixed_ip_address` and `port_id`).
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                LOG.warn('Skipping line %d of the snapshot: %s', number, e)
+
+
+class Reconciler(object):
+    """Make the records managed by the enhanced handlers match a snapshot of the cloud.
+
+    The snapshot is grouped by tenant and the domains of designate-central are reconciled one at
+    a time: the records the handlers would have created in the domain are computed with their own
+    naming logic, from the resources of its tenant or, for reverse zones, of every tenant. The
+    managed records of the domain are then read a page at a time: records not desired are deleted
+    as the pages are read, and the desired records not found are created afterwards,
+    `concurrency` at a time. The names of the recordsets of the domain are read, also a page at a
+    time, the first time a record is found. Only the desired records and the recordset names of
+    the domain being reconciled are kept in memory.
+
+    `handlers` maps the plugin names to reconcile (nova_enhanced, neutron_enhanced) to their
+    handler. The records of the plugins not given are left untouched.
+    """
+
+    def __init__(self, handlers, page_size=1000, concurrency=8, dry_run=False):
+        self.handlers = handlers
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.stats = Counter()
+        # Resources whose desired records are unknown because of an error; their records are kept
+        self._unknown = set()
+        self._recordset_names = {}
+
+    def reconcile(self, resources):
+        if not self.handlers:
+            return self.stats
+        tenants = OrderedDict()
+        for resource in resources:
+            tenants.setdefault(resource['tenant_id'], []).append(resource)
+        handler = next(iter(self.handlers.values()))
+        context = handler._get_context()
+        for page in iter_pages(handler.central_api.find_domains, context, None, self.page_size):
+            for domain in page:
+                if domain['name'].endswith((IPV4_SUFFIX, IPV6_SUFFIX)):
+                    groups = tenants.values()
+                else:
+                    groups = [tenants.get(domain['tenant_id'], [])]
+                self._reconcile_domain(domain['id'], groups)
+        LOG.info('Reconciliation finished: %s', dict(self.stats))
+        return self.stats
+
+    def _reconcile_domain(self, domain_id, groups):
+        """Reconcile the records of a domain with the resources of the groups, one group per tenant"""
+        desired = OrderedDict()
+        for resources in groups:
+            desired.update(self.get_desired(resources, domain_id))
+        self.stats['desired'] += len(desired)
+        for plugin_name, handler in self.handlers.items():
+            self._delete_stale(plugin_name, handler, desired, domain_id)
+        self._recordset_names.pop(domain_id, None)
+        self._create_missing(list(desired.items()))
+
+    def get_desired(self, resources, domain_id=None):
+        """Map (plugin name, resource id, name, data) to a call creating each record desired.
+
+        Only the records of the domain with id `domain_id` are returned, when given. The fixed
+        addresses of the floating IPs are looked up among the instances of `resources`.
+        """
+        desired = OrderedDict()
+        fixed_addresses = {}
+        floatingips = []
+        nova = self.handlers.get('nova_enhanced')
+        for resource in resources:
+            if resource.get('type') == 'floatingip':
+                floatingips.append(resource)
+                continue
+            for interface in resource['fixed_ips']:
+                fixed_addresses[(resource['tenant_id'], interface['address'])] = (resource['hostname'], interface)
+            if nova is not None:
+                managed = dict(self._get_managed(nova, 'instance'), managed_resource_id=resource['instance_id'])
+                self._add_desired(desired, nova, resource['tenant_id'], managed, resource['hostname'],
+                                  resource['fixed_ips'], domain_id)
+        neutron = self.handlers.get('neutron_enhanced')
+        if neutron is not None:
+            for floatingip in floatingips:
+                if not floatingip.get('fixed_ip_address'):
+                    continue
+                fixed = fixed_addresses.get((floatingip['tenant_id'], floatingip['fixed_ip_address']))
+                if fixed is None:
+                    LOG.warn('The fixed address: %s of floating IP: %s is not in the snapshot',
+                             floatingip['fixed_ip_address'], floatingip['id'])
+                    continue
+                hostname, fixed_interface = fixed
+                managed = dict(self._get_managed(neutron, 'floatingip'), managed_resource_id=floatingip['id'])
+                if floatingip.get('port_id'):
+                    managed['managed_extra'] = 'portid:%s' % floatingip['port_id']
+                interface = {
+                    'label': fixed_interface['label'],
+                    'version': fixed_interface['version'],
+                    'address': floatingip['floating_ip_address']
+                }
+                self._add_desired(desired, neutron, floatingip['tenant_id'], managed, hostname, [interface],
+                                  domain_id)
+        return desired
+
+    @staticmethod
+    def _get_managed(handler, resource_type):
+        return {
+            'managed': True,
+            'managed_plugin_name': handler.get_plugin_name(),
+            'managed_plugin_type': handler.get_plugin_type(),
+            'managed_resource_type': resource_type
+        }
+
+    def _add_desired(self, desired, handler, tenant_id, managed, hostname, interfaces, domain_id=None):
+        plugin_name = managed['managed_plugin_name']
+        resource_id = managed['managed_resource_id']
+        context = handler._get_context(tenant_id)
+        try:
+            domain = handler._get_domain(context)
+            for interface, reverse in zip(interfaces, handler._resolve_reverse(interfaces)):
+                host_fqdn = handler._get_host_fqdn(domain, hostname, interface)
+                if domain_id in (None, domain['id']):
+                    desired[(plugin_name, resource_id, host_fqdn, interface['address'])] = functools.partial(
+                        handler._create_record, context, managed, domain, host_fqdn, interface)
+                host_reverse_fqdn, reverse_domain = reverse
+                if reverse_domain and domain_id in (None, reverse_domain.id):
+                    desired[(plugin_name, resource_id, host_reverse_fqdn, host_fqdn)] = functools.partial(
+                        handler._create_reverse_record, context, managed, host_fqdn, interface, reverse)
+        except exceptions.DomainNotFound:
+            LOG.info('There is no domain registered for tenant: %s', tenant_id)
+        except Exception as e:
+            if (plugin_name, resource_id) not in self._unknown:
+                LOG.error('Error getting the records of resource: %s. Its records are kept. %s', resource_id, e)
+                self._unknown.add((plugin_name, resource_id))
+                self.stats['errors'] += 1
+
+    def _delete_stale(self, plugin_name, handler, desired, domain_id):
+        context = handler._get_context()
+        criterion = {'managed': True, 'managed_plugin_name': plugin_name, 'domain_id': domain_id}
+        for page in iter_pages(handler.central_api.find_records, context, criterion, self.page_size):
+            stale = []
+            for record in page:
+                self.stats['found'] += 1
+                resource_id = record['managed_resource_id']
+                name = self._get_recordset_name(handler, context, record)
+                if desired.pop((plugin_name, resource_id, name, record['data']), None) is None and \
+                        (plugin_name, resource_id) not in self._unknown:
+                    stale.append(record)
+            if stale:
+                self.stats['deleted'] += len(stale)
+                for record in stale:
+                    LOG.info('Stale record of %s: %s %s', record['managed_resource_id'],
+                             self._get_recordset_name(handler, context, record), record['data'])
+                if not self.dry_run:
+                    try:
+                        handler._delete_record_list(context, stale)
+                    except Exception:
+                        # Already logged per recordset
+                        self.stats['errors'] += 1
+
+    def _get_recordset_name(self, handler, context, record):
+        names = self._recordset_names.get(record['domain_id'])
+        if names is None:
+            names = self._recordset_names[record['domain_id']] = {}
+            for page in iter_pages(handler.central_api.find_recordsets, context,
+                                   {'domain_id': record['domain_id']}, self.page_size):
+                for recordset in page:
+                    names[recordset['id']] = recordset['name']
+        if record['recordset_id'] not in names:
+            # Created after the names of the domain were read
+            try:
+                names[record['recordset_id']] = handler.central_api.find_recordset(
+                    context, {'id': record['recordset_id']})['name']
+            except exceptions.RecordSetNotFound:
+                return None
+        return names[record['recordset_id']]
+
+    def _create_missing(self, missing):
+        self.stats['created'] += len(missing)
+        for key, _ in missing:
+            LOG.info('Missing record of %s: %s %s', key[1], key[2], key[3])
+        if self.dry_run:
+            return
+        for start in range(0, len(missing), self.page_size):
+            calls = [call for _, call in missing[start:start + self.page_size]]
+            for (key, _), (result, error) in zip(missing[start:start + self.page_size],
+                                                 run_all(calls, self.concurrency)):
+                if error is not None:
+                    LOG.error('Error creating the record of %s: %s %s. %s', key[1], key[2], key[3], error)
+                    self.stats['errors'] += 1
+                    self.stats['created'] -= 1
+                elif not result:
+                    # The recordset already has a record with the same data, not managed by the handlers
+                    self.stats['conflicts'] += 1
+                    self.stats['created'] -= 1
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import collections
+import json
+import random
+import sqlite3
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from designate_enhancedhandler.coalesce import Notification
+
+LOG = logging.getLogger(__name__)
+
+
+class _Entry(object):
+    __slots__ = ('notification', 'attempts', 'row_id')
+
+    def __init__(self, notification, attempts, row_id=None):
+        self.notification = notification
+        self.attempts = attempts
+        self.row_id = row_id
+
+
+class RetryQueue(object):
+    """Notifications whose processing failed, processed again with exponential backoff and jitter.
+
+    The notifications are queued per key (the resource they refer to) and each key is retried
+    in its own green thread, so a failing resource neither blocks the others nor gets its
+    notifications reordered: the notifications submitted for a key with pending retries wait
+    behind them. After `max_attempts`, a notification is appended to the dead letter file, if
+    any, as a JSON line with its event type and payload, so it can be replayed.
+
+    When `journal_path` is given, the queue is also stored in a SQLite database and resumed
+    after a restart.
+    """
+
+    def __init__(self, process, max_attempts, base_delay, max_delay, journal_path=None, dead_letter_path=None,
+                 sleep=eventlet.sleep, jitter=random.random):
+        self._process = process
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._dead_letter_path = dead_letter_path
+        self._sleep = sleep
+        self._jitter = jitter
+        self._queues = {}
+        self._db = None
+        if journal_path:
+            self._open(journal_path)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._queues.values())
+
+    def _open(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS retries (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, '
+                         'event_type TEXT NOT NULL, payload TEXT NOT NULL, attempts INTEGER NOT NULL)')
+        rows = self._db.execute('SELECT id, key, event_type, payload, attempts FROM retries ORDER BY id').fetchall()
+        for row_id, key, event_type, payload, attempts in rows:
+            self._enqueue(key, _Entry(Notification(None, event_type, json.loads(payload)), attempts, row_id))
+        if rows:
+            LOG.info('Resumed %d notifications pending to be retried', len(rows))
+
+    def pending(self, key):
+        """Check whether there are notifications of key waiting to be retried"""
+        return key in self._queues
+
+    def submit(self, key, notification, attempts=0):
+        """Queue a notification of key, already tried `attempts` times"""
+        entry = _Entry(notification, attempts)
+        if self._db is not None:
+            with self._db:
+                entry.row_id = self._db.execute(
+                    'INSERT INTO retries (key, event_type, payload, attempts) VALUES (?, ?, ?, ?)',
+                    (key, notification.event_type, json.dumps(notification.payload, default=str), attempts)).lastrowid
+        self._enqueue(key, entry)
+
+    def _enqueue(self, key, entry):
+        entries = self._queues.get(key)
+        if entries is None:
+            entries = self._queues[key] = collections.deque()
+            eventlet.spawn_n(self._retry, key, entries)
+        entries.append(entry)
+
+    def _backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        # Equal jitter: at least half of the delay, so the retries of an outage are spread out
+        return delay / 2 + self._jitter() * delay / 2
+
+    def _retry(self, key, entries):
+        while entries:
+            entry = entries[0]
+            if entry.attempts:
+                self._sleep(self._backoff(entry.attempts))
+            try:
+                self._process(entry.notification)
+            except Exception as e:
+                entry.attempts += 1
+                if entry.attempts < self.max_attempts:
+                    LOG.warn('Error processing %s for %s (attempt %d). Retrying. %s',
+                             entry.notification.event_type, key, entry.attempts, e)
+                    self._update(entry)
+                    continue
+                LOG.error('Error processing %s for %s after %d attempts. Giving up. %s',
+                          entry.notification.event_type, key, entry.attempts, e)
+                self._dead_letter(entry, e)
+            entries.popleft()
+            self._delete(entry)
+        del self._queues[key]
+
+    def _update(self, entry):
+        if self._db is not None:
+            with self._db:
+                self._db.execute('UPDATE retries SET attempts = ? WHERE id = ?', (entry.attempts, entry.row_id))
+
+    def _delete(self, entry):
+        if self._db is not None:
+            with self._db:
+                self._db.execute('DELETE FROM retries WHERE id = ?', (entry.row_id,))
+
+    def _dead_letter(self, entry, error):
+        if not self._dead_letter_path:
+            return
+        with open(self._dead_letter_path, 'a') as dead_letter:
+            dead_letter.write(json.dumps({
+                'event_type': entry.notification.event_type,
+                'payload': entry.notification.payload,
+                'attempts': entry.attempts,
+                'error': str(error),
+                'timestamp': time.time()
+            }, default=str) + '\n')
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import socket
+import struct
+
+IPV4_SUFFIX = 'in-addr.arpa.'
+IPV6_SUFFIX = 'ip6.arpa.'
+
+
+def parse_address(address):
+    """Version and integer value of an IPv4 or IPv6 address.
+
+    Raises ValueError if the address is not valid.
+    """
+    try:
+        if ':' in address:
+            # Drop the zone index of link-local addresses (eg. fe80::1%eth0)
+            high, low = struct.unpack('!QQ', socket.inet_pton(socket.AF_INET6, address.split('%', 1)[0]))
+            return 6, (high << 64) | low
+        return 4, struct.unpack('!I', socket.inet_pton(socket.AF_INET, address))[0]
+    except (socket.error, TypeError):
+        raise ValueError('Invalid IP address: %s' % address)
+
+
+def reverse_name(version, value):
+    """Name of the PTR of an address given as an integer, in the nibble format for IPv6"""
+    if version == 4:
+        return '%d.%d.%d.%d.%s' % (value & 0xff, (value >> 8) & 0xff, (value >> 16) & 0xff, value >> 24,
+                                   IPV4_SUFFIX)
+    return '.'.join(('%032x' % value)[::-1]) + '.' + IPV6_SUFFIX
+
+
+def reverse_fqdn(address):
+    """Name of the PTR of an address, eg. 22.3.168.192.in-addr.arpa. for 192.168.3.22"""
+    return reverse_name(*parse_address(address))
+
+
+def classless_range(zone_name):
+    """Range of the last octet delegated by a RFC 2317 classless zone, or None for other zones.
+
+    Both the `<first>/<prefix length>` and the `<first>-<last>` forms of the first label are
+    understood, eg. 0/26.2.0.192.in-addr.arpa. and 0-63.2.0.192.in-addr.arpa. delegate the
+    addresses 192.0.2.0 to 192.0.2.63.
+    """
+    labels = zone_name.rstrip('.').lower().split('.')
+    if len(labels) != 6 or '.'.join(labels[4:]) + '.' != IPV4_SUFFIX:
+        return None
+    first_label = labels[0]
+    try:
+        if '/' in first_label:
+            first, prefix_length = [int(value) for value in first_label.split('/', 1)]
+            if not 24 < prefix_length <= 32:
+                return None
+            last = first + 2 ** (32 - prefix_length) - 1
+        elif '-' in first_label:
+            first, last = [int(value) for value in first_label.split('-', 1)]
+        else:
+            return None
+    except ValueError:
+        return None
+    if not 0 <= first <= last <= 255:
+        return None
+    return first, last
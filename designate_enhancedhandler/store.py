@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sqlite3
+import time
+
+from designate_enhancedhandler.indexes import AddressEntry
+
+# Maximum ids per DELETE statement, below the SQLite limit of variables per statement
+DELETE_BATCH = 500
+
+_stores = {}
+
+
+def _record(row):
+    return {'id': row[0], 'domain_id': row[1], 'recordset_id': row[2]}
+
+
+class RecordStore(object):
+    """Records created by the handlers, stored in a SQLite database.
+
+    Every record is kept with the resource it belongs to (plugin, resource type and id), the
+    port in its managed extra, the tenant and fixed address it was created for, and its name,
+    type and data. Deleting the records of a resource or finding the host of a fixed address
+    then needs no query to designate-central, and the records are known after a restart.
+
+    The database uses write-ahead logging, so the handlers of several processes of a node may
+    share it.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self._clock = clock
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS records ('
+                         'id TEXT PRIMARY KEY, domain_id TEXT NOT NULL, recordset_id TEXT NOT NULL, '
+                         'plugin_name TEXT NOT NULL, resource_type TEXT NOT NULL, resource_id TEXT NOT NULL, '
+                         'port_id TEXT, tenant_id TEXT, address TEXT NOT NULL, '
+                         'name TEXT NOT NULL, type TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS records_resource_idx '
+                         'ON records (plugin_name, resource_type, resource_id)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS records_port_idx ON records (port_id)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS records_address_idx ON records (tenant_id, address)')
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def add(self, managed, tenant_id, address, name, recordset_type, data, record):
+        """Store a record created with the given managed values for the fixed or floating address"""
+        extra = managed.get('managed_extra') or ''
+        port_id = extra[len('portid:'):] if extra.startswith('portid:') else None
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (record['id'], record['domain_id'], record['recordset_id'],
+                              managed['managed_plugin_name'], managed['managed_resource_type'],
+                              managed['managed_resource_id'], port_id, tenant_id, address,
+                              name, recordset_type, data, self._clock()))
+
+    def find(self, managed, address=None):
+        """Get the records of a resource, or only those of one of its addresses"""
+        query = ('SELECT id, domain_id, recordset_id FROM records '
+                 'WHERE plugin_name = ? AND resource_type = ? AND resource_id = ?')
+        args = [managed['managed_plugin_name'], managed['managed_resource_type'], managed['managed_resource_id']]
+        if address is not None:
+            query += ' AND address = ?'
+            args.append(address)
+        return [_record(row) for row in self._db.execute(query, args)]
+
+    def find_port(self, port_id):
+        """Get the records of the floating IPs associated to a port"""
+        rows = self._db.execute('SELECT id, domain_id, recordset_id FROM records WHERE port_id = ?', (port_id,))
+        return [_record(row) for row in rows]
+
+    def get_addresses(self, managed):
+        """Get the addresses with records of a resource"""
+        rows = self._db.execute('SELECT DISTINCT address FROM records '
+                                'WHERE plugin_name = ? AND resource_type = ? AND resource_id = ?',
+                                (managed['managed_plugin_name'], managed['managed_resource_type'],
+                                 managed['managed_resource_id']))
+        return set(row[0] for row in rows)
+
+    def get_address(self, tenant_id, address):
+        """Get the naming details of the direct record of a fixed address of an instance, or None"""
+        row = self._db.execute("SELECT name, type, domain_id FROM records "
+                               "WHERE tenant_id = ? AND address = ? AND resource_type = 'instance' "
+                               "AND type IN ('A', 'AAAA') ORDER BY created_at DESC LIMIT 1",
+                               (tenant_id, address)).fetchone()
+        if row is None:
+            return None
+        hostname, label = row[0].split('.', 2)[:2]
+        return AddressEntry(hostname, label, row[1], row[2])
+
+    def remove(self, record_ids):
+        record_ids = list(record_ids)
+        with self._db:
+            for start in range(0, len(record_ids), DELETE_BATCH):
+                batch = record_ids[start:start + DELETE_BATCH]
+                self._db.execute('DELETE FROM records WHERE id IN (%s)' % ', '.join('?' * len(batch)), batch)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def get_record_store(path):
+    """Get the record store of a database shared by the handlers of this process"""
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = RecordStore(path)
+    return store
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import calendar
+import datetime
+import json
+import os
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from designate import exceptions
+from designate_enhancedhandler.paging import iter_pages
+from designate_enhancedhandler.ratelimit import TokenBucket
+from designate_enhancedhandler.reconcile import read_snapshot
+
+LOG = logging.getLogger(__name__)
+
+
+class SnapshotLiveness(object):
+    """Resources alive according to a snapshot file, as read by the reconciler.
+
+    Instances are alive while they are in the snapshot and floating IPs while they are in the
+    snapshot associated to a fixed address. The file is read again when it changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.timestamp = None
+        self._resource_ids = set()
+
+    def __len__(self):
+        return len(self._resource_ids)
+
+    def load(self):
+        timestamp = os.path.getmtime(self.path)
+        if timestamp == self.timestamp:
+            return
+        resource_ids = set()
+        with open(self.path) as snapshot:
+            for resource in read_snapshot(snapshot):
+                if resource.get('type') == 'floatingip':
+                    if resource.get('fixed_ip_address'):
+                        resource_ids.add(resource['id'])
+                else:
+                    resource_ids.add(resource['instance_id'])
+        self._resource_ids = resource_ids
+        self.timestamp = timestamp
+        LOG.info('Loaded %d alive resources from %s', len(resource_ids), self.path)
+
+    def is_alive(self, resource_id):
+        return resource_id in self._resource_ids
+
+
+def _epoch(value):
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+    return None
+
+
+class Sweeper(object):
+    """Delete the records managed by a handler whose resource is no longer alive.
+
+    The managed records are read in pages with marker pagination, under an all tenants context
+    so the PTRs of the shared reverse zones are also found. Orphans are deleted at most `rate`
+    per second (0 does not limit them). After every page, the marker is saved in the
+    checkpoint file, if any, so an interrupted sweep resumes where it stopped.
+
+    Records created after the liveness source was taken are never deleted.
+    """
+
+    def __init__(self, handler, liveness, page_size=1000, rate=0, checkpoint_path=None,
+                 clock=time.time, sleep=eventlet.sleep):
+        self.handler = handler
+        self.liveness = liveness
+        self.page_size = page_size
+        self.checkpoint_path = checkpoint_path
+        self._clock = clock
+        self._sleep = sleep
+        self._bucket = TokenBucket(rate, 1, clock) if rate > 0 else None
+
+    def _read_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        try:
+            with open(self.checkpoint_path) as checkpoint:
+                return json.load(checkpoint).get('marker')
+        except (IOError, ValueError) as e:
+            LOG.warn('Ignoring the sweep checkpoint %s. %s', self.checkpoint_path, e)
+            return None
+
+    def _write_checkpoint(self, marker):
+        if not self.checkpoint_path:
+            return
+        # Write and rename, so an interruption never leaves a partial checkpoint
+        path = self.checkpoint_path + '.tmp'
+        with open(path, 'w') as checkpoint:
+            json.dump({'marker': marker, 'timestamp': self._clock()}, checkpoint)
+        os.rename(path, self.checkpoint_path)
+
+    def _clear_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _is_orphan(self, record):
+        if self.liveness.is_alive(record['managed_resource_id']):
+            return False
+        created_at = _epoch(record.get('created_at'))
+        return created_at is None or self.liveness.timestamp is None or created_at < self.liveness.timestamp
+
+    def sweep(self):
+        """Run a sweep to the end, resuming the previous one if interrupted. Returns the orphans deleted"""
+        self.liveness.load()
+        if not len(self.liveness):
+            LOG.warn('No alive resources known. Skipping the sweep of orphan records')
+            return 0
+        context = self.handler._get_context()
+        criterion = {'managed': True, 'managed_plugin_name': self.handler.get_plugin_name()}
+        marker = self._read_checkpoint()
+        if marker:
+            LOG.info('Resuming the sweep of orphan records after record: %s', marker)
+        deleted = 0
+        try:
+            for page in iter_pages(self.handler.central_api.find_records, context, criterion,
+                                   self.page_size, marker):
+                kept = None
+                for record in page:
+                    if not self._is_orphan(record):
+                        kept = record['id']
+                        continue
+                    if self._bucket is not None:
+                        self._bucket.acquire(self._sleep)
+                    LOG.info('Deleting orphan record %s of resource: %s', record['id'], record['managed_resource_id'])
+                    try:
+                        self.handler._delete_record_list(context, [record])
+                    except Exception:
+                        # Already logged, the record is found again by the next sweep
+                        continue
+                    deleted += 1
+                # The marker must be a record still present when the sweep is resumed
+                if kept is not None:
+                    self._write_checkpoint(kept)
+        except exceptions.MarkerNotFound:
+            LOG.warn('The record: %s of the sweep checkpoint no longer exists. Restarting the sweep', marker)
+            self._clear_checkpoint()
+            return deleted + self.sweep()
+        self._clear_checkpoint()
+        LOG.info('Sweep of orphan records finished. %d records deleted', deleted)
+        return deleted
+
+    def run(self, interval):
+        """Sweep every `interval` seconds"""
+        while True:
+            self._sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                LOG.error('Error sweeping orphan records. %s', e)
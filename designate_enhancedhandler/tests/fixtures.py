@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Fixtures of the tests running the handlers against an in-memory designate-central.
+
+The fake designate-central and the payloads of the synthetic resources are the ones of the
+benchmark, so the tests only depend on it through this module.
+"""
+
+from mock import patch
+from unittest import TestCase
+
+from designate_enhancedhandler.benchmark import runner
+from designate_enhancedhandler.benchmark.central import FakeCentralAPI  # noqa
+from designate_enhancedhandler.benchmark.workloads import ADMIN_TENANT  # noqa
+from designate_enhancedhandler.benchmark.workloads import boot_storm  # noqa
+from designate_enhancedhandler.benchmark.workloads import Event  # noqa
+from designate_enhancedhandler.benchmark.workloads import floating_address  # noqa
+from designate_enhancedhandler.benchmark.workloads import floatingip_churn  # noqa
+from designate_enhancedhandler.benchmark.workloads import floatingip_id  # noqa
+from designate_enhancedhandler.benchmark.workloads import floatingip_payload  # noqa
+from designate_enhancedhandler.benchmark.workloads import instance_id  # noqa
+from designate_enhancedhandler.benchmark.workloads import instance_payload  # noqa
+from designate_enhancedhandler.benchmark.workloads import populate
+from designate_enhancedhandler.benchmark.workloads import port_id  # noqa
+from designate_enhancedhandler.benchmark.workloads import tenant_id  # noqa
+
+
+def floatingip_resource(number, tenants):
+    """A floating IP associated to the first interface of an instance, as listed in a snapshot"""
+    return dict(floatingip_payload(number, tenants, True)['floatingip'], type='floatingip')
+
+
+class FakeCentralTest(TestCase):
+    """Test case with a domain per tenant and the reverse zones in an in-memory designate-central.
+
+    The fixed addresses index is reset for every test, so the handlers built start empty.
+    """
+
+    tenants = 1
+    reverse_zones = 0
+    latency = 0
+
+    def setUp(self):
+        super(FakeCentralTest, self).setUp()
+        self.patch_fixed_address_index = patch('designate_enhancedhandler.indexes._fixed_address_index', None)
+        self.patch_fixed_address_index.start()
+        self.addCleanup(self.patch_fixed_address_index.stop)
+        self.central_api = FakeCentralAPI(latency=self.latency)
+        populate(self.central_api, self.tenants, self.reverse_zones)
+
+    def build_handler(self, cls):
+        return runner.build_handler(cls, self.central_api)
+
+    def build_handlers(self):
+        """Build the nova and neutron handlers, mapped by event type"""
+        return runner.build_handlers(self.central_api)
+
+    def run_events(self, name, events, handlers):
+        return runner.run(name, events, handlers, self.central_api)
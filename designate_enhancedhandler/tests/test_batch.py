@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+import eventlet
+
+from designate_enhancedhandler.batch import ZoneBatcher
+
+
+class ZoneBatcherTest(TestCase):
+    def setUp(self):
+        self.writes = []
+
+    def write(self, zone_id, items):
+        self.writes.append((zone_id, list(items)))
+        return [(None, ValueError(item)) if item == 'bad' else (item.upper(), None) for item in items]
+
+    def submit_all(self, batcher, submissions):
+        threads = [eventlet.spawn(batcher.submit, zone_id, item) for zone_id, item in submissions]
+        results = []
+        for thread in threads:
+            try:
+                results.append(thread.wait())
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    def test_interval(self):
+        batcher = ZoneBatcher(0.01, 100, self.write)
+        results = self.submit_all(batcher, [('zone_1', 'a'), ('zone_2', 'b'), ('zone_1', 'c')])
+        self.assertEqual(results, ['A', 'B', 'C'])
+        self.assertEqual(sorted(self.writes), [('zone_1', ['a', 'c']), ('zone_2', ['b'])])
+        self.assertEqual(len(batcher), 0)
+
+    def test_size(self):
+        batcher = ZoneBatcher(60, 2, self.write)
+        results = self.submit_all(batcher, [('zone_1', 'a'), ('zone_1', 'b'), ('zone_1', 'c'), ('zone_1', 'd')])
+        self.assertEqual(results, ['A', 'B', 'C', 'D'])
+        self.assertEqual(self.writes, [('zone_1', ['a', 'b']), ('zone_1', ['c', 'd'])])
+
+    def test_errors(self):
+        batcher = ZoneBatcher(0.01, 100, self.write)
+        results = self.submit_all(batcher, [('zone_1', 'a'), ('zone_1', 'bad')])
+        self.assertEqual(results[0], 'A')
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_write_failure(self):
+        def write(zone_id, items):
+            raise ValueError('unavailable')
+        batcher = ZoneBatcher(0.01, 100, write)
+        results = self.submit_all(batcher, [('zone_1', 'a'), ('zone_1', 'b')])
+        self.assertEqual([str(result) for result in results], ['unavailable', 'unavailable'])
+
+    def test_missing_results(self):
+        def write(zone_id, items):
+            return [(item.upper(), None) for item in items[:1]]
+        batcher = ZoneBatcher(0.01, 100, write)
+        first = eventlet.spawn(batcher.submit, 'zone_1', 'a')
+        second = eventlet.spawn(batcher.submit, 'zone_1', 'b')
+        self.assertEqual(first.wait(), 'A')
+        self.assertRaises(RuntimeError, second.wait)
+
+    def test_locks_released(self):
+        batcher = ZoneBatcher(60, 1, self.write)
+        self.submit_all(batcher, [('zone_1', 'a'), ('zone_2', 'b'), ('zone_1', 'c')])
+        self.assertEqual(batcher._locks, {})
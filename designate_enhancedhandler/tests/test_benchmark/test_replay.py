@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from unittest import TestCase
+
+from designate_enhancedhandler.benchmark import replay
+from designate_enhancedhandler.benchmark import workloads
+
+CAPTURE = [
+    {'event_type': 'compute.instance.create.end', 'timestamp': '2016-05-10 10:00:00.000000',
+     'payload': workloads.instance_payload(0, 1, 1)},
+    {'event_type': 'compute.instance.update', 'timestamp': '2016-05-10 10:00:00.500000',
+     'payload': {'tenant_id': workloads.tenant_id(0)}},
+    {'oslo.message': json.dumps({'event_type': 'compute.instance.delete.start', 'timestamp': '2016-05-10 10:00:01',
+                                 'payload': workloads.instance_payload(0, 1, 1)})},
+]
+
+
+class ReplayTest(TestCase):
+    def setUp(self):
+        self.patch_fixed_address_index = patch('designate_enhancedhandler.indexes._fixed_address_index', None)
+        self.patch_fixed_address_index.start()
+        self.directory = tempfile.mkdtemp()
+        self.capture = os.path.join(self.directory, 'capture.jsonl')
+        with open(self.capture, 'w') as capture:
+            for message in CAPTURE:
+                capture.write(json.dumps(message) + '\n')
+            capture.write('not json\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.patch_fixed_address_index.stop()
+
+    def test_read_capture(self):
+        with open(self.capture) as capture:
+            events = list(replay.read_capture(capture))
+        self.assertEqual([event.event_type for event in events], [
+            'compute.instance.create.end', 'compute.instance.update', 'compute.instance.delete.start'])
+        self.assertEqual(events[1].timestamp - events[0].timestamp, 0.5)
+
+    def test_pace(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        events = [replay.CapturedEvent('a', {}, 10.0), replay.CapturedEvent('b', {}, None),
+                  replay.CapturedEvent('c', {}, 14.0)]
+        self.assertEqual(list(replay.pace(events, 2, lambda: now[0], sleep)), events)
+        self.assertEqual(sleeps, [2.0])
+
+    def test_record(self):
+        output = os.path.join(self.directory, 'changes.jsonl')
+        with patch('sys.stdout'):
+            replay.main([self.capture, '--mode', 'record', '--output', output])
+        with open(output) as changes:
+            changes = [json.loads(line) for line in changes]
+        self.assertEqual([(change['method'], change['name']) for change in changes[:4]], [
+            ('create_recordset', 'host-00000.net_0.tenant-00000.replay.example.com.'),
+            ('create_record', 'host-00000.net_0.tenant-00000.replay.example.com.'),
+            ('create_recordset', '1.0.0.10.in-addr.arpa.'),
+            ('create_record', '1.0.0.10.in-addr.arpa.'),
+        ])
+        # The recordsets of the instance are deleted at the same time
+        self.assertEqual(sorted((change['method'], change['name']) for change in changes[4:]), [
+            ('delete_recordset', '1.0.0.10.in-addr.arpa.'),
+            ('delete_recordset', 'host-00000.net_0.tenant-00000.replay.example.com.'),
+        ])
+        self.assertEqual(changes[3]['data'], ['host-00000.net_0.tenant-00000.replay.example.com.'])
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+from mock import patch
+from unittest import TestCase
+
+from designate import exceptions
+from designate_enhancedhandler.benchmark import runner
+from designate_enhancedhandler.benchmark import workloads
+from designate_enhancedhandler.benchmark.central import FakeCentralAPI
+
+
+class BenchmarkRunnerTest(TestCase):
+    def setUp(self):
+        self.patch_fixed_address_index = patch('designate_enhancedhandler.indexes._fixed_address_index', None)
+        self.patch_fixed_address_index.start()
+        self.central_api = FakeCentralAPI()
+        workloads.populate(self.central_api, 2, 2)
+        self.handlers = runner.build_handlers(self.central_api)
+
+    def tearDown(self):
+        self.patch_fixed_address_index.stop()
+
+    def test_boot_storm(self):
+        report = runner.run('boot-storm', workloads.boot_storm(2, 4, 2, delete=False), self.handlers,
+                            self.central_api)
+
+        self.assertEqual(report.events, 4)
+        # A direct record per interface plus a PTR in 0.0.10.in-addr.arpa. or 10.in-addr.arpa.
+        self.assertEqual(len(self.central_api.records), 16)
+        names = sorted(recordset['name'] for recordset in self.central_api.recordsets.values())
+        self.assertIn('host-00000.net_0.tenant-00000.example.com.', names)
+        self.assertIn('1.0.0.10.in-addr.arpa.', names)
+        summary = report.as_dict()
+        self.assertEqual(summary['rpc_calls']['create_recordset'], 16)
+        self.assertEqual(summary['rpc_calls']['find_domains'], 1)
+        self.assertEqual(summary['rpc_calls_per_event'], 8.75)
+
+    def test_floatingip_churn(self):
+        report = runner.run('floatingip-churn', workloads.floatingip_churn(2, 2, 1), self.handlers,
+                            self.central_api)
+
+        self.assertEqual(report.events, 12)
+        # The PTRs in the shared reverse zones are deleted too
+        self.assertEqual(self.central_api.records, {})
+        self.assertIn('floatingip.update.end', report.format())
+
+    def test_delete_record_of_other_recordset(self):
+        runner.run('boot-storm', workloads.boot_storm(2, 1, 1, delete=False), self.handlers, self.central_api)
+        record = list(self.central_api.records.values())[0]
+
+        self.assertRaises(exceptions.RecordNotFound, self.central_api.delete_record, None, record['domain_id'],
+                          'other', record['id'])
+
+        # The record is kept
+        self.assertIn(record['id'], self.central_api.records)
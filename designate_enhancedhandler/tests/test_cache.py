@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from designate_enhancedhandler.cache import LRUCache
+from designate_enhancedhandler.cache import NO_EXPIRATION
+
+
+class LRUCacheTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = LRUCache(2, 60, clock=lambda: self.now)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('tenant_1'))
+        self.cache.set('tenant_1', 'domain_1')
+        self.assertEqual(self.cache.get('tenant_1'), 'domain_1')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.hit_ratio(), 0.5)
+
+    def test_expiration(self):
+        self.cache.set('tenant_1', 'domain_1')
+        self.cache.set('tenant_2', 'domain_2', ttl=10)
+        self.now += 10
+        self.assertEqual(self.cache.get('tenant_1'), 'domain_1')
+        self.assertIsNone(self.cache.get('tenant_2'))
+        self.now += 50
+        self.assertIsNone(self.cache.get('tenant_1'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_no_expiration(self):
+        self.cache.set('tenant_1', 'domain_1', NO_EXPIRATION)
+        self.now += 10 ** 9
+        self.assertEqual(self.cache.get('tenant_1'), 'domain_1')
+
+    def test_eviction(self):
+        self.cache.set('tenant_1', 'domain_1')
+        self.cache.set('tenant_2', 'domain_2')
+        self.cache.get('tenant_1')
+        self.cache.set('tenant_3', 'domain_3')
+        self.assertEqual(self.cache.get('tenant_1'), 'domain_1')
+        self.assertIsNone(self.cache.get('tenant_2'))
+        self.assertEqual(self.cache.get('tenant_3'), 'domain_3')
+
+    def test_disabled(self):
+        cache = LRUCache(0, 60)
+        cache.set('tenant_1', 'domain_1')
+        self.assertIsNone(cache.get('tenant_1'))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import eventlet
+from mock import call, MagicMock
+from unittest import TestCase
+
+from designate_enhancedhandler.coalesce import Coalescer
+from designate_enhancedhandler.coalesce import Notification
+
+
+class CoalescerTest(TestCase):
+    def setUp(self):
+        self.process = MagicMock(name='process')
+        self.merge = MagicMock(name='merge', side_effect=lambda notifications: notifications[-1:])
+        self.coalescer = Coalescer(0.01, self.process, self.merge)
+        self.create = Notification(None, 'create', {'id': 1})
+        self.update = Notification(None, 'update', {'id': 1})
+        self.delete = Notification(None, 'delete', {'id': 1})
+
+    def test_flush_after_window(self):
+        self.coalescer.submit('resource_1', self.create, True)
+        self.coalescer.submit('resource_1', self.update, True)
+        self.assertFalse(self.process.called)
+        eventlet.sleep(0.05)
+        self.merge.assert_called_once_with([self.create, self.update])
+        self.process.assert_called_once_with(self.update)
+        self.assertEqual(len(self.coalescer), 0)
+
+    def test_flush_on_unbuffered(self):
+        self.coalescer.submit('resource_1', self.create, True)
+        self.coalescer.submit('resource_1', self.delete, False)
+        self.merge.assert_called_once_with([self.create, self.delete])
+        self.process.assert_called_once_with(self.delete)
+        eventlet.sleep(0.05)
+        self.assertEqual(self.process.call_count, 1)
+
+    def test_unbuffered_without_pending(self):
+        self.coalescer.submit('resource_1', self.create, True)
+        self.coalescer.submit('resource_2', self.delete, False)
+        self.process.assert_called_once_with(self.delete)
+        self.assertFalse(self.merge.called)
+        self.coalescer.flush_all()
+        self.process.assert_has_calls([call(self.delete), call(self.create)])
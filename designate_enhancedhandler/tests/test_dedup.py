@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from designate_enhancedhandler.dedup import DuplicateFilter
+from designate_enhancedhandler.dedup import notification_digest
+
+
+class DuplicateFilterTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_digest(self):
+        self.assertEqual(notification_digest('port.delete.end', {'port_id': '1', 'tenant_id': '2'}),
+                         notification_digest('port.delete.end', {'tenant_id': '2', 'port_id': '1'}))
+        self.assertNotEqual(notification_digest('port.delete.end', {'port_id': '1'}),
+                            notification_digest('port.delete.end', {'port_id': '2'}))
+
+    def test_window(self):
+        duplicates = DuplicateFilter(60, 10, clock=lambda: self.now)
+        self.assertFalse(duplicates.seen('digest_1'))
+        self.now += 30
+        self.assertTrue(duplicates.seen('digest_1'))
+        self.now += 30
+        self.assertFalse(duplicates.seen('digest_1'))
+
+    def test_size(self):
+        duplicates = DuplicateFilter(60, 2, clock=lambda: self.now)
+        for digest in ('digest_1', 'digest_2', 'digest_3'):
+            self.assertFalse(duplicates.seen(digest))
+        self.assertEqual(len(duplicates), 2)
+        self.assertTrue(duplicates.seen('digest_3'))
+        self.assertFalse(duplicates.seen('digest_1'))
+
+    def test_persistence(self):
+        path = os.path.join(self.tmpdir, 'dedup.sqlite')
+        duplicates = DuplicateFilter(60, 10, path, clock=lambda: self.now)
+        duplicates.seen('digest_1')
+        self.now += 30
+        duplicates.seen('digest_2')
+        duplicates.close()
+
+        self.now += 40
+        duplicates = DuplicateFilter(60, 10, path, clock=lambda: self.now)
+        self.assertFalse(duplicates.seen('digest_1'))
+        self.assertTrue(duplicates.seen('digest_2'))
+        duplicates.close()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import eventlet
+from unittest import TestCase
+
+from designate_enhancedhandler.dispatch import LaneQueue
+from designate_enhancedhandler.dispatch import shard
+from designate_enhancedhandler.dispatch import ShardedDispatcher
+
+
+class ShardedDispatcherTest(TestCase):
+    def setUp(self):
+        self.processed = []
+        self.dispatcher = ShardedDispatcher(4, 2, self.process)
+        self.addCleanup(self.dispatcher.stop)
+
+    def process(self, item):
+        key, number = item
+        eventlet.sleep(0.001 * (4 - number))
+        self.processed.append(item)
+
+    def test_order_per_key(self):
+        for number in range(4):
+            for key in ('tenant_1', 'tenant_2', 'tenant_3'):
+                self.dispatcher.submit(key, (key, number))
+        eventlet.sleep(0.1)
+        self.assertEqual(len(self.processed), 12)
+        for key in ('tenant_1', 'tenant_2', 'tenant_3'):
+            self.assertEqual([number for k, number in self.processed if k == key], [0, 1, 2, 3])
+
+    def test_backpressure(self):
+        key = 'tenant_1'
+        for number in range(3):
+            self.dispatcher.submit(key, (key, number))
+        # The worker took the first item, so the queue is full
+        self.assertEqual(self.dispatcher.depths()[shard(key, 4)], 2)
+        self.dispatcher.submit(key, (key, 3))
+        self.assertTrue(len(self.processed) >= 1)
+        eventlet.sleep(0.1)
+        self.assertEqual(len(self.processed), 4)
+
+    def test_errors(self):
+        dispatcher = ShardedDispatcher(1, 0, lambda item: 1 / item)
+        self.addCleanup(dispatcher.stop)
+        dispatcher.submit('tenant_1', 0)
+        dispatcher.submit('tenant_1', 1)
+        eventlet.sleep(0.01)
+        self.assertEqual(dispatcher.depths(), [0])
+
+
+class LaneQueueTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.queue = LaneQueue({'urgent': 3, 'default': 1}, clock=lambda: self.now)
+
+    def get_all(self):
+        items = []
+        while self.queue.qsize():
+            items.append(self.queue.get()[1])
+            self.queue.task_done()
+        return items
+
+    def test_weights(self):
+        for number in range(8):
+            self.queue.put('default', None, 'create_%d' % number)
+        for number in range(4):
+            self.queue.put('urgent', None, 'delete_%d' % number)
+        items = self.get_all()
+        # The urgent lane gets three turns per turn of the default lane while both have items
+        self.assertEqual(items[:6], ['create_0', 'delete_0', 'delete_1', 'delete_2', 'create_1', 'delete_3'])
+        self.assertEqual(items[6:], ['create_%d' % number for number in range(2, 8)])
+
+    def test_idle_lane(self):
+        for number in range(4):
+            self.queue.put('urgent', None, 'delete_%d' % number)
+        self.get_all()
+        # The default lane is not starved by the turns it did not use
+        self.queue.put('urgent', None, 'delete_4')
+        self.queue.put('default', None, 'create_0')
+        self.assertEqual(self.get_all(), ['create_0', 'delete_4'])
+
+    def test_affinity(self):
+        self.queue.put('default', 'instance_1', 'create_1')
+        self.queue.put('default', 'instance_2', 'create_2')
+        self.queue.put('urgent', 'instance_1', 'delete_1')
+        self.queue.put('urgent', 'instance_3', 'delete_3')
+        self.assertEqual(self.queue.depths(), {'urgent': 1, 'default': 3})
+        self.assertEqual(self.get_all(), ['create_1', 'delete_3', 'create_2', 'delete_1'])
+        # Once processed, the key is no longer pinned to a lane
+        self.queue.put('urgent', 'instance_1', 'delete_1')
+        self.assertEqual(self.queue.depths(), {'urgent': 1, 'default': 0})
+
+    def test_ages(self):
+        self.queue.put('default', None, 'create_0')
+        self.now += 5
+        self.queue.put('urgent', None, 'delete_0')
+        self.now += 1
+        self.assertEqual(self.queue.ages(), {'urgent': 1.0, 'default': 6.0})
+        self.assertEqual(self.queue.get(), ('default', 'create_0', 6.0))
+
+    def test_size_per_lane(self):
+        queue = LaneQueue({'urgent': 1, 'default': 1}, 1)
+        queue.put('default', None, 'create_0')
+        blocked = eventlet.spawn(queue.put, 'default', None, 'create_1')
+        eventlet.sleep(0)
+        # A full lane does not block the others
+        queue.put('urgent', None, 'delete_0')
+        self.assertEqual(queue.depths(), {'urgent': 1, 'default': 1})
+        self.assertEqual(queue.get()[1], 'create_0')
+        blocked.wait()
+        self.assertEqual(queue.depths(), {'urgent': 1, 'default': 1})
+
+    def test_join(self):
+        dispatcher = ShardedDispatcher(2, 0, lambda item: eventlet.sleep(0.001), {'urgent': 2, 'default': 1})
+        self.addCleanup(dispatcher.stop)
+        for number in range(10):
+            dispatcher.submit('tenant_%d' % number, number, 'urgent' if number % 2 else None)
+        self.assertEqual(sum(dispatcher.lane_depths().values()), 10)
+        dispatcher.join()
+        self.assertEqual(dispatcher.lane_depths(), {'urgent': 0, 'default': 0})
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import logging
+from unittest import TestCase
+
+from mock import MagicMock
+
+from designate_enhancedhandler import eventlog
+from designate_enhancedhandler.eventlog import EventLog
+from designate_enhancedhandler.eventlog import WarningLimiter
+
+
+class WarningLimiterTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.limiter = WarningLimiter(2, 60, clock=lambda: self.now)
+
+    def test_burst(self):
+        self.assertEqual([self.limiter.allow('domain_not_found') for _ in range(4)],
+                         [(True, 0), (True, 0), (False, 0), (False, 0)])
+        self.assertEqual(self.limiter.allow('duplicate'), (True, 0))
+        self.now += 60
+        # The first warning of the next window reports the ones suppressed
+        self.assertEqual(self.limiter.allow('domain_not_found'), (True, 2))
+        self.assertEqual(self.limiter.allow('domain_not_found'), (True, 0))
+
+
+class EventLogTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.sample = 0.5
+        self.logger = MagicMock(name='logger')
+
+    def event_log(self, **kwargs):
+        return EventLog(clock=lambda: self.now, sample=lambda: self.sample, **kwargs)
+
+    def test_verbose(self):
+        event_log = self.event_log()
+        self.assertEqual(event_log.detail_level, logging.INFO)
+        self.assertEqual(event_log.payload_level(), logging.INFO)
+        event_log.end(self.logger, event_log.begin('port.delete.end', 'port_1'))
+        self.assertFalse(self.logger.info.called)
+
+    def test_summary(self):
+        event_log = self.event_log(summary=True, payload_sample_rate=0.1)
+        self.assertEqual(event_log.detail_level, logging.DEBUG)
+        self.assertEqual(event_log.payload_level(), logging.DEBUG)
+        self.sample = 0.05
+        self.assertEqual(event_log.payload_level(), logging.INFO)
+
+        summary = event_log.begin('compute.instance.create.end', 'instance_1')
+        eventlog.count('records_created', 4)
+        self.now += 0.25
+        event_log.end(self.logger, summary, ValueError('unavailable'))
+
+        eventlog.count('records_created')
+        self.assertIsNone(eventlog.current())
+        message, values = self.logger.info.call_args[0]
+        self.assertEqual(message, 'Notification processed: %s')
+        self.assertEqual(json.loads(values), {
+            'event_type': 'compute.instance.create.end',
+            'resource_id': 'instance_1',
+            'outcome': 'error',
+            'error': 'ValueError: unavailable',
+            'duration_ms': 250.0,
+            'records_created': 4
+        })
+
+    def test_warn(self):
+        event_log = self.event_log(warning_burst=1)
+        event_log.begin('compute.instance.create.end', 'instance_1')
+        for tenant in ('tenant_1', 'tenant_2'):
+            event_log.warn(self.logger, 'domain_not_found', 'There is no domain registered for tenant: %s', tenant)
+        summary = event_log.begin('compute.instance.delete.start', 'instance_1')
+        event_log.warn(self.logger, 'domain_not_found', 'There is no domain registered for tenant: %s', 'tenant_3')
+        self.now += 60
+        event_log.warn(self.logger, 'domain_not_found', 'There is no domain registered for tenant: %s', 'tenant_4')
+
+        self.assertEqual(summary.counts['warnings'], 2)
+        self.assertEqual([warning[0][1:] for warning in self.logger.warn.call_args_list],
+                         [('tenant_1',), ('tenant_3',), ('tenant_4',)])
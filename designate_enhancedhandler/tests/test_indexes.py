@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from designate_enhancedhandler.indexes import AddressEntry
+from designate_enhancedhandler.indexes import FixedAddressIndex
+from designate_enhancedhandler.indexes import RecordIndex
+
+
+class FixedAddressIndexTest(TestCase):
+    def setUp(self):
+        self.index = FixedAddressIndex(10)
+        self.entry_1 = AddressEntry('host-01', 'private_management', 'A', 'domain_1')
+        self.entry_2 = AddressEntry('host-01', 'private_external', 'A', 'domain_1')
+        self.entry_3 = AddressEntry('host-02', 'private_management', 'A', 'domain_2')
+
+    def test_tenant_scoped(self):
+        self.index.add('tenant_1', '192.168.3.22', 'instance_1', self.entry_1)
+        self.index.add('tenant_2', '192.168.3.22', 'instance_2', self.entry_3)
+        self.assertEqual(self.index.get('tenant_1', '192.168.3.22'), self.entry_1)
+        self.assertEqual(self.index.get('tenant_2', '192.168.3.22'), self.entry_3)
+        self.assertIsNone(self.index.get('tenant_3', '192.168.3.22'))
+
+    def test_remove_resource(self):
+        self.index.add('tenant_1', '192.168.3.22', 'instance_1', self.entry_1)
+        self.index.add('tenant_1', '172.16.3.26', 'instance_1', self.entry_2)
+        self.index.add('tenant_2', '192.168.3.22', 'instance_2', self.entry_3)
+        self.assertEqual(self.index.get_resource('instance_1'),
+                         set([('tenant_1', '192.168.3.22'), ('tenant_1', '172.16.3.26')]))
+        self.index.remove_resource('instance_1')
+        self.assertIsNone(self.index.get('tenant_1', '192.168.3.22'))
+        self.assertIsNone(self.index.get('tenant_1', '172.16.3.26'))
+        self.assertEqual(self.index.get('tenant_2', '192.168.3.22'), self.entry_3)
+        self.assertEqual(len(self.index), 1)
+
+
+class RecordIndexTest(TestCase):
+    def setUp(self):
+        self.index = RecordIndex(3)
+        self.record_1 = {'id': 'record_1', 'domain_id': 'domain_1', 'recordset_id': 'recordset_1'}
+        self.record_2 = {'id': 'record_2', 'domain_id': 'domain_2', 'recordset_id': 'recordset_2'}
+
+    def test_pop_forgets_every_key(self):
+        self.index.add(['floatingip:1', 'port:1'], self.record_1)
+        self.index.add(['floatingip:1', 'port:1'], self.record_2)
+        self.assertEqual(self.index.pop('floatingip:1'), [self.record_1, self.record_2])
+        self.assertIsNone(self.index.get('port:1'))
+        self.assertIsNone(self.index.pop('port:1'))
+        self.assertEqual(len(self.index), 0)
+
+    def test_complete(self):
+        self.assertFalse(self.index.complete)
+        self.index.mark_loaded()
+        self.assertTrue(self.index.complete)
+        self.index.add(['floatingip:1', 'port:1'], self.record_1)
+        self.index.add(['floatingip:2', 'port:2'], self.record_2)
+        self.assertFalse(self.index.complete)
+        self.assertIsNone(self.index.get('floatingip:1'))
+        self.assertEqual(self.index.get('port:1'), [self.record_1])
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+
+from mock import MagicMock
+from unittest import TestCase
+
+from designate_enhancedhandler import metrics
+
+
+class HistogramTest(TestCase):
+    def test_percentiles(self):
+        histogram = metrics.Histogram()
+        for value in [0.5] * 98 + [30, 3000]:
+            histogram.add(value)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.percentile(0.5), 1)
+        self.assertEqual(histogram.percentile(0.99), 50)
+        self.assertEqual(histogram.percentile(1), 5000)
+        self.assertEqual(metrics.Histogram().percentile(0.5), 0.0)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.sink = MagicMock(name='sink')
+        self.metrics = metrics.Metrics([self.sink])
+
+    def test_counters_and_timings(self):
+        self.metrics.increment('notifications.duplicates')
+        self.metrics.timing('central.find_domain', 0.002)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'notifications.duplicates': 1})
+        self.assertEqual(snapshot['histograms']['central.find_domain']['count'], 1)
+        self.sink.counter.assert_called_once_with('notifications.duplicates', 1)
+        self.sink.timing.assert_called_once_with('central.find_domain', 2.0)
+
+    def test_gauges(self):
+        self.metrics.register_gauge('cache.domain.hit_ratio', lambda: 0.5)
+        self.metrics.register_gauge('broken', lambda: 1 / 0)
+        self.assertEqual(self.metrics.read_gauges(), {'cache.domain.hit_ratio': 0.5})
+        self.metrics.flush()
+        self.sink.flush.assert_called_once_with(self.metrics)
+
+    def test_instrumented_central_api(self):
+        central_api = MagicMock(name='central_api')
+        central_api.find_record.side_effect = ValueError('boom')
+        instrumented = metrics.InstrumentedCentralAPI(central_api, self.metrics)
+        metrics.set_current_event_type('compute.instance.create.end')
+        self.addCleanup(metrics.set_current_event_type, None)
+
+        self.assertEqual(instrumented.find_domain('context', {}), central_api.find_domain.return_value)
+        self.assertRaises(ValueError, instrumented.find_record, 'context', {})
+
+        self.assertEqual(sorted(self.metrics.histograms), [
+            'central.find_domain',
+            'central.find_record',
+            'event.compute_instance_create_end.central.find_domain',
+            'event.compute_instance_create_end.central.find_record',
+        ])
+        self.assertEqual(dict(self.metrics.counters), {
+            'central.find_record.errors': 1,
+            'event.compute_instance_create_end.central.find_record.errors': 1
+        })
+
+
+class DumpSinkTest(TestCase):
+    def test_dump_to_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'metrics.json')
+        registry = metrics.Metrics([metrics.DumpSink(path)])
+        registry.increment('notifications.duplicates', 2)
+        registry.flush()
+        registry.flush()
+        with open(path) as dump:
+            lines = [json.loads(line) for line in dump]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]['counters'], {'notifications.duplicates': 2})
+
+
+class StatsdSinkTest(TestCase):
+    def test_format(self):
+        sink = metrics.StatsdSink('127.0.0.1', 8125, 'designate.nova_enhanced')
+        sink._socket = MagicMock(name='socket')
+        sink.counter('central.find_domain.errors', 1)
+        sink.timing('central.find_domain', 2.5)
+        sink.flush(MagicMock(read_gauges=MagicMock(return_value={'dispatch.queued': 3})))
+        self.assertEqual([args[0][0] for args in sink._socket.sendto.call_args_list], [
+            b'designate.nova_enhanced.central.find_domain.errors:1|c',
+            b'designate.nova_enhanced.central.find_domain:2.500|ms',
+            b'designate.nova_enhanced.dispatch.queued:3|g',
+        ])
@@ -14,10 +14,18 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import os
+import shutil
+import tempfile
+
+import eventlet
 from mock import call, patch, MagicMock
+from oslo_config import cfg
 from unittest import TestCase
 
 from designate_enhancedhandler.notification_handler.neutron import NeutronEnhancedHandler
+from designate_enhancedhandler.notification_handler.nova import NovaEnhancedHandler
+from designate_enhancedhandler.tests import fixtures
 from collections import namedtuple
 
 
@@ -46,10 +54,13 @@ class NeutronEnhancedHandlerTest(TestCase):
         self.patch_designate_context = patch('designate_enhancedhandler.notification_handler.base.DesignateContext',
                                              self.mock_designate_context)
         self.patch_designate_context.start()
+        self.patch_fixed_address_index = patch('designate_enhancedhandler.indexes._fixed_address_index', None)
+        self.patch_fixed_address_index.start()
         self.handler = NeutronEnhancedHandler()
         self.admin_context = None  # Unused by the handler
 
     def tearDown(self):
+        self.patch_fixed_address_index.stop()
         self.patch_designate_context.stop()
         self.patch_recordset.stop()
         self.patch_central_rpcapi.stop()
@@ -68,7 +79,7 @@ class NeutronEnhancedHandlerTest(TestCase):
                 'id': '2cde8e69-a298-48bd-8785-10405ea245d2'
             }
         }
-        self.mock_central_api.find_record.return_value = {'recordset_id': 'recordset_id'}
+        self.mock_central_api.find_record.return_value = {'recordset_id': 'recordset_id', 'domain_id': 'test_domain_id'}
         self.mock_central_api.find_recordset.return_value = {
             'name': 'demodesignate.private_management.test_domain.ost.com.',
             'type': 4
@@ -183,3 +194,319 @@ class NeutronEnhancedHandlerTest(TestCase):
             call(self.mock_admin_context, 'test_domain_id', 'test_recordset_id_1', 'test_record_id_1'),
             call(self.mock_admin_context, 'test_domain_id', 'test_recordset_id_2', 'test_record_id_2')
         ])
+
+    def test_floating_ip_updates_coalesced(self):
+        cfg.CONF.set_override('coalesce_window', 0.01, 'handler:neutron_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'coalesce_window', 'handler:neutron_enhanced')
+        handler = NeutronEnhancedHandler()
+        event_type = 'floatingip.update.end'
+        floatingip = {
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'fixed_ip_address': '172.16.3.36',
+            'floating_ip_address': '192.168.49.162',
+            'port_id': '3e088857-f2b2-4689-9478-56bf6b735be1',
+            'id': '2cde8e69-a298-48bd-8785-10405ea245d2'
+        }
+        self.mock_central_api.find_records.return_value = []
+        self.mock_central_api.find_record.return_value = {'recordset_id': 'recordset_id', 'domain_id': 'test_domain_id'}
+        self.mock_central_api.find_recordset.return_value = {
+            'name': 'demodesignate.private_management.test_domain.ost.com.',
+            'type': 'A'
+        }
+        self.mock_central_api.find_domain.return_value = {
+            'id': 'test_domain_id',
+            'name': 'test_domain.ost.com.'
+        }
+        self.mock_central_api.find_domains.return_value = []
+
+        handler.process_notification(self.mock_admin_context, event_type, {'floatingip': floatingip})
+        handler.process_notification(self.mock_admin_context, event_type,
+                                     {'floatingip': dict(floatingip, fixed_ip_address=None, port_id=None)})
+        handler.process_notification(self.mock_admin_context, event_type,
+                                     {'floatingip': dict(floatingip, fixed_ip_address='172.16.3.37')})
+        self.assertFalse(self.mock_central_api.find_record.called)
+        eventlet.sleep(0.05)
+
+        # Only the disassociation and the last association are applied
+        self.assertEqual(self.mock_central_api.find_records.call_count, 1)
+        self.mock_central_api.find_record.assert_called_once_with(
+            self.mock_admin_context, {'managed': True, 'data': '172.16.3.37'}
+        )
+
+    def test_associate_floating_ip_indexed(self):
+        self.mock_central_api.find_domain.return_value = {
+            'id': 'test_domain_id',
+            'name': 'test_domain.ost.com.'
+        }
+        self.mock_central_api.find_domains.return_value = []
+        self.mock_central_api.create_recordset.return_value = {'id': 'test_recordset_id'}
+        NovaEnhancedHandler().process_notification(self.mock_admin_context, 'compute.instance.create.end', {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01',
+            'fixed_ips': [{'label': 'private_management', 'version': 4, 'address': '172.16.3.36'}]
+        })
+        self.mock_recordset.reset_mock()
+
+        self.handler.process_notification(self.mock_admin_context, 'floatingip.update.end', {
+            'floatingip': {
+                'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+                'fixed_ip_address': '172.16.3.36',
+                'floating_ip_address': '192.168.49.162',
+                'port_id': '3e088857-f2b2-4689-9478-56bf6b735be1',
+                'id': '2cde8e69-a298-48bd-8785-10405ea245d2'
+            }
+        })
+
+        self.assertFalse(self.mock_central_api.find_record.called)
+        self.assertFalse(self.mock_central_api.find_recordset.called)
+        self.mock_recordset.assert_called_once_with(
+            name='demodesignate.floating_private_management.test_domain.ost.com.', type='A')
+
+    def test_delete_floating_ip_indexed(self):
+        self.mock_central_api.find_record.return_value = {'recordset_id': 'recordset_id', 'domain_id': 'test_domain_id'}
+        self.mock_central_api.find_recordset.return_value = {
+            'name': 'demodesignate.private_management.test_domain.ost.com.',
+            'type': 'A'
+        }
+        self.mock_central_api.find_domain.return_value = {
+            'id': 'test_domain_id',
+            'name': 'test_domain.ost.com.'
+        }
+        self.mock_central_api.find_domains.return_value = []
+        self.mock_central_api.create_recordset.return_value = {'id': 'test_recordset_id'}
+        self.mock_central_api.create_record.return_value = {'id': 'test_record_id'}
+        self.handler.process_notification(self.mock_admin_context, 'floatingip.update.end', {
+            'floatingip': {
+                'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+                'fixed_ip_address': '172.16.3.36',
+                'floating_ip_address': '192.168.49.162',
+                'port_id': '3e088857-f2b2-4689-9478-56bf6b735be1',
+                'id': '2cde8e69-a298-48bd-8785-10405ea245d2'
+            }
+        })
+        self.mock_central_api.find_recordset.return_value = {'records': [{'id': 'test_record_id'},
+                                                                         {'id': 'unmanaged_record_id'}]}
+
+        self.handler.process_notification(self.mock_admin_context, 'port.delete.end', {
+            'port_id': '3e088857-f2b2-4689-9478-56bf6b735be1'
+        })
+
+        self.assertFalse(self.mock_central_api.find_records.called)
+        self.mock_central_api.delete_record.assert_called_once_with(
+            self.mock_admin_context, 'test_domain_id', 'test_recordset_id', 'test_record_id')
+
+    def test_delete_unknown_port_with_loaded_index(self):
+        for name in ('port_index_warmup', 'sole_consumer'):
+            cfg.CONF.set_override(name, True, 'handler:neutron_enhanced')
+            self.addCleanup(cfg.CONF.clear_override, name, 'handler:neutron_enhanced')
+        self.mock_central_api.find_records.return_value = [{
+            'id': 'test_record_id',
+            'domain_id': 'test_domain_id',
+            'recordset_id': 'test_recordset_id',
+            'managed_resource_id': '2cde8e69-a298-48bd-8785-10405ea245d2',
+            'managed_extra': 'portid:3e088857-f2b2-4689-9478-56bf6b735be1'
+        }]
+        handler = NeutronEnhancedHandler()
+        eventlet.sleep(0)
+        self.mock_central_api.find_records.reset_mock()
+
+        handler.process_notification(self.mock_admin_context, 'port.delete.end', {
+            'port_id': 'unknown_port_id'
+        })
+        self.assertFalse(self.mock_central_api.find_records.called)
+        self.assertFalse(self.mock_central_api.delete_record.called)
+
+        handler.process_notification(self.mock_admin_context, 'port.delete.end', {
+            'port_id': '3e088857-f2b2-4689-9478-56bf6b735be1'
+        })
+        self.assertFalse(self.mock_central_api.find_records.called)
+        self.mock_central_api.delete_record.assert_called_once_with(
+            self.mock_admin_context, 'test_domain_id', 'test_recordset_id', 'test_record_id')
+
+    def test_delete_unknown_port_with_loaded_index_shared(self):
+        cfg.CONF.set_override('port_index_warmup', True, 'handler:neutron_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'port_index_warmup', 'handler:neutron_enhanced')
+        self.mock_central_api.find_records.return_value = []
+        handler = NeutronEnhancedHandler()
+        eventlet.sleep(0)
+        self.mock_central_api.find_records.reset_mock()
+
+        handler.process_notification(self.mock_admin_context, 'port.delete.end', {
+            'port_id': 'unknown_port_id'
+        })
+
+        # The records may have been created by another consumer
+        self.assertTrue(self.mock_central_api.find_records.called)
+
+    def test_delete_unknown_port_with_loaded_index_partitioned(self):
+        for name, value in (('port_index_warmup', True), ('sole_consumer', True), ('partition_members', ['node-1']),
+                            ('partition_node', 'node-1')):
+            cfg.CONF.set_override(name, value, 'handler:neutron_enhanced')
+            self.addCleanup(cfg.CONF.clear_override, name, 'handler:neutron_enhanced')
+        self.mock_central_api.find_records.return_value = []
+        handler = NeutronEnhancedHandler()
+        eventlet.sleep(0)
+        self.mock_central_api.find_records.reset_mock()
+
+        handler.process_notification(self.mock_admin_context, 'port.delete.end', {
+            'port_id': 'unknown_port_id'
+        })
+
+        # The records may have been created by another node
+        self.assertTrue(self.mock_central_api.find_records.called)
+
+
+class NeutronEnhancedHandlerPortTest(fixtures.FakeCentralTest):
+    def setUp(self):
+        super(NeutronEnhancedHandlerPortTest, self).setUp()
+        self.nova_handler = self.build_handler(NovaEnhancedHandler)
+        self.handler = self.build_handler(NeutronEnhancedHandler)
+        self.instance = fixtures.instance_payload(0, 1, 1)
+        self.nova_handler.process_notification(None, 'compute.instance.create.end', self.instance)
+
+    def port_payload(self, *addresses):
+        return {
+            'port': {
+                'id': fixtures.port_id(0),
+                'tenant_id': self.instance['tenant_id'],
+                'device_id': self.instance['instance_id'],
+                'device_owner': 'compute:nova',
+                'fixed_ips': [{'subnet_id': 'subnet_1', 'ip_address': address} for address in addresses]
+            }
+        }
+
+    def records(self):
+        return sorted(record['data'] for record in self.central_api.records.values())
+
+    def test_update_port_addresses(self):
+        self.handler.process_notification(None, 'port.update.end', self.port_payload('10.0.0.1'))
+        self.central_api.reset_calls()
+        self.handler.process_notification(None, 'port.update.end', self.port_payload('10.0.0.1'))
+        self.assertEqual(sum(self.central_api.calls.values()), 0)
+
+        self.handler.process_notification(None, 'port.update.end', self.port_payload('10.0.0.9'))
+
+        self.assertEqual(self.records(), ['10.0.0.9', 'host-00000.net_0.tenant-00000.example.com.'])
+        ptr = [recordset for recordset in self.central_api.recordsets.values() if recordset['type'] == 'PTR']
+        self.assertEqual([recordset['name'] for recordset in ptr], ['9.0.0.10.in-addr.arpa.'])
+        # The records still belong to the instance
+        self.nova_handler.process_notification(None, 'compute.instance.delete.start', self.instance)
+        self.assertEqual(self.records(), [])
+
+    def test_update_unknown_port(self):
+        self.handler.process_notification(None, 'port.update.end', self.port_payload('10.0.0.1', '10.0.0.9'))
+
+        # The records of the new address are created from the records of the instance in designate-central
+        self.assertEqual(self.records(), ['10.0.0.1', '10.0.0.9', 'host-00000.net_0.tenant-00000.example.com.',
+                                          'host-00000.net_0.tenant-00000.example.com.'])
+        self.assertEqual(self.handler._fixed_address_index.get_port(fixtures.port_id(0)),
+                         set(['10.0.0.1', '10.0.0.9']))
+
+    def test_update_unknown_port_removed_address(self):
+        self.handler.process_notification(None, 'port.update.end', self.port_payload('10.0.0.9'))
+
+        # 10.0.0.1 may belong to another port of the instance, so its records are kept
+        self.assertEqual(self.records(), ['10.0.0.1', '10.0.0.9', 'host-00000.net_0.tenant-00000.example.com.',
+                                          'host-00000.net_0.tenant-00000.example.com.'])
+
+    def test_update_port_not_of_instance(self):
+        payload = self.port_payload('10.0.0.9')
+        payload['port']['device_owner'] = 'network:router_interface'
+        self.central_api.reset_calls()
+        self.handler.process_notification(None, 'port.update.end', payload)
+        self.assertEqual(sum(self.central_api.calls.values()), 0)
+        self.assertIsNone(self.handler._fixed_address_index.get_port(fixtures.port_id(0)))
+
+    def test_fixed_addresses_loaded_by_pages(self):
+        cfg.CONF.set_override('load_page_size', 2, 'handler:neutron_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'load_page_size', 'handler:neutron_enhanced')
+        for number in (1, 2):
+            self.nova_handler.process_notification(None, 'compute.instance.create.end',
+                                                   fixtures.instance_payload(number, 1, 1))
+        # Nothing is indexed in memory after a restart
+        self.patch_fixed_address_index.stop()
+        self.patch_fixed_address_index.start()
+        handler = self.build_handler(NeutronEnhancedHandler)
+        self.central_api.reset_calls()
+
+        handler._load_fixed_addresses()
+
+        self.assertEqual(len(handler._fixed_address_index), 3)
+        # The direct and reverse records of the 3 instances, and a last empty page
+        self.assertEqual(self.central_api.calls['find_records'], 4)
+
+    def test_floating_ip_disassociated(self):
+        self.handler.process_notification(None, 'floatingip.update.end', fixtures.floatingip_payload(0, 1, True))
+        self.assertIn('floating_net_0.tenant-00000.example.com.',
+                      ' '.join(self.records()))
+
+        self.handler.process_notification(None, 'floatingip.update.end', fixtures.floatingip_payload(0, 1, False))
+
+        # The PTR in the reverse zone of the admin tenant is deleted too
+        self.assertEqual(self.records(), ['10.0.0.1', 'host-00000.net_0.tenant-00000.example.com.'])
+
+    def test_port_deleted_after_association_dispatched(self):
+        cfg.CONF.set_override('dispatch_workers', 4, 'handler:neutron_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'dispatch_workers', 'handler:neutron_enhanced')
+        handler = self.build_handler(NeutronEnhancedHandler)
+        self.addCleanup(handler._dispatcher.stop)
+
+        handler.process_notification(None, 'floatingip.update.end', fixtures.floatingip_payload(0, 1, True))
+        handler.process_notification(None, 'port.delete.end', {'port_id': fixtures.port_id(0)})
+        eventlet.sleep(0.05)
+
+        # Both go to the worker of the floating IP
+        self.assertEqual(handler._get_partition_key('port.delete.end', {'port_id': fixtures.port_id(0)}),
+                         fixtures.floatingip_id(0))
+        self.assertEqual(self.records(), ['10.0.0.1', 'host-00000.net_0.tenant-00000.example.com.'])
+
+    def test_floating_ip_associated_again(self):
+        cfg.CONF.set_override('dedup_window', 60, 'handler:neutron_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'dedup_window', 'handler:neutron_enhanced')
+        handler = self.build_handler(NeutronEnhancedHandler)
+
+        for associated in (True, False, True):
+            handler.process_notification(None, 'floatingip.update.end',
+                                         fixtures.floatingip_payload(0, 1, associated))
+
+        self.assertIn(fixtures.floating_address(0), self.records())
+
+
+class NeutronEnhancedHandlerRecordStoreTest(fixtures.FakeCentralTest):
+    def setUp(self):
+        super(NeutronEnhancedHandlerRecordStoreTest, self).setUp()
+        self.patch_stores = patch('designate_enhancedhandler.store._stores', {})
+        self.patch_stores.start()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        for group in ('handler:nova_enhanced', 'handler:neutron_enhanced'):
+            cfg.CONF.set_override('record_store_path', os.path.join(self.tmpdir, 'records.sqlite'), group)
+            self.addCleanup(cfg.CONF.clear_override, 'record_store_path', group)
+        self.nova_handler = self.build_handler(NovaEnhancedHandler)
+        self.nova_handler.process_notification(None, 'compute.instance.create.end',
+                                               fixtures.instance_payload(0, 1, 1))
+
+    def tearDown(self):
+        self.patch_stores.stop()
+
+    def test_floating_ip_after_restart(self):
+        # Nothing is indexed in memory after a restart
+        self.patch_fixed_address_index.stop()
+        self.patch_fixed_address_index.start()
+        handler = self.build_handler(NeutronEnhancedHandler)
+        self.central_api.reset_calls()
+
+        handler.process_notification(None, 'floatingip.update.end', fixtures.floatingip_payload(0, 1, True))
+
+        self.assertEqual(self.central_api.calls['find_record'], 0)
+        self.assertIn(fixtures.floating_address(0),
+                      [record['data'] for record in self.central_api.records.values()])
+
+        handler = self.build_handler(NeutronEnhancedHandler)
+        self.central_api.reset_calls()
+        handler.process_notification(None, 'port.delete.end', {'port_id': fixtures.port_id(0)})
+
+        self.assertEqual(self.central_api.calls['find_records'], 0)
+        self.assertNotIn(fixtures.floating_address(0),
+                         [record['data'] for record in self.central_api.records.values()])
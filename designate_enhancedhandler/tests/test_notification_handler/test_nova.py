@@ -14,10 +14,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-from mock import call, patch, MagicMock
+import json
+import os
+import shutil
+import tempfile
+
+import eventlet
+from mock import ANY, call, patch, MagicMock
+from oslo_config import cfg
 from unittest import TestCase
 
+from designate import exceptions
 from designate_enhancedhandler.notification_handler.nova import NovaEnhancedHandler
+from designate_enhancedhandler.tests import fixtures
 from collections import namedtuple
 
 
@@ -46,10 +55,13 @@ class NovaEnhancedHandlerTest(TestCase):
         self.patch_designate_context = patch('designate_enhancedhandler.notification_handler.base.DesignateContext',
                                              self.mock_designate_context)
         self.patch_designate_context.start()
+        self.patch_fixed_address_index = patch('designate_enhancedhandler.indexes._fixed_address_index', None)
+        self.patch_fixed_address_index.start()
         self.handler = NovaEnhancedHandler()
         self.admin_context = None  # Unused by the handler
 
     def tearDown(self):
+        self.patch_fixed_address_index.stop()
         self.patch_designate_context.stop()
         self.patch_recordset.stop()
         self.patch_central_rpcapi.stop()
@@ -89,8 +101,8 @@ class NovaEnhancedHandlerTest(TestCase):
 
         self.mock_central_api.find_domain.assert_called_once_with(self.mock_admin_context,
                                                                   {'tenant_id': '4e3b6c0108f04b309737522a9deee9d8'})
-        self.mock_central_api.find_domains.assert_has_calls([call(self.mock_admin_context),
-                                                             call(self.mock_admin_context)])
+        self.mock_central_api.find_domains.assert_called_once_with(self.mock_admin_context, None, marker=None,
+                                                                   limit=1000)
 
         self.mock_recordset.assert_has_calls([
             call(name='demodesignate.private_management.test_domain.ost.com.', type='A'),
@@ -103,6 +115,91 @@ class NovaEnhancedHandlerTest(TestCase):
             call(self.mock_admin_context, 'test_reverse_domain_id', self.mock_recordset_sample)
         ])
 
+    def test_create_instance_domain_cached(self):
+        event_type = 'compute.instance.create.end'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01',
+            'fixed_ips': [
+                {
+                    'label': 'private_management',
+                    'version': 4,
+                    'address': '192.168.3.22'
+                }
+            ]
+        }
+        self.mock_central_api.find_domain.return_value = {'id': 'test_domain_id', 'name': 'test_domain.ost.com.'}
+        self.mock_central_api.find_domains.return_value = []
+        self.mock_central_api.create_recordset.return_value = {'id': 'test_recordset_id'}
+
+        self.handler.process_notification(self.mock_admin_context, event_type, payload)
+        self.handler.process_notification(self.mock_admin_context, event_type, dict(payload, hostname='other'))
+
+        self.mock_central_api.find_domain.assert_called_once_with(self.mock_admin_context,
+                                                                  {'tenant_id': '4e3b6c0108f04b309737522a9deee9d8'})
+        self.mock_recordset.assert_has_calls([
+            call(name='demodesignate.private_management.test_domain.ost.com.', type='A'),
+            call(name='other.private_management.test_domain.ost.com.', type='A')
+        ])
+
+    def test_create_instance_no_domain_cached(self):
+        event_type = 'compute.instance.create.end'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01',
+            'fixed_ips': []
+        }
+        self.mock_central_api.find_domain.side_effect = exceptions.DomainNotFound()
+
+        self.handler.process_notification(self.mock_admin_context, event_type, payload)
+        self.handler.process_notification(self.mock_admin_context, event_type, payload)
+
+        self.assertEqual(self.mock_central_api.find_domain.call_count, 1)
+        self.assertFalse(self.mock_central_api.create_recordset.called)
+
+    def test_create_instance_concurrently(self):
+        cfg.CONF.set_override('create_concurrency', 4, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'create_concurrency', 'handler:nova_enhanced')
+        event_type = 'compute.instance.create.end'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01',
+            'fixed_ips': [
+                {
+                    'label': 'private_management',
+                    'version': 4,
+                    'address': '192.168.3.22'
+                },
+                {
+                    'label': 'private_external',
+                    'version': 4,
+                    'address': '172.16.3.26'
+                }
+            ]
+        }
+        error = Exception('Timeout')
+        self.mock_central_api.find_domain.return_value = {'id': 'test_domain_id', 'name': 'test_domain.ost.com.'}
+        self.mock_central_api.find_domains.return_value = [
+            DomainDict(id='test_reverse_domain_id', name='172.in-addr.arpa.')
+        ]
+        self.mock_central_api.create_recordset.side_effect = [error, {'id': 'test_recordset_id'},
+                                                              {'id': 'test_reverse_recordset_id'}]
+
+        with self.assertRaises(Exception) as raised:
+            self.handler.process_notification(self.mock_admin_context, event_type, payload)
+
+        self.assertIs(raised.exception, error)
+        self.mock_central_api.find_domains.assert_called_once_with(self.mock_admin_context, None, marker=None,
+                                                                   limit=1000)
+        self.assertEqual(self.mock_central_api.create_recordset.call_count, 3)
+        self.mock_central_api.create_record.assert_has_calls([
+            call(self.mock_admin_context, 'test_domain_id', 'test_recordset_id', ANY),
+            call(self.mock_admin_context, 'test_reverse_domain_id', 'test_reverse_recordset_id', ANY)
+        ], any_order=True)
+
     def test_delete_instance(self):
         event_type = 'compute.instance.delete.start'
         payload = {
@@ -129,3 +226,565 @@ class NovaEnhancedHandlerTest(TestCase):
             call(self.mock_admin_context, 'test_domain_id', 'test_recordset_id_1', 'test_record_id_1'),
             call(self.mock_admin_context, 'test_domain_id', 'test_recordset_id_2', 'test_record_id_2')
         ])
+
+    def test_delete_instance_recordsets(self):
+        event_type = 'compute.instance.delete.start'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        recordsets = {
+            'test_recordset_id_1': {'records': [{'id': 'test_record_id_1'}]},
+            'test_recordset_id_2': {'records': [{'id': 'test_record_id_2'}, {'id': 'unmanaged_record_id'}]}
+        }
+
+        self.mock_central_api.find_records.return_value = [
+            {'id': 'test_record_id_1', 'domain_id': 'test_domain_id', 'recordset_id': 'test_recordset_id_1'},
+            {'id': 'test_record_id_2', 'domain_id': 'test_domain_id', 'recordset_id': 'test_recordset_id_2'}
+        ]
+        self.mock_central_api.find_recordset.side_effect = lambda context, criterion: recordsets[criterion['id']]
+
+        self.handler.process_notification(self.mock_admin_context, event_type, payload)
+
+        self.mock_central_api.delete_recordset.assert_called_once_with(
+            self.mock_admin_context, 'test_domain_id', 'test_recordset_id_1')
+        self.mock_central_api.delete_record.assert_called_once_with(
+            self.mock_admin_context, 'test_domain_id', 'test_recordset_id_2', 'test_record_id_2')
+
+    def test_create_and_delete_instance_coalesced(self):
+        cfg.CONF.set_override('coalesce_window', 10, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'coalesce_window', 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01',
+            'fixed_ips': [
+                {
+                    'label': 'private_management',
+                    'version': 4,
+                    'address': '192.168.3.22'
+                }
+            ]
+        }
+
+        handler.process_notification(self.mock_admin_context, 'compute.instance.create.end', payload)
+        handler.process_notification(self.mock_admin_context, 'compute.instance.delete.start', payload)
+
+        self.assertFalse(self.mock_central_api.find_domain.called)
+        self.assertFalse(self.mock_central_api.create_recordset.called)
+        self.assertFalse(self.mock_central_api.find_records.called)
+
+    def test_delete_instance_redelivered(self):
+        cfg.CONF.set_override('dedup_window', 60, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'dedup_window', 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        event_type = 'compute.instance.delete.start'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        self.mock_central_api.find_records.return_value = []
+
+        handler.process_notification(self.mock_admin_context, event_type, payload)
+        handler.process_notification(self.mock_admin_context, event_type, dict(payload))
+
+        self.assertEqual(self.mock_central_api.find_records.call_count, 1)
+
+    def test_delete_instance_dispatched(self):
+        cfg.CONF.set_override('dispatch_workers', 2, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'dispatch_workers', 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        self.addCleanup(handler._dispatcher.stop)
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        self.mock_central_api.find_records.return_value = []
+
+        handler.process_notification(self.mock_admin_context, 'compute.instance.delete.start', payload)
+        self.assertFalse(self.mock_central_api.find_records.called)
+        eventlet.sleep(0.01)
+
+        self.assertEqual(self.mock_central_api.find_records.call_count, 1)
+
+    def test_delete_instance_metrics(self):
+        cfg.CONF.set_override('metrics_sinks', ['dump'], 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'metrics_sinks', 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        event_type = 'compute.instance.delete.start'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        self.mock_central_api.find_records.return_value = []
+
+        handler.process_notification(self.mock_admin_context, event_type, payload)
+
+        snapshot = handler._metrics.snapshot()
+        self.assertEqual(snapshot['histograms']['event.compute_instance_delete_start']['count'], 1)
+        self.assertEqual(
+            snapshot['histograms']['event.compute_instance_delete_start.central.find_records']['count'], 1)
+        self.assertIn('cache.domain.hit_ratio', snapshot['gauges'])
+
+    def test_delete_instance_metrics_concurrent(self):
+        cfg.CONF.set_override('metrics_sinks', ['dump'], 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'metrics_sinks', 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        self.mock_central_api.find_records.return_value = [
+            {'id': 'record_1', 'domain_id': 'domain_1', 'recordset_id': 'recordset_1'},
+            {'id': 'record_2', 'domain_id': 'domain_2', 'recordset_id': 'recordset_2'}
+        ]
+        self.mock_central_api.find_recordset.side_effect = lambda context, criterion: {
+            'records': [{'id': 'record_%s' % criterion['id'][-1]}]}
+
+        handler.process_notification(self.mock_admin_context, 'compute.instance.delete.start', payload)
+
+        # The recordsets are deleted in other green threads, on behalf of the notification
+        snapshot = handler._metrics.snapshot()
+        self.assertEqual(
+            snapshot['histograms']['event.compute_instance_delete_start.central.delete_recordset']['count'], 2)
+
+    def test_delete_instance_retried(self):
+        cfg.CONF.set_override('retry_max_attempts', 3, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'retry_max_attempts', 'handler:nova_enhanced')
+        cfg.CONF.set_override('retry_base_delay', 0.001, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'retry_base_delay', 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        event_type = 'compute.instance.delete.start'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        self.mock_central_api.find_records.side_effect = [Exception('Timeout'), []]
+
+        handler.process_notification(self.mock_admin_context, event_type, payload)
+        self.assertTrue(handler._retry_queue.pending(payload['instance_id']))
+        eventlet.sleep(0.01)
+
+        self.assertEqual(self.mock_central_api.find_records.call_count, 2)
+        self.assertFalse(handler._retry_queue.pending(payload['instance_id']))
+
+    def test_delete_instance_record_error(self):
+        event_type = 'compute.instance.delete.start'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        error = Exception('Timeout')
+        self.mock_central_api.find_records.return_value = [
+            {'id': 'record_1', 'domain_id': 'domain_1', 'recordset_id': 'recordset_1'},
+            {'id': 'record_2', 'domain_id': 'domain_2', 'recordset_id': 'recordset_2'}
+        ]
+        self.mock_central_api.find_recordset.side_effect = lambda context, criterion: {
+            'records': [{'id': 'record_1'}, {'id': 'other'}] if criterion['id'] == 'recordset_1' else
+            [{'id': 'record_2'}]}
+        self.mock_central_api.delete_record.side_effect = error
+
+        # Logged without retries
+        self.handler.process_notification(self.mock_admin_context, event_type, payload)
+
+        # The other recordset is deleted anyway
+        self.mock_central_api.delete_recordset.assert_called_once_with(self.mock_admin_context, 'domain_2',
+                                                                       'recordset_2')
+
+    def test_delete_instance_record_error_retried(self):
+        for name, value in (('retry_max_attempts', 3), ('retry_base_delay', 0.001)):
+            cfg.CONF.set_override(name, value, 'handler:nova_enhanced')
+            self.addCleanup(cfg.CONF.clear_override, name, 'handler:nova_enhanced')
+        handler = NovaEnhancedHandler()
+        event_type = 'compute.instance.delete.start'
+        payload = {
+            'hostname': 'demodesignate',
+            'tenant_id': '4e3b6c0108f04b309737522a9deee9d8',
+            'instance_id': '9220edc1-426e-46b1-9967-ce1e64c82f01'
+        }
+        self.mock_central_api.find_records.return_value = [
+            {'id': 'record_1', 'domain_id': 'domain_1', 'recordset_id': 'recordset_1'}
+        ]
+        self.mock_central_api.find_recordset.return_value = {'records': [{'id': 'record_1'}, {'id': 'other'}]}
+        self.mock_central_api.delete_record.side_effect = [Exception('Timeout'), None]
+
+        handler.process_notification(self.mock_admin_context, event_type, payload)
+        self.assertTrue(handler._retry_queue.pending(payload['instance_id']))
+        eventlet.sleep(0.01)
+
+        self.assertEqual(self.mock_central_api.delete_record.call_count, 2)
+        self.assertFalse(handler._retry_queue.pending(payload['instance_id']))
+
+
+class NovaEnhancedHandlerCentralTest(fixtures.FakeCentralTest):
+    def setUp(self):
+        super(NovaEnhancedHandlerCentralTest, self).setUp()
+        cfg.CONF.set_override('update_event_types', ['compute.instance.interface_attach.end'],
+                              'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'update_event_types', 'handler:nova_enhanced')
+        self.handler = self.build_handler(NovaEnhancedHandler)
+        self.payload = fixtures.instance_payload(0, 1, 2)
+        self.handler.process_notification(None, 'compute.instance.create.end', self.payload)
+
+    def records(self):
+        return dict((record['data'], record['id']) for record in self.central_api.records.values())
+
+    def test_update_addresses(self):
+        records = self.records()
+        payload = fixtures.instance_payload(0, 1, 3)
+        del payload['fixed_ips'][1]
+
+        self.handler.process_notification(None, 'compute.instance.interface_attach.end', payload)
+
+        self.assertIn('compute.instance.interface_attach.end', self.handler.get_event_types())
+        updated = self.records()
+        self.assertEqual(sorted(updated), ['10.0.0.1', '10.2.0.1', 'host-00000.net_0.tenant-00000.example.com.',
+                                           'host-00000.net_2.tenant-00000.example.com.'])
+        # The records of the unchanged address are not rewritten
+        self.assertEqual(updated['10.0.0.1'], records['10.0.0.1'])
+        self.assertEqual(updated['host-00000.net_0.tenant-00000.example.com.'],
+                         records['host-00000.net_0.tenant-00000.example.com.'])
+        self.assertIsNone(self.handler._fixed_address_index.get(payload['tenant_id'], '10.1.0.1'))
+        self.assertEqual(self.handler._fixed_address_index.get(payload['tenant_id'], '10.2.0.1').label, 'net_2')
+
+        self.central_api.reset_calls()
+        self.handler.process_notification(None, 'compute.instance.interface_attach.end', payload)
+        self.assertEqual(dict(self.central_api.calls), {'find_records': 1})
+
+    def test_update_without_addresses(self):
+        self.central_api.reset_calls()
+        self.handler.process_notification(None, 'compute.instance.interface_attach.end',
+                                          {'instance_id': self.payload['instance_id'],
+                                           'tenant_id': self.payload['tenant_id']})
+        self.assertEqual(sum(self.central_api.calls.values()), 0)
+
+    def test_delete_instance_recordsets(self):
+        keys = [(recordset['domain_id'], recordset['name'], recordset['type'])
+                for recordset in self.central_api.recordsets.values()]
+        self.assertTrue(all(self.handler._recordset_cache.get(key) for key in keys))
+
+        self.handler.process_notification(None, 'compute.instance.delete.start', self.payload)
+
+        # The PTRs in the reverse zones of the admin tenant are deleted too, and the recordsets deleted are no
+        # longer cached
+        self.assertEqual(self.central_api.recordsets, {})
+        self.assertEqual([key for key in keys if self.handler._recordset_cache.get(key)], [])
+
+    def test_create_dual_stack_instance(self):
+        self.central_api.add_domain('8.b.d.0.1.0.0.2.ip6.arpa.', fixtures.ADMIN_TENANT)
+        self.handler._reverse_index.refresh()
+        payload = fixtures.instance_payload(1, 1, 1)
+        payload['fixed_ips'].append({'label': 'net_0', 'version': 6, 'address': '2001:db8::1:1'})
+
+        self.handler.process_notification(None, 'compute.instance.create.end', payload)
+
+        names = set(recordset['name'] for recordset in self.central_api.recordsets.values())
+        self.assertIn('1.0.0.0.1.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.', names)
+        self.assertIn('2.0.0.10.in-addr.arpa.', names)
+
+    def test_create_instance_invalid_address(self):
+        payload = fixtures.instance_payload(1, 1, 2)
+        payload['fixed_ips'][1]['address'] = '10.1.0.300'
+
+        self.handler.process_notification(None, 'compute.instance.create.end', payload)
+
+        # Only the PTR of the invalid address is skipped
+        names = [recordset['name'] for recordset in self.central_api.recordsets.values()
+                 if recordset['name'].startswith('host-00001') or recordset['name'].startswith('2.')]
+        self.assertEqual(sorted(names), ['2.0.0.10.in-addr.arpa.', 'host-00001.net_0.tenant-00000.example.com.',
+                                         'host-00001.net_1.tenant-00000.example.com.'])
+
+    def test_create_instance_replayed(self):
+        self.central_api.reset_calls()
+        self.handler._recordset_cache.clear()
+
+        self.handler.process_notification(None, 'compute.instance.create.end', self.payload)
+
+        self.assertEqual(len(self.central_api.records), 4)
+        self.assertEqual(self.central_api.calls['create_record'], 0)
+        self.central_api.reset_calls()
+        self.handler.process_notification(None, 'compute.instance.create.end', self.payload)
+        # The cached recordsets reject the duplicated records in a call each
+        self.assertEqual(self.central_api.calls['create_record'], 4)
+        self.assertEqual(self.central_api.calls['create_recordset'], 0)
+
+    def test_create_instance_existing_recordset(self):
+        # Multi-homed host with another address in the same network
+        payload = fixtures.instance_payload(0, 1, 1)
+        payload['instance_id'] = fixtures.instance_id(1)
+        payload['fixed_ips'][0]['address'] = '10.0.0.100'
+        self.handler._recordset_cache.clear()
+
+        self.handler.process_notification(None, 'compute.instance.create.end', payload)
+
+        name = 'host-00000.net_0.tenant-00000.example.com.'
+        recordset = [recordset for recordset in self.central_api.recordsets.values() if recordset['name'] == name][0]
+        self.assertEqual(sorted(self.central_api.records[record_id]['data'] for record_id in recordset['records']),
+                         ['10.0.0.1', '10.0.0.100'])
+        self.central_api.reset_calls()
+        payload['fixed_ips'][0]['address'] = '10.0.0.101'
+        self.handler.process_notification(None, 'compute.instance.create.end', payload)
+        self.assertEqual(self.central_api.calls['create_recordset'], 1)
+        self.assertEqual(len(recordset['records']), 3)
+
+    def test_create_instance_cached_recordset_deleted(self):
+        self.handler.process_notification(None, 'compute.instance.delete.start', self.payload)
+        self.central_api.reset_calls()
+
+        self.handler.process_notification(None, 'compute.instance.create.end', self.payload)
+
+        self.assertEqual(sorted(record['data'] for record in self.central_api.records.values()), [
+            '10.0.0.1', '10.1.0.1', 'host-00000.net_0.tenant-00000.example.com.',
+            'host-00000.net_1.tenant-00000.example.com.'])
+        # The recordsets are created again rather than written with their cached ids
+        self.assertEqual(self.central_api.calls['create_recordset'], 4)
+
+
+class NovaEnhancedHandlerWarmupTest(fixtures.FakeCentralTest):
+    tenants = 3
+    reverse_zones = 1
+    latency = 0.001
+
+    def setUp(self):
+        super(NovaEnhancedHandlerWarmupTest, self).setUp()
+        cfg.CONF.set_override('warmup', True, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'warmup', 'handler:nova_enhanced')
+        cfg.CONF.set_override('domains_page_size', 2, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'domains_page_size', 'handler:nova_enhanced')
+
+    def test_warmup(self):
+        handler = self.build_handler(NovaEnhancedHandler)
+        self.assertFalse(handler.is_ready())
+
+        # Waits for the warm-up, which reads the 6 domains in pages of 2
+        handler.process_notification(None, 'compute.instance.create.end', fixtures.instance_payload(0, 3, 1))
+
+        self.assertTrue(handler.is_ready())
+        self.assertEqual(dict(self.central_api.calls), {'find_domains': 4, 'create_recordset': 2, 'create_record': 2})
+
+    def test_refresh(self):
+        handler = self.build_handler(NovaEnhancedHandler)
+        eventlet.sleep(0.05)
+        domain = [domain for domain in self.central_api.domains.values()
+                  if domain['tenant_id'] == fixtures.tenant_id(1)][0]
+        del self.central_api.domains[domain['id']]
+
+        handler._refresh_domains()
+
+        self.central_api.reset_calls()
+        handler.process_notification(None, 'compute.instance.create.end', fixtures.instance_payload(1, 3, 1))
+        self.assertEqual(dict(self.central_api.calls), {'find_domain': 1})
+
+
+class NovaEnhancedHandlerRecordStoreTest(fixtures.FakeCentralTest):
+    reverse_zones = 1
+
+    def setUp(self):
+        super(NovaEnhancedHandlerRecordStoreTest, self).setUp()
+        self.patch_stores = patch('designate_enhancedhandler.store._stores', {})
+        self.patch_stores.start()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        cfg.CONF.set_override('record_store_path', os.path.join(self.tmpdir, 'records.sqlite'),
+                              'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'record_store_path', 'handler:nova_enhanced')
+        cfg.CONF.set_override('update_event_types', ['compute.instance.interface_attach.end'],
+                              'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'update_event_types', 'handler:nova_enhanced')
+        self.handler = self.build_handler(NovaEnhancedHandler)
+        self.payload = fixtures.instance_payload(0, 1, 2)
+        self.handler.process_notification(None, 'compute.instance.create.end', self.payload)
+
+    def tearDown(self):
+        self.patch_stores.stop()
+
+    def test_delete_instance(self):
+        self.assertEqual(len(self.handler._record_store), 4)
+        self.central_api.reset_calls()
+
+        self.handler.process_notification(None, 'compute.instance.delete.start', {
+            'instance_id': self.payload['instance_id'],
+            'tenant_id': self.payload['tenant_id']
+        })
+
+        self.assertEqual(self.central_api.records, {})
+        self.assertEqual(self.central_api.calls['find_records'], 0)
+        self.assertEqual(len(self.handler._record_store), 0)
+
+    def test_update_addresses(self):
+        payload = fixtures.instance_payload(0, 1, 3)
+        del payload['fixed_ips'][1]
+        self.central_api.reset_calls()
+
+        self.handler.process_notification(None, 'compute.instance.interface_attach.end', payload)
+
+        self.assertEqual(self.central_api.calls['find_records'], 0)
+        self.assertEqual(self.handler._record_store.get_addresses({
+            'managed_plugin_name': 'nova_enhanced',
+            'managed_resource_type': 'instance',
+            'managed_resource_id': self.payload['instance_id']
+        }), set(['10.0.0.1', '10.2.0.1']))
+        self.assertEqual(sorted(record['data'] for record in self.central_api.records.values()),
+                         ['10.0.0.1', '10.2.0.1', 'host-00000.net_0.tenant-00000.example.com.',
+                          'host-00000.net_2.tenant-00000.example.com.'])
+
+
+class NovaEnhancedHandlerBatchTest(fixtures.FakeCentralTest):
+    tenants = 2
+
+    def setUp(self):
+        super(NovaEnhancedHandlerBatchTest, self).setUp()
+        cfg.CONF.set_override('batch_interval', 0.01, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'batch_interval', 'handler:nova_enhanced')
+        self.handler = self.build_handler(NovaEnhancedHandler)
+
+    def record_writes(self):
+        """Record the number of items of each burst written"""
+        writes = []
+        write_batch = self.handler._write_batch
+
+        def write(domain_id, items):
+            writes.append(len(items))
+            return write_batch(domain_id, items)
+        self.handler._batcher._write = write
+        return writes
+
+    def process_all(self, payloads):
+        # Like the notification executor, which processes every message in its own green thread
+        pool = eventlet.GreenPool()
+        for payload in payloads:
+            pool.spawn(self.handler.process_notification, None, 'compute.instance.create.end', payload)
+        pool.waitall()
+
+    def test_boot_storm(self):
+        writes = self.record_writes()
+        self.process_all(fixtures.instance_payload(number, 2, 1) for number in range(8))
+
+        # A burst per tenant zone and another one for the reverse zone
+        self.assertEqual(sorted(writes), [4, 4, 8])
+        self.assertEqual(self.central_api.calls['create_recordset'], 16)
+        self.assertEqual(self.central_api.calls['create_record'], 0)
+        self.assertEqual(len(self.central_api.records), 16)
+
+    def test_serial_notification(self):
+        writes = self.record_writes()
+        self.handler.process_notification(None, 'compute.instance.create.end', fixtures.instance_payload(0, 2, 2))
+
+        # The records of both interfaces are written in a burst to the tenant zone and another one to the reverse zone
+        self.assertEqual(sorted(writes), [2, 2])
+        self.assertEqual(len(self.central_api.records), 4)
+
+    def test_existing_recordset(self):
+        payload = fixtures.instance_payload(0, 2, 1)
+        self.process_all([payload])
+        self.handler._recordset_cache.clear()
+        self.central_api.reset_calls()
+        payload['fixed_ips'][0]['address'] = '10.0.0.200'
+
+        self.process_all([payload])
+
+        # Both records are added to the recordset of the host
+        names = sorted(recordset['name'] for recordset in self.central_api.recordsets.values())
+        self.assertEqual(len(names), 3)
+        self.assertEqual(len(self.central_api.records), 4)
+        self.assertEqual(self.central_api.calls['find_recordset'], 1)
+
+
+class NovaEnhancedHandlerSummaryLogTest(fixtures.FakeCentralTest):
+    def setUp(self):
+        super(NovaEnhancedHandlerSummaryLogTest, self).setUp()
+        cfg.CONF.set_override('log_summary', True, 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'log_summary', 'handler:nova_enhanced')
+        self.handler = self.build_handler(NovaEnhancedHandler)
+
+    @patch('designate_enhancedhandler.notification_handler.base.LOG')
+    def test_summary(self, mock_log):
+        payload = fixtures.instance_payload(0, 1, 2)
+        self.handler.process_notification(None, 'compute.instance.create.end', payload)
+        self.handler.process_notification(None, 'compute.instance.delete.start', payload)
+
+        summaries = [json.loads(info[0][1]) for info in mock_log.info.call_args_list
+                     if info[0][0] == 'Notification processed: %s']
+        self.assertEqual([(summary['event_type'], summary['outcome'], summary.get('records_created'),
+                           summary.get('records_deleted')) for summary in summaries],
+                         [('compute.instance.create.end', 'ok', 4, None),
+                          ('compute.instance.delete.start', 'ok', None, 4)])
+
+
+class NovaEnhancedHandlerPartitionTest(fixtures.FakeCentralTest):
+    tenants = 10
+
+    def setUp(self):
+        super(NovaEnhancedHandlerPartitionTest, self).setUp()
+        cfg.CONF.set_override('partition_members', ['node-a', 'node-b'], 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'partition_members', 'handler:nova_enhanced')
+        self.addCleanup(cfg.CONF.clear_override, 'partition_node', 'handler:nova_enhanced')
+        self.handlers = []
+        for node in ('node-a', 'node-b'):
+            cfg.CONF.set_override('partition_node', node, 'handler:nova_enhanced')
+            self.handlers.append(self.build_handler(NovaEnhancedHandler))
+
+    def test_partition(self):
+        for number in range(20):
+            for handler in self.handlers:
+                handler.process_notification(None, 'compute.instance.create.end',
+                                             fixtures.instance_payload(number, 10, 1))
+
+        # Every instance is registered once, and every tenant domain is only looked up by its node
+        self.assertEqual(len(self.central_api.records), 40)
+        self.assertEqual(self.central_api.calls['find_domain'], 10)
+        self.assertTrue(all(len(handler._domain_cache) for handler in self.handlers))
+
+
+class NovaEnhancedHandlerLanesTest(fixtures.FakeCentralTest):
+    latency = 0.001
+
+    def setUp(self):
+        super(NovaEnhancedHandlerLanesTest, self).setUp()
+        for name, value in (('dispatch_workers', 1), ('dispatch_lanes', {'urgent': '4'}),
+                            ('dispatch_event_lanes', {'compute.instance.delete.start': 'urgent'})):
+            cfg.CONF.set_override(name, value, 'handler:nova_enhanced')
+            self.addCleanup(cfg.CONF.clear_override, name, 'handler:nova_enhanced')
+        self.handler = self.build_handler(NovaEnhancedHandler)
+        self.processed = []
+        process_notification = self.handler._process_notification
+
+        def record(context, event_type, payload):
+            self.processed.append((event_type, payload['instance_id']))
+            process_notification(context, event_type, payload)
+        self.handler._process_notification = record
+
+    def tearDown(self):
+        self.handler._dispatcher.stop()
+
+    def test_deletes_not_starved(self):
+        self.handler.process_notification(None, 'compute.instance.create.end', fixtures.instance_payload(0, 1, 1))
+        self.handler._dispatcher.join()
+        for number in range(1, 10):
+            self.handler.process_notification(None, 'compute.instance.create.end',
+                                              fixtures.instance_payload(number, 1, 1))
+        for number in (0, 9):
+            self.handler.process_notification(None, 'compute.instance.delete.start', {
+                'instance_id': fixtures.instance_id(number),
+                'tenant_id': fixtures.tenant_id(0)
+            })
+        # The deletion of the instance 9 follows its creation into the default lane
+        self.assertEqual(self.handler._dispatcher.lane_depths(), {'default': 10, 'urgent': 1})
+        self.handler._dispatcher.join()
+
+        deletes = [index for index, (event_type, _) in enumerate(self.processed)
+                   if event_type == 'compute.instance.delete.start']
+        # The deletion of an instance created long ago overtakes the queued creations, while the deletion
+        # of a queued instance waits for its creation
+        self.assertTrue(deletes[0] < 4, self.processed)
+        self.assertEqual(self.processed[deletes[1] - 1:deletes[1] + 1],
+                         [('compute.instance.create.end', fixtures.instance_id(9)),
+                          ('compute.instance.delete.start', fixtures.instance_id(9))])
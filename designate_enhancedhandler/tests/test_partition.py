@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from designate_enhancedhandler.partition import HashRing
+from designate_enhancedhandler.partition import Partitioner
+from designate_enhancedhandler.partition import read_members
+
+KEYS = ['tenant-%05d' % number for number in range(1000)]
+
+
+class HashRingTest(TestCase):
+    def test_owner(self):
+        ring = HashRing(['node-a', 'node-b', 'node-c'])
+        owners = [ring.owner(key) for key in KEYS]
+        self.assertEqual(owners, [HashRing(['node-c', 'node-a', 'node-b']).owner(key) for key in KEYS])
+        for member in ring.members:
+            self.assertTrue(200 < owners.count(member) < 466, (member, owners.count(member)))
+        self.assertIsNone(HashRing([]).owner('tenant-00000'))
+
+    def test_add_member(self):
+        ring = HashRing(['node-a', 'node-b', 'node-c'])
+        bigger = HashRing(['node-a', 'node-b', 'node-c', 'node-d'])
+        moved = [key for key in KEYS if ring.owner(key) != bigger.owner(key)]
+        # Only the keys taken by the new member move
+        self.assertEqual(set(bigger.owner(key) for key in moved), set(['node-d']))
+        self.assertTrue(150 < len(moved) < 350, len(moved))
+
+
+class PartitionerTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'members')
+
+    def write_members(self, *members):
+        with open(self.path, 'w') as members_file:
+            members_file.write('# Nodes of designate-sink\n\n' + '\n'.join(members) + '\n')
+
+    def test_owns(self):
+        partitioners = [Partitioner(node, ['node-a', 'node-b']) for node in ('node-a', 'node-b')]
+        for key in KEYS:
+            self.assertEqual([partitioner.owns(key) for partitioner in partitioners].count(True), 1)
+
+    def test_not_a_member(self):
+        partitioner = Partitioner('node-c', ['node-a', 'node-b'])
+        self.assertTrue(all(partitioner.owns(key) for key in KEYS))
+
+    def test_members_file(self):
+        self.write_members('node-a', 'node-b')
+        self.assertEqual(read_members(self.path), ['node-a', 'node-b'])
+        partitioner = Partitioner('node-a', path=self.path, clock=lambda: self.now)
+        owned = sum(1 for key in KEYS if partitioner.owns(key))
+        self.assertTrue(owned < len(KEYS))
+
+        self.write_members('node-a')
+        os.utime(self.path, (self.now, self.now + 1))
+        self.assertEqual(sum(1 for key in KEYS if partitioner.owns(key)), owned)
+        self.now += 10
+        self.assertTrue(all(partitioner.owns(key) for key in KEYS))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import eventlet
+from mock import MagicMock
+from unittest import TestCase
+
+from designate import exceptions
+from designate_enhancedhandler.ratelimit import AdaptiveLimiter
+from designate_enhancedhandler.ratelimit import RateLimitedCentralAPI
+from designate_enhancedhandler.ratelimit import TokenBucket
+
+
+class TokenBucketTest(TestCase):
+    def test_reserve(self):
+        now = [0.0]
+        bucket = TokenBucket(2, 2, lambda: now[0])
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0.0, 0.0, 0.5, 1.0])
+        now[0] = 2.5
+        self.assertEqual(bucket.reserve(), 0.0)
+
+
+class AdaptiveLimiterTest(TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.limiter = AdaptiveLimiter(1, 4, 1.0, lambda: self.now[0])
+
+    def test_additive_increase(self):
+        for _ in range(10):
+            self.limiter.acquire()
+            self.limiter.release(0.1)
+        self.assertEqual(int(self.limiter.limit), 4)
+
+    def test_multiplicative_decrease(self):
+        self.limiter.limit = 4.0
+        self.limiter.acquire()
+        self.limiter.release(2.0)
+        self.assertEqual(self.limiter.limit, 2.0)
+        # At most once per latency target
+        self.limiter.acquire()
+        self.limiter.release(0.1, Exception('timeout'))
+        self.assertEqual(self.limiter.limit, 2.0)
+        self.now[0] = 1.0
+        self.limiter.acquire()
+        self.limiter.release(0.1, Exception('timeout'))
+        self.assertEqual(self.limiter.limit, 1.0)
+
+    def test_designate_errors(self):
+        self.limiter.acquire()
+        self.limiter.release(0.1, exceptions.DuplicateRecordSet())
+        self.assertEqual(self.limiter.limit, 2.0)
+
+    def test_concurrency(self):
+        limiter = AdaptiveLimiter(2, 2, 1.0)
+        in_flight = []
+
+        def call():
+            limiter.acquire()
+            in_flight.append(limiter.in_flight)
+            eventlet.sleep(0.01)
+            limiter.release(0.01)
+
+        pool = eventlet.GreenPool()
+        for _ in range(6):
+            pool.spawn(call)
+        pool.waitall()
+        self.assertEqual(len(in_flight), 6)
+        self.assertEqual(max(in_flight), 2)
+
+
+class RateLimitedCentralAPITest(TestCase):
+    def test_tenant_buckets(self):
+        central_api = MagicMock(name='central_api')
+        sleep = MagicMock(name='sleep')
+        rate_limited = RateLimitedCentralAPI(central_api, tenant_rate=1, tenant_burst=1, sleep=sleep)
+        tenant_1 = MagicMock(tenant='tenant_1', all_tenants=False)
+        tenant_2 = MagicMock(tenant='tenant_2', all_tenants=False)
+        admin = MagicMock(tenant=None, all_tenants=True)
+
+        self.assertEqual(rate_limited.find_domain(tenant_1, {}), central_api.find_domain.return_value)
+        rate_limited.find_domain(tenant_2, {})
+        rate_limited.find_domains(admin)
+        self.assertFalse(sleep.called)
+        rate_limited.find_domain(tenant_1, {})
+        self.assertEqual(sleep.call_count, 1)
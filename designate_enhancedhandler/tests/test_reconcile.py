@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+from unittest import TestCase
+
+from designate_enhancedhandler.paging import iter_pages
+from designate_enhancedhandler.reconcile import read_snapshot
+from designate_enhancedhandler.reconcile import Reconciler
+from designate_enhancedhandler.tests import fixtures
+
+
+class PagingTest(TestCase):
+    def test_delete_while_iterating(self):
+        central_api = fixtures.FakeCentralAPI()
+        for number in range(5):
+            central_api.add_domain('domain-%d.example.com.' % number, 'tenant')
+        pages = []
+        for page in iter_pages(central_api.find_domains, None, None, 2):
+            pages.append([domain['name'] for domain in page])
+            for domain in page:
+                del central_api.domains[domain['id']]
+        self.assertEqual(sorted(sum(pages, [])), ['domain-%d.example.com.' % number for number in range(5)])
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+
+
+class ReconcilerTest(fixtures.FakeCentralTest):
+    tenants = 2
+    reverse_zones = 2
+
+    def setUp(self):
+        super(ReconcilerTest, self).setUp()
+        handlers = self.build_handlers()
+        self.handlers = dict((handler.get_plugin_name(), handler) for handler in set(handlers.values()))
+        events = list(fixtures.boot_storm(2, 3, 1, delete=False))
+        events.append(fixtures.Event('floatingip.update.end', fixtures.floatingip_payload(0, 2, True)))
+        self.run_events('setup', events, handlers)
+
+    def managed_records(self):
+        return sorted((record['managed_resource_id'], record['data']) for record in self.central_api.records.values()
+                      if record['managed'])
+
+    def test_reconcile(self):
+        instance_2 = fixtures.instance_payload(2, 2, 1)
+        instance_2['fixed_ips'][0]['address'] = '10.0.0.200'
+        snapshot = [
+            fixtures.instance_payload(0, 2, 1),  # Unchanged
+            instance_2,  # Changed address
+            fixtures.instance_payload(3, 2, 1),  # Missing, while instance 1 is gone
+            fixtures.floatingip_resource(0, 2),  # Unchanged
+        ]
+
+        stats = Reconciler(self.handlers, page_size=2).reconcile(iter(snapshot))
+
+        self.assertEqual((stats['deleted'], stats['created'], stats['errors']), (4, 4, 0))
+        self.assertEqual(self.managed_records(), sorted([
+            (fixtures.instance_id(0), '10.0.0.1'),
+            (fixtures.instance_id(0), 'host-00000.net_0.tenant-00000.example.com.'),
+            (fixtures.instance_id(2), '10.0.0.200'),
+            (fixtures.instance_id(2), 'host-00002.net_0.tenant-00000.example.com.'),
+            (fixtures.instance_id(3), '10.0.0.4'),
+            (fixtures.instance_id(3), 'host-00003.net_0.tenant-00001.example.com.'),
+            (fixtures.floatingip_id(0), '172.16.0.1'),
+            (fixtures.floatingip_id(0), 'host-00000.floating_net_0.tenant-00000.example.com.'),
+        ]))
+        stats = Reconciler(self.handlers, page_size=2).reconcile(iter(snapshot))
+        self.assertEqual((stats['found'], stats['deleted'], stats['created']), (8, 0, 0))
+
+    def test_desired_by_domain(self):
+        reconciler = Reconciler(self.handlers)
+        domains = dict((domain['name'], domain['id']) for domain in self.central_api.domains.values())
+        snapshot = [fixtures.instance_payload(0, 2, 1), fixtures.floatingip_resource(0, 2)]
+
+        self.assertEqual(sorted(key[2:] for key in reconciler.get_desired(snapshot, domains['0.0.10.in-addr.arpa.'])),
+                         [('1.0.0.10.in-addr.arpa.', 'host-00000.net_0.tenant-00000.example.com.')])
+        self.assertEqual(len(reconciler.get_desired(snapshot, domains['tenant-00000.example.com.'])), 2)
+        self.assertEqual(reconciler.get_desired(snapshot, domains['tenant-00001.example.com.']), {})
+        self.assertEqual(len(reconciler.get_desired(snapshot)), 4)
+
+    def test_recordset_names_dropped(self):
+        reconciler = Reconciler(self.handlers, page_size=2)
+        reconciler.reconcile(iter([fixtures.instance_payload(0, 2, 1)]))
+        self.assertEqual(reconciler._recordset_names, {})
+
+    def test_dry_run(self):
+        records = self.managed_records()
+        stats = Reconciler(self.handlers, dry_run=True).reconcile(iter([fixtures.instance_payload(0, 2, 1)]))
+        self.assertEqual((stats['deleted'], stats['created']), (6, 0))
+        self.assertEqual(self.managed_records(), records)
+
+    def test_plugins(self):
+        Reconciler({'nova_enhanced': self.handlers['nova_enhanced']}).reconcile(iter([]))
+        self.assertEqual([data for _, data in self.managed_records()],
+                         ['172.16.0.1', 'host-00000.floating_net_0.tenant-00000.example.com.'])
+
+    def test_read_snapshot(self):
+        self.assertEqual(list(read_snapshot(['{"type": "floatingip"}', '', 'broken'])), [{'type': 'floatingip'}])
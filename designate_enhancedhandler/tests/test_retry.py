@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+
+import eventlet
+from unittest import TestCase
+
+from designate_enhancedhandler.coalesce import Notification
+from designate_enhancedhandler.retry import RetryQueue
+
+
+class RetryQueueTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.processed = []
+        self.failures = {}
+        self.delays = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def process(self, notification):
+        failures = self.failures.get(notification.payload['id'], 0)
+        if failures:
+            self.failures[notification.payload['id']] = failures - 1
+            raise Exception('Timeout')
+        self.processed.append((notification.event_type, notification.payload['id']))
+
+    def sleep(self, seconds):
+        self.delays.append(seconds)
+        eventlet.sleep(0)
+
+    def queue(self, **kwargs):
+        queue = RetryQueue(self.process, 3, 1, 3, sleep=self.sleep, jitter=lambda: 1.0, **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_backoff(self):
+        self.failures['a'] = 1
+        queue = RetryQueue(self.process, 4, 1, 3, sleep=self.sleep, jitter=lambda: 1.0)
+        queue.submit('a', Notification(None, 'create', {'id': 'a'}), 2)
+        eventlet.sleep(0.01)
+        self.assertEqual(self.processed, [('create', 'a')])
+        self.assertEqual(self.delays, [2, 3])
+        self.assertFalse(queue.pending('a'))
+
+    def test_order_per_key(self):
+        self.failures['a'] = 1
+        queue = self.queue()
+        queue.submit('a', Notification(None, 'create', {'id': 'a'}), 1)
+        queue.submit('a', Notification(None, 'delete', {'id': 'a'}))
+        queue.submit('b', Notification(None, 'create', {'id': 'b'}))
+        self.assertTrue(queue.pending('a'))
+        eventlet.sleep(0.01)
+        self.assertEqual(self.processed, [('create', 'b'), ('create', 'a'), ('delete', 'a')])
+
+    def test_dead_letter(self):
+        self.failures['a'] = 5
+        path = os.path.join(self.directory, 'dead_letter.jsonl')
+        queue = self.queue(dead_letter_path=path)
+        queue.submit('a', Notification(None, 'create', {'id': 'a'}), 1)
+        eventlet.sleep(0.01)
+        self.assertEqual(self.processed, [])
+        with open(path) as dead_letter:
+            lines = [json.loads(line) for line in dead_letter]
+        self.assertEqual([(line['event_type'], line['payload'], line['attempts']) for line in lines],
+                         [('create', {'id': 'a'}, 3)])
+
+    def test_journal(self):
+        path = os.path.join(self.directory, 'journal.db')
+        queue = RetryQueue(self.process, 3, 1, 3, path, sleep=lambda seconds: eventlet.sleep(60))
+        queue.submit('a', Notification(None, 'create', {'id': 'a'}), 1)
+        queue.submit('a', Notification(None, 'delete', {'id': 'a'}))
+        eventlet.sleep(0)
+        queue.close()
+
+        queue = self.queue(journal_path=path)
+        self.assertEqual(len(queue), 2)
+        eventlet.sleep(0.01)
+        self.assertEqual(self.processed, [('create', 'a'), ('delete', 'a')])
+        self.assertEqual(len(self.queue(journal_path=path)), 0)
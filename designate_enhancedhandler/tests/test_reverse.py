@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from designate_enhancedhandler.reverse import classless_range
+from designate_enhancedhandler.reverse import parse_address
+from designate_enhancedhandler.reverse import reverse_fqdn
+
+
+class ReverseTest(TestCase):
+    def test_parse_address(self):
+        self.assertEqual(parse_address('192.168.3.22'), (4, 0xc0a80316))
+        self.assertEqual(parse_address('fdda:5cc1:23:4::1f'), (6, 0xfdda5cc100230004000000000000001f))
+        self.assertEqual(parse_address('fe80::1%eth0'), (6, 0xfe800000000000000000000000000001))
+        for address in ('192.168.3', '192.168.3.256', 'fdda::5cc1::1', 'host'):
+            self.assertRaises(ValueError, parse_address, address)
+
+    def test_reverse_fqdn_ipv4(self):
+        self.assertEqual(reverse_fqdn('192.168.3.22'), '22.3.168.192.in-addr.arpa.')
+        self.assertEqual(reverse_fqdn('10.0.0.1'), '1.0.0.10.in-addr.arpa.')
+
+    def test_reverse_fqdn_ipv6(self):
+        # The compressed groups are expanded and every group is padded on the left
+        self.assertEqual(reverse_fqdn('fdda:5cc1:23:4::1f'),
+                         'f.1.0.0.0.0.0.0.0.0.0.0.0.0.0.0.4.0.0.0.3.2.0.0.1.c.c.5.a.d.d.f.ip6.arpa.')
+        self.assertEqual(reverse_fqdn('2001:DB8::567:89ab'),
+                         'b.a.9.8.7.6.5.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.')
+        self.assertEqual(reverse_fqdn('::1'), '.'.join('1' + '0' * 31) + '.ip6.arpa.')
+
+    def test_classless_range(self):
+        self.assertEqual(classless_range('0/26.2.0.192.in-addr.arpa.'), (0, 63))
+        self.assertEqual(classless_range('128/25.2.0.192.in-addr.arpa.'), (128, 255))
+        self.assertEqual(classless_range('64-127.2.0.192.in-addr.arpa.'), (64, 127))
+        for name in ('2.0.192.in-addr.arpa.', '0/24.2.0.192.in-addr.arpa.', '0/26.0.192.in-addr.arpa.',
+                     '200/26.2.0.192.in-addr.arpa.', 'a/26.2.0.192.in-addr.arpa.', '0/26.example.com.'):
+            self.assertIsNone(classless_range(name), name)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from designate_enhancedhandler.indexes import AddressEntry
+from designate_enhancedhandler.store import RecordStore
+
+INSTANCE = {
+    'managed_plugin_name': 'nova_enhanced',
+    'managed_resource_type': 'instance',
+    'managed_resource_id': 'instance_1'
+}
+
+FLOATINGIP = {
+    'managed_plugin_name': 'neutron_enhanced',
+    'managed_resource_type': 'floatingip',
+    'managed_resource_id': 'floatingip_1',
+    'managed_extra': 'portid:port_1'
+}
+
+
+def record(number):
+    return {'id': 'record_%d' % number, 'domain_id': 'domain_1', 'recordset_id': 'recordset_%d' % number}
+
+
+class RecordStoreTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'records.sqlite')
+        self.store = RecordStore(self.path)
+        self.addCleanup(self.store.close)
+        self.store.add(INSTANCE, 'tenant_1', '10.0.0.1', 'host-01.private.tenant.', 'A', '10.0.0.1', record(1))
+        self.store.add(INSTANCE, 'tenant_1', '10.0.0.1', '1.0.0.10.in-addr.arpa.', 'PTR',
+                       'host-01.private.tenant.', record(2))
+        self.store.add(INSTANCE, 'tenant_1', '10.0.1.1', 'host-01.public.tenant.', 'A', '10.0.1.1', record(3))
+        self.store.add(FLOATINGIP, 'tenant_1', '192.168.0.1', 'host-01.floating_private.tenant.', 'A',
+                       '192.168.0.1', record(4))
+
+    def test_find(self):
+        self.assertEqual(self.store.find(INSTANCE), [record(1), record(2), record(3)])
+        self.assertEqual(self.store.find(INSTANCE, '10.0.0.1'), [record(1), record(2)])
+        self.assertEqual(self.store.find(dict(INSTANCE, managed_resource_id='instance_2')), [])
+        self.assertEqual(self.store.find_port('port_1'), [record(4)])
+        self.assertEqual(self.store.get_addresses(INSTANCE), set(['10.0.0.1', '10.0.1.1']))
+
+    def test_get_address(self):
+        self.assertEqual(self.store.get_address('tenant_1', '10.0.1.1'),
+                         AddressEntry('host-01', 'public', 'A', 'domain_1'))
+        self.assertIsNone(self.store.get_address('tenant_2', '10.0.1.1'))
+        # Floating addresses are not fixed addresses of an instance
+        self.assertIsNone(self.store.get_address('tenant_1', '192.168.0.1'))
+
+    def test_remove(self):
+        self.store.remove(['record_1', 'record_2'])
+        self.assertEqual(self.store.find(INSTANCE), [record(3)])
+        self.assertEqual(len(self.store), 2)
+
+    def test_shared(self):
+        other = RecordStore(self.path)
+        self.addCleanup(other.close)
+        other.remove(['record_4'])
+        self.assertEqual(self.store.find_port('port_1'), [])
+        self.assertEqual(len(self.store), 3)
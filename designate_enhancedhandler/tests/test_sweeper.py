@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import datetime
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from mock import patch
+
+from designate_enhancedhandler.sweeper import SnapshotLiveness
+from designate_enhancedhandler.sweeper import Sweeper
+from designate_enhancedhandler.tests import fixtures
+
+
+class Interrupted(Exception):
+    pass
+
+
+class SweeperTest(fixtures.FakeCentralTest):
+    tenants = 2
+    reverse_zones = 2
+
+    def setUp(self):
+        # Sequential ids, so the records are paged in the order they are created
+        ids = itertools.count(1)
+        self.patch_uuid = patch('designate_enhancedhandler.benchmark.central.uuid.uuid4',
+                                side_effect=lambda: uuid.UUID(int=next(ids)))
+        self.patch_uuid.start()
+        super(SweeperTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        handlers = self.build_handlers()
+        self.handler = handlers['compute.instance.create.end']
+        self.run_events('setup', fixtures.boot_storm(2, 6, 1, delete=False), handlers)
+        self.snapshot = os.path.join(self.directory, 'snapshot.jsonl')
+        with open(self.snapshot, 'w') as snapshot:
+            for number in range(2):
+                snapshot.write(json.dumps(fixtures.instance_payload(number, 2, 1)) + '\n')
+            snapshot.write(json.dumps(dict(fixtures.floatingip_payload(0, 2, False)['floatingip'],
+                                           type='floatingip')) + '\n')
+        self.liveness = SnapshotLiveness(self.snapshot)
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.patch_uuid.stop()
+
+    def resource_ids(self):
+        return sorted(set(record['managed_resource_id'] for record in self.central_api.records.values()
+                          if record['managed']))
+
+    def test_liveness(self):
+        self.liveness.load()
+        self.assertEqual(len(self.liveness), 2)
+        self.assertTrue(self.liveness.is_alive(fixtures.instance_id(1)))
+        # Disassociated floating IPs have no records
+        self.assertFalse(self.liveness.is_alive(fixtures.floatingip_id(0)))
+
+    def test_sweep(self):
+        deleted = Sweeper(self.handler, self.liveness, page_size=3).sweep()
+
+        self.assertEqual(deleted, 8)
+        self.assertEqual(self.resource_ids(), [fixtures.instance_id(0), fixtures.instance_id(1)])
+
+    def test_sweep_resumed(self):
+        now = [0.0]
+
+        def sleep(seconds):
+            if now[0] >= 3:
+                raise Interrupted()
+            now[0] += seconds
+
+        sweeper = Sweeper(self.handler, self.liveness, page_size=2, rate=1, checkpoint_path=self.checkpoint,
+                          clock=lambda: now[0], sleep=sleep)
+        # Interrupted before deleting the fifth orphan, once instances 2 and 3 are deleted
+        self.assertRaises(Interrupted, sweeper.sweep)
+        self.assertEqual(len(self.resource_ids()), 4)
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        self.central_api.reset_calls()
+        deleted = Sweeper(self.handler, self.liveness, page_size=2, checkpoint_path=self.checkpoint).sweep()
+
+        self.assertEqual(self.resource_ids(), [fixtures.instance_id(0), fixtures.instance_id(1)])
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # The records of instances 0 and 1, before the checkpoint, are not read again
+        self.assertEqual(deleted, 4)
+        self.assertEqual(self.central_api.calls['find_records'], 3)
+
+    def test_sweep_checkpoint_deleted(self):
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'marker': str(uuid.UUID(int=999))}, checkpoint)
+
+        deleted = Sweeper(self.handler, self.liveness, checkpoint_path=self.checkpoint).sweep()
+
+        self.assertEqual(deleted, 8)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_recent_records_kept(self):
+        self.liveness.load()
+        sweeper = Sweeper(self.handler, self.liveness)
+        created_at = datetime.datetime.utcfromtimestamp(self.liveness.timestamp + 60)
+        self.assertFalse(sweeper._is_orphan({'managed_resource_id': 'unknown', 'created_at': created_at}))
+        self.assertTrue(sweeper._is_orphan({'managed_resource_id': 'unknown'}))
+
+    def test_no_alive_resources(self):
+        open(self.snapshot, 'w').close()
+        self.assertEqual(Sweeper(self.handler, self.liveness).sweep(), 0)
+        self.assertEqual(len(self.resource_ids()), 6)
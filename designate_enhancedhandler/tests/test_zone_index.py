@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from mock import MagicMock
+from unittest import TestCase
+
+from designate_enhancedhandler.zone_index import ReverseZoneIndex
+from collections import namedtuple
+
+
+DomainDict = namedtuple('DomainDict', ['id', 'name'])
+
+
+class ReverseZoneIndexTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.loader = MagicMock(name='loader')
+        self.loader.return_value = [
+            DomainDict(id='tenant_domain_id', name='test_domain.ost.com.'),
+            DomainDict(id='reverse_172_id', name='172.in-addr.arpa.'),
+            DomainDict(id='reverse_172_16_id', name='16.172.in-addr.arpa.'),
+            DomainDict(id='reverse_2_id', name='2.in-addr.arpa.')
+        ]
+        self.index = ReverseZoneIndex(self.loader, 300, 30, clock=lambda: self.now)
+
+    def test_longest_match(self):
+        self.assertEqual(self.index.lookup('26.3.16.172.in-addr.arpa.').id, 'reverse_172_16_id')
+        self.assertEqual(self.index.lookup('26.3.17.172.in-addr.arpa.').id, 'reverse_172_id')
+        self.loader.assert_called_once_with()
+
+    def test_label_wise_match(self):
+        # 12.in-addr.arpa. ends with 2.in-addr.arpa. but it is not contained in that zone
+        self.assertIsNone(self.index.lookup('1.1.1.12.in-addr.arpa.'))
+
+    def test_zones(self):
+        self.assertEqual(sorted(zone.id for zone in self.index.zones()),
+                         ['reverse_172_16_id', 'reverse_172_id', 'reverse_2_id'])
+
+    def test_refresh_on_ttl(self):
+        self.index.lookup('26.3.16.172.in-addr.arpa.')
+        self.now += 299
+        self.index.lookup('26.3.16.172.in-addr.arpa.')
+        self.assertEqual(self.loader.call_count, 1)
+        self.now += 1
+        self.index.lookup('26.3.16.172.in-addr.arpa.')
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_refresh_on_miss(self):
+        self.assertIsNone(self.index.lookup('22.3.168.192.in-addr.arpa.'))
+        self.assertEqual(self.loader.call_count, 1)
+        self.loader.return_value = [DomainDict(id='reverse_192_id', name='192.in-addr.arpa.')]
+        self.now += 10
+        self.assertIsNone(self.index.lookup('22.3.168.192.in-addr.arpa.'))
+        self.assertEqual(self.loader.call_count, 1)
+        self.now += 20
+        self.assertEqual(self.index.lookup('22.3.168.192.in-addr.arpa.').id, 'reverse_192_id')
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_resolve_classless(self):
+        self.loader.return_value.extend([
+            DomainDict(id='reverse_classless_1_id', name='0/26.3.16.172.in-addr.arpa.'),
+            DomainDict(id='reverse_classless_2_id', name='64-127.3.16.172.in-addr.arpa.')
+        ])
+        self.assertEqual(self.index.resolve('172.16.3.26'), ('26.0/26.3.16.172.in-addr.arpa.',
+                                                             self.loader.return_value[-2]))
+        name, zone = self.index.resolve('172.16.3.100')
+        self.assertEqual((name, zone.id), ('100.64-127.3.16.172.in-addr.arpa.', 'reverse_classless_2_id'))
+        # Out of the classless zones
+        name, zone = self.index.resolve('172.16.3.200')
+        self.assertEqual((name, zone.id), ('200.3.16.172.in-addr.arpa.', 'reverse_172_16_id'))
+
+    def test_resolve_ipv6(self):
+        self.loader.return_value.append(DomainDict(id='reverse_ipv6_id', name='8.b.d.0.1.0.0.2.ip6.arpa.'))
+        name, zone = self.index.resolve('2001:db8::1')
+        self.assertEqual(name, '1.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.')
+        self.assertEqual(zone.id, 'reverse_ipv6_id')
+
+    def test_resolve_all(self):
+        self.loader.return_value.append(DomainDict(id='reverse_ipv6_id', name='8.b.d.0.1.0.0.2.ip6.arpa.'))
+        results = self.index.resolve_all(['172.16.3.26', '2001:db8::1', '192.168.3.22'])
+        self.assertEqual([zone.id if zone else None for _, zone in results],
+                         ['reverse_172_16_id', 'reverse_ipv6_id', None])
+        self.now += 30
+        self.index.resolve_all(['192.168.3.22', '192.168.3.23'])
+        # A single reload for both misses
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertEqual((self.index.hits, self.index.misses), (2, 3))
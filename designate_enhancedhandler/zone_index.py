@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+
+from eventlet import semaphore
+from oslo_log import log as logging
+
+from designate_enhancedhandler.reverse import classless_range
+from designate_enhancedhandler.reverse import parse_address
+from designate_enhancedhandler.reverse import reverse_name
+
+LOG = logging.getLogger(__name__)
+
+REVERSE_SUFFIX = '.arpa.'
+
+
+def _labels(fqdn):
+    """Labels of a fully qualified name starting from the root"""
+    return fqdn.rstrip('.').lower().split('.')[::-1]
+
+
+class _Node(object):
+    __slots__ = ('children', 'zone')
+
+    def __init__(self):
+        self.children = {}
+        self.zone = None
+
+
+class ReverseZoneIndex(object):
+    """Index of the reverse zones (``*.arpa.``) kept in a label-wise suffix trie.
+
+    The zones are obtained from `loader` (a callable returning domains with `id` and `name`
+    attributes). They are loaded on first use, reloaded when older than `ttl` seconds and
+    reloaded early when a lookup misses, at most once every `miss_interval` seconds. With a
+    `ttl` of None, they are only reloaded on misses or when given to `load`.
+
+    RFC 2317 classless zones (eg. 0/26.2.0.192.in-addr.arpa.) are kept apart, by the name of
+    the /24 they belong to, and take precedence over the octet-aligned zones when resolving an
+    address.
+    """
+
+    def __init__(self, loader, ttl, miss_interval, clock=time.time):
+        self._loader = loader
+        self._ttl = ttl
+        self._miss_interval = miss_interval
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._root = _Node()
+        self._zones = []
+        self._classless = {}
+        self._loaded_at = None
+        self._refresh_lock = semaphore.Semaphore()
+
+    def _build(self, domains):
+        root = _Node()
+        zones = []
+        classless = {}
+        for domain in domains:
+            if not domain.name.endswith(REVERSE_SUFFIX):
+                continue
+            zones.append(domain)
+            octets = classless_range(domain.name)
+            if octets is not None:
+                parent = domain.name.lower().split('.', 1)[1]
+                classless.setdefault(parent, []).append((octets[0], octets[1], domain))
+                continue
+            node = root
+            for label in _labels(domain.name):
+                node = node.children.setdefault(label, _Node())
+            node.zone = domain
+        return root, zones, classless
+
+    def refresh(self):
+        loaded_at = self._loaded_at
+        with self._refresh_lock:
+            if self._loaded_at != loaded_at:
+                # Another thread reloaded the index while this one was waiting
+                return
+            self.load(self._loader())
+
+    def load(self, domains):
+        """Replace the zones with the reverse ones among the given domains"""
+        root, zones, classless = self._build(domains)
+        # Swap the trie in a single assignment so concurrent lookups never see a partial index
+        self._root, self._zones, self._classless = root, zones, classless
+        self._loaded_at = self._clock()
+        LOG.debug('Loaded %d reverse zones', len(zones))
+
+    def _expired(self, age):
+        return age is None or (self._ttl is not None and age >= self._ttl)
+
+    def _age(self):
+        if self._loaded_at is None:
+            return None
+        return self._clock() - self._loaded_at
+
+    def _match(self, fqdn):
+        node = self._root
+        zone = None
+        for label in _labels(fqdn):
+            node = node.children.get(label)
+            if node is None:
+                break
+            if node.zone is not None:
+                zone = node.zone
+        return zone
+
+    def _match_address(self, version, value):
+        name = reverse_name(version, value)
+        if version == 4 and self._classless:
+            octet = value & 0xff
+            for first, last, zone in self._classless.get(name.split('.', 1)[1], ()):
+                if first <= octet <= last:
+                    return '%d.%s' % (octet, zone.name), zone
+        return name, self._match(name)
+
+    def _lookup_all(self, match, keys):
+        """Match every key, reloading the zones at most once when expired or when any of them misses"""
+        age = self._age()
+        if self._expired(age):
+            self.refresh()
+            results = [match(key) for key in keys]
+        else:
+            results = [match(key) for key in keys]
+            missing = sum(1 for _, zone in results if zone is None)
+            if missing and age >= self._miss_interval:
+                LOG.debug('No reverse zone found for %d of %d names. Reloading reverse zones', missing, len(keys))
+                self.refresh()
+                results = [match(key) for key in keys]
+        for _, zone in results:
+            if zone is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return results
+
+    def lookup(self, fqdn):
+        """Get the most specific reverse zone containing fqdn or None"""
+        return self._lookup_all(lambda name: (name, self._match(name)), [fqdn])[0][1]
+
+    def resolve(self, address):
+        """Get the name of the PTR of an address and the reverse zone containing it, or None"""
+        return self.resolve_all([address])[0]
+
+    def resolve_all(self, addresses):
+        """Get the (PTR name, reverse zone or None) of each address, reloading the zones at most once.
+
+        Raises ValueError if any address is not valid.
+        """
+        parsed = [parse_address(address) for address in addresses]
+        return self._lookup_all(lambda address: self._match_address(*address), parsed)
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def zones(self):
+        """Get all the reverse zones"""
+        if self._expired(self._age()):
+            self.refresh()
+        return list(self._zones)